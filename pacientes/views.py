@@ -8,10 +8,13 @@ from django.contrib.auth.decorators import login_required
 from django.db.models import Q
 from .models import Paciente
 from regulacao.models import RegulacaoExame, RegulacaoConsulta
+from regulacao.models import RegulacaoExameArquivo, RegulacaoConsultaArquivo
+from regulacao.arquivo import HistoricoUnificado
 from regulacao.models import UBS, TipoExame, Especialidade
 from viagens.models import Viagem
 from tfd.models import TFD
 from django.utils.dateparse import parse_date
+from secretaria_it.datas import filtro_periodo
 from django.utils.http import urlencode
 from .forms import PacienteForm
 from .services import buscar_paciente_esus
@@ -247,36 +250,42 @@ class PacienteHistoricoView(AccessRequiredMixin, LoginRequiredMixin, DetailView)
         s = parse_date(start) if start else None
         e = parse_date(end) if end else None
 
-    # Exames
-        exames = RegulacaoExame.objects.select_related('tipo_exame', 'ubs_solicitante').filter(paciente=paciente)
-        if s:
-            exames = exames.filter(data_solicitacao__date__gte=s)
-        if e:
-            exames = exames.filter(data_solicitacao__date__lte=e)
-        if q:
-            exames = exames.filter(
-                Q(tipo_exame__nome__icontains=q)
-                | Q(ubs_solicitante__nome__icontains=q)
-                | Q(observacoes_solicitacao__icontains=q)
-                | Q(observacoes_regulacao__icontains=q)
-                | Q(motivo_decisao__icontains=q)
-            )
-        if status_ex:
-            if status_ex == 'agendados':
-                exames = exames.filter(status='autorizado', data_agendada__isnull=False)
-            else:
-                exames = exames.filter(status=status_ex)
-        if ubs_ex:
-            try:
-                exames = exames.filter(ubs_solicitante_id=int(ubs_ex))
-            except (TypeError, ValueError):
-                pass
-        if tipo_exame_ex:
-            try:
-                exames = exames.filter(tipo_exame_id=int(tipo_exame_ex))
-            except (TypeError, ValueError):
-                pass
-        exames = exames.order_by('-data_solicitacao')
+    # Exames (tabela quente + arquivo de itens encerrados)
+        def filtrar_exames(exames):
+            exames = exames.filter(paciente=paciente)
+            if s or e:
+                exames = exames.filter(filtro_periodo('data_solicitacao', s, e))
+            if q:
+                exames = exames.filter(
+                    Q(tipo_exame__nome__icontains=q)
+                    | Q(ubs_solicitante__nome__icontains=q)
+                    | Q(observacoes_solicitacao__icontains=q)
+                    | Q(observacoes_regulacao__icontains=q)
+                    | Q(motivo_decisao__icontains=q)
+                )
+            if status_ex:
+                if status_ex == 'agendados':
+                    exames = exames.filter(status='autorizado', data_agendada__isnull=False)
+                else:
+                    exames = exames.filter(status=status_ex)
+            if ubs_ex:
+                try:
+                    exames = exames.filter(ubs_solicitante_id=int(ubs_ex))
+                except (TypeError, ValueError):
+                    pass
+            if tipo_exame_ex:
+                try:
+                    exames = exames.filter(tipo_exame_id=int(tipo_exame_ex))
+                except (TypeError, ValueError):
+                    pass
+            return exames
+
+        exames_quentes = filtrar_exames(RegulacaoExame.objects.all())
+        exames = HistoricoUnificado(
+            exames_quentes,
+            filtrar_exames(RegulacaoExameArquivo.objects.all()),
+            select_related=('tipo_exame', 'ubs_solicitante'),
+        )
 
         # Grupos de impressão (exames autorizados por data agendada)
         ex_groups_map = defaultdict(list)
@@ -296,38 +305,43 @@ class PacienteHistoricoView(AccessRequiredMixin, LoginRequiredMixin, DetailView)
         ]
 
         # IDs CSV para imprimir todos os exames autorizados visíveis no histórico
-        ex_aut_ids_csv = ",".join(str(i) for i in exames.filter(status='autorizado').values_list('id', flat=True))
-
-        # Consultas
-        consultas = RegulacaoConsulta.objects.select_related('especialidade', 'ubs_solicitante').filter(paciente=paciente)
-        if s:
-            consultas = consultas.filter(data_solicitacao__date__gte=s)
-        if e:
-            consultas = consultas.filter(data_solicitacao__date__lte=e)
-        if q:
-            consultas = consultas.filter(
-                Q(especialidade__nome__icontains=q)
-                | Q(ubs_solicitante__nome__icontains=q)
-                | Q(observacoes_solicitacao__icontains=q)
-                | Q(observacoes_regulacao__icontains=q)
-                | Q(motivo_decisao__icontains=q)
-            )
-        if status_co:
-            if status_co == 'agendados':
-                consultas = consultas.filter(status='autorizado', data_agendada__isnull=False)
-            else:
-                consultas = consultas.filter(status=status_co)
-        if ubs_co:
-            try:
-                consultas = consultas.filter(ubs_solicitante_id=int(ubs_co))
-            except (TypeError, ValueError):
-                pass
-        if especialidade_co:
-            try:
-                consultas = consultas.filter(especialidade_id=int(especialidade_co))
-            except (TypeError, ValueError):
-                pass
-        consultas = consultas.order_by('-data_solicitacao')
+        ex_aut_ids_csv = ",".join(str(i) for i in exames_quentes.filter(status='autorizado').values_list('id', flat=True))
+
+        # Consultas (tabela quente + arquivo de itens encerrados)
+        def filtrar_consultas(consultas):
+            consultas = consultas.filter(paciente=paciente)
+            if s or e:
+                consultas = consultas.filter(filtro_periodo('data_solicitacao', s, e))
+            if q:
+                consultas = consultas.filter(
+                    Q(especialidade__nome__icontains=q)
+                    | Q(ubs_solicitante__nome__icontains=q)
+                    | Q(observacoes_solicitacao__icontains=q)
+                    | Q(observacoes_regulacao__icontains=q)
+                    | Q(motivo_decisao__icontains=q)
+                )
+            if status_co:
+                if status_co == 'agendados':
+                    consultas = consultas.filter(status='autorizado', data_agendada__isnull=False)
+                else:
+                    consultas = consultas.filter(status=status_co)
+            if ubs_co:
+                try:
+                    consultas = consultas.filter(ubs_solicitante_id=int(ubs_co))
+                except (TypeError, ValueError):
+                    pass
+            if especialidade_co:
+                try:
+                    consultas = consultas.filter(especialidade_id=int(especialidade_co))
+                except (TypeError, ValueError):
+                    pass
+            return consultas
+
+        consultas = HistoricoUnificado(
+            filtrar_consultas(RegulacaoConsulta.objects.all()),
+            filtrar_consultas(RegulacaoConsultaArquivo.objects.all()),
+            select_related=('especialidade', 'ubs_solicitante'),
+        )
 
         # Grupos de impressão (consultas autorizadas por data agendada)
         co_groups_map = defaultdict(list)
@@ -0,0 +1,125 @@
+"""Ações do regulador (negar/pendenciar) aplicadas em lote.
+
+Todos os itens de uma chamada são tratados em uma transação: as linhas afetadas
+são travadas de uma vez (``SELECT ... FOR UPDATE``), as alterações gravadas com um
+``bulk_update`` por tabela e as mensagens de pendência com um ``bulk_create``.
+A auditoria vai no lote de ``auditoria`` (gravado após o commit).
+
+Cada item recebe um resultado próprio; itens inválidos não impedem os demais.
+"""
+from typing import Dict, Iterable, List
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import auditoria
+from .models import PendenciaMensagemConsulta, PendenciaMensagemExame, RegulacaoConsulta, RegulacaoExame
+from .signals import apos_gravacao_em_lote
+
+ACOES = ('negar', 'pendenciar')
+MAX_ITENS = 200
+
+_TIPOS = {
+    'exame': (RegulacaoExame, PendenciaMensagemExame, 'exame'),
+    'consulta': (RegulacaoConsulta, PendenciaMensagemConsulta, 'consulta'),
+}
+
+_CAMPOS = {
+    'negar': ['status', 'motivo_decisao', 'data_regulacao', 'regulador', 'atualizado_em'],
+    'pendenciar': [
+        'status', 'pendencia_motivo', 'pendencia_aberta_em', 'pendencia_aberta_por',
+        'pendencia_respondida_em', 'pendencia_resposta', 'atualizado_em',
+    ],
+}
+
+
+def _resultado(item: dict, ok: bool, erro: str = '') -> dict:
+    res = {'item_type': item.get('item_type'), 'id': item.get('id'), 'action': item.get('action'), 'ok': ok}
+    if erro:
+        res['error'] = erro
+    return res
+
+
+def _validar(itens: Iterable[dict]):
+    """Separa itens válidos (normalizados) de resultados de erro, preservando a ordem."""
+    validos, resultados, vistos = [], [], set()
+    for bruto in itens:
+        item = dict(bruto) if isinstance(bruto, dict) else {}
+        item_type = item.get('item_type')
+        action = item.get('action')
+        motivo = (item.get('motivo') or '').strip()
+        try:
+            item['id'] = int(item.get('id') or item.get('item_id'))
+        except (TypeError, ValueError):
+            item['id'] = None
+        erro = ''
+        if item_type not in _TIPOS:
+            erro = 'Tipo de item inválido.'
+        elif action not in ACOES:
+            erro = 'Ação inválida.'
+        elif not item['id'] or not motivo:
+            erro = 'Dados incompletos.'
+        elif (item_type, item['id']) in vistos:
+            erro = 'Item repetido no lote.'
+        if erro:
+            resultados.append(_resultado(item, False, erro))
+            continue
+        vistos.add((item_type, item['id']))
+        item['motivo'] = motivo
+        resultados.append(None)  # preenchido após aplicar
+        validos.append((len(resultados) - 1, item))
+    return validos, resultados
+
+
+def aplicar_acoes(usuario, itens: Iterable[dict]) -> List[dict]:
+    """Aplica ``[{item_type, id, action, motivo}, ...]`` e devolve um resultado por item, na mesma ordem."""
+    validos, resultados = _validar(itens)
+    if not validos:
+        return resultados
+    agora = timezone.now()
+
+    with transaction.atomic(), auditoria.lote() as audit:
+        for item_type, (model, msg_model, fk) in _TIPOS.items():
+            do_tipo = [(pos, item) for pos, item in validos if item['item_type'] == item_type]
+            if not do_tipo:
+                continue
+            travados: Dict[int, object] = {
+                obj.pk: obj
+                for obj in model.objects.select_for_update(of=('self',)).select_related('paciente')
+                .filter(pk__in=[item['id'] for _, item in do_tipo])
+            }
+            alterados, mensagens, campos = [], [], set()
+            for pos, item in do_tipo:
+                obj = travados.get(item['id'])
+                if obj is None:
+                    resultados[pos] = _resultado(item, False, 'Item não encontrado.')
+                    continue
+                motivo = item['motivo']
+                if item['action'] == 'negar':
+                    obj.status = 'negado'
+                    obj.motivo_decisao = motivo
+                    obj.data_regulacao = agora
+                    obj.regulador = usuario
+                else:
+                    obj.status = 'pendente'
+                    obj.pendencia_motivo = motivo
+                    obj.pendencia_aberta_em = agora
+                    obj.pendencia_aberta_por = usuario
+                    obj.pendencia_respondida_em = None
+                    obj.pendencia_resposta = ''
+                    mensagens.append(msg_model(**{fk: obj}, autor=usuario, lado='regulacao', tipo='abertura',
+                                               texto=motivo))
+                obj.atualizado_em = agora
+                campos.update(_CAMPOS[item['action']])
+                alterados.append(obj)
+                audit.registrar(usuario, f"{item['action']}_{item_type}", **{fk: obj},
+                                paciente_nome=obj.paciente.nome, motivo=motivo)
+                resultados[pos] = _resultado(item, True)
+
+            if alterados:
+                model.objects.bulk_update(alterados, sorted(campos))
+                if mensagens:
+                    msg_model.objects.bulk_create(mensagens)
+                apos_gravacao_em_lote(alterados)
+
+    return resultados
@@ -0,0 +1,90 @@
+"""Geração em lote das agendas médicas (semanais e por dia).
+
+As datas (ou dias da semana) são calculadas em Python e cada tabela é gravada com
+um único ``bulk_create(update_conflicts=True)`` sobre a restrição única
+(``medico``, ``especialidade``, ``data``/``dia_semana``), em vez de um
+``get_or_create`` (e um ``save``) por dia. Os registros existentes no período são
+lidos antes em uma consulta, para só enviar os novos e, com ``sobrescrever``, os
+que mudam de capacidade/ativo; criados e atualizados são contados pelas chaves
+devolvidas pelo ``INSERT ... ON CONFLICT ... RETURNING``.
+
+``bulk_create`` não dispara ``post_save``: os mapas de ocupação são invalidados aqui
+(agendas por dia).
+"""
+from datetime import date, timedelta
+from typing import Iterable, List, Tuple
+
+from django.db import transaction
+
+from . import ocupacao
+from .models import AgendaMedica, AgendaMedicaDia
+
+BATCH_SIZE = 1000
+
+
+def somar_meses(inicio: date, meses: int) -> date:
+    try:
+        from dateutil.relativedelta import relativedelta
+    except Exception:
+        # Sem python-dateutil: aproximar por 30 dias/mês
+        return inicio + timedelta(days=30 * meses)
+    return inicio + relativedelta(months=meses)
+
+
+def datas_do_periodo(inicio: date, fim: date, dias_semana: Iterable[int]) -> List[date]:
+    """Datas em ``[inicio, fim)`` cujo dia da semana (0=segunda) está em ``dias_semana``."""
+    dias = set(dias_semana)
+    return [inicio + timedelta(days=n) for n in range((fim - inicio).days)
+            if (inicio + timedelta(days=n)).weekday() in dias]
+
+
+def _gravar(model, campo: str, pares: Iterable[Tuple[int, int]], valores: Iterable, capacidade: int,
+            sobrescrever: bool) -> Tuple[int, int]:
+    pares = set(pares)
+    valores = sorted(set(valores))
+    if not pares or not valores:
+        return 0, 0
+    existentes = {
+        (medico_id, esp_id, valor): (pk, cap, ativo)
+        for pk, medico_id, esp_id, valor, cap, ativo in model.objects.filter(
+            medico_id__in={m for m, _ in pares}, especialidade_id__in={e for _, e in pares},
+            **{f'{campo}__in': valores},
+        ).order_by().values_list('pk', 'medico_id', 'especialidade_id', campo, 'capacidade', 'ativo')
+    }
+    objs = []
+    for medico_id, esp_id in sorted(pares):
+        for valor in valores:
+            atual = existentes.get((medico_id, esp_id, valor))
+            if atual is not None and not (sobrescrever and (atual[1] != capacidade or not atual[2])):
+                continue
+            objs.append(model(medico_id=medico_id, especialidade_id=esp_id, capacidade=capacidade, ativo=True,
+                              **{campo: valor}))
+    if not objs:
+        return 0, 0
+    # Sem ``sobrescrever``, um registro criado por outra sessão entre a leitura e a
+    # gravação mantém capacidade/ativo (só ``atualizado_em`` é tocado)
+    campos = ['capacidade', 'ativo', 'atualizado_em'] if sobrescrever else ['atualizado_em']
+    with transaction.atomic():
+        gravados = model.objects.bulk_create(
+            objs, batch_size=BATCH_SIZE, update_conflicts=True,
+            unique_fields=['medico', 'especialidade', campo], update_fields=campos,
+        )
+    conhecidos = {pk for pk, _, _ in existentes.values()}
+    atualizados = sum(1 for obj in gravados if obj.pk in conhecidos)
+    return len(gravados) - atualizados, atualizados
+
+
+def gerar_agendas_dia(pares: Iterable[Tuple[int, int]], datas: Iterable[date], capacidade: int,
+                      sobrescrever: bool = False) -> Tuple[int, int]:
+    """Cria (e, com ``sobrescrever``, reativa/ajusta) ``AgendaMedicaDia`` de cada
+    ``(medico_id, especialidade_id)`` em ``datas``. Retorna ``(criados, atualizados)``."""
+    criados, atualizados = _gravar(AgendaMedicaDia, 'data', pares, datas, capacidade, sobrescrever)
+    if criados or atualizados:
+        ocupacao.invalidar()
+    return criados, atualizados
+
+
+def gerar_agendas_semanais(pares: Iterable[Tuple[int, int]], dias_semana: Iterable[int], capacidade: int,
+                           sobrescrever: bool = False) -> Tuple[int, int]:
+    """Como ``gerar_agendas_dia``, para ``AgendaMedica`` (dias da semana 0–6)."""
+    return _gravar(AgendaMedica, 'dia_semana', pares, dias_semana, capacidade, sobrescrever)
@@ -0,0 +1,141 @@
+"""Resumo dos itens em aberto de cada paciente (avisos dos formulários de solicitação).
+
+Um único ``SELECT ... UNION ALL ...`` traz exames e consultas em fila ou autorizados
+com agendamento futuro (ou ainda sem data) de um ou vários pacientes. O resumo de
+cada paciente fica em cache e é descartado (após o commit) sempre que um exame ou
+consulta dele é salvo ou excluído (ver ``signals``). O descarte só alcança outros
+processos com cache compartilhado; com ``LocMemCache`` a validade é curta
+(``caches.validade``).
+
+Os itens em cache não dependem do dia: o corte por ``data_agendada >= hoje`` é
+reaplicado na leitura.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import CharField, F, Q, Value
+from django.utils import timezone
+
+from .caches import validade
+from .models import RegulacaoConsulta, RegulacaoExame
+
+CACHE_KEY_RESUMO = 'regulacao:alertas:paciente:{paciente_id}'
+CACHE_TIMEOUT = 60 * 60
+
+COLUNAS = (
+    'origem', 'id', 'paciente_id', 'status', 'ref_id', 'ref_nome', 'ubs_nome',
+    'data_solicitacao', 'data_agendada', 'hora_agendada',
+)
+
+
+def _cache_key(paciente_id: int) -> str:
+    return CACHE_KEY_RESUMO.format(paciente_id=paciente_id)
+
+
+def _abertos(model, origem: str, ref: str, pids: List[int], hoje):
+    return (
+        model.objects
+        .filter(paciente_id__in=pids)
+        .filter(
+            Q(status='fila')
+            | (Q(status='autorizado') & (Q(data_agendada__isnull=True) | Q(data_agendada__gte=hoje)))
+        )
+        .order_by()
+        .annotate(
+            origem=Value(origem, output_field=CharField()),
+            ref_id=F(f'{ref}_id'),
+            ref_nome=F(f'{ref}__nome'),
+            ubs_nome=F('ubs_solicitante__nome'),
+        )
+        .values_list(*COLUNAS)
+    )
+
+
+def _calcular(pids: List[int]) -> Dict[int, dict]:
+    hoje = timezone.localdate()
+    resumos = {pid: {'exames': [], 'consultas': []} for pid in pids}
+    uniao = _abertos(RegulacaoExame, 'exame', 'tipo_exame', pids, hoje).union(
+        _abertos(RegulacaoConsulta, 'consulta', 'especialidade', pids, hoje), all=True
+    ).order_by('data_solicitacao')
+    for linha in uniao:
+        item = dict(zip(COLUNAS, linha))
+        chave = 'exames' if item.pop('origem') == 'exame' else 'consultas'
+        resumos[item.pop('paciente_id')][chave].append(item)
+    return resumos
+
+
+def resumos_pacientes(paciente_ids: Iterable[int]) -> Dict[int, dict]:
+    """Resumo ``{'exames': [...], 'consultas': [...]}`` por paciente (cache primeiro).
+
+    Os pacientes ausentes do cache são calculados juntos em uma consulta.
+    """
+    pids = sorted({int(p) for p in paciente_ids if p})
+    if not pids:
+        return {}
+    em_cache = cache.get_many([_cache_key(p) for p in pids])
+    resumos = {p: em_cache[_cache_key(p)] for p in pids if _cache_key(p) in em_cache}
+    faltando = [p for p in pids if p not in resumos]
+    if faltando:
+        novos = _calcular(faltando)
+        cache.set_many({_cache_key(p): r for p, r in novos.items()}, validade(CACHE_TIMEOUT))
+        resumos.update(novos)
+    hoje = timezone.localdate()
+    return {
+        p: {
+            chave: [i for i in itens if not (i['data_agendada'] and i['data_agendada'] < hoje)]
+            for chave, itens in r.items()
+        }
+        for p, r in resumos.items()
+    }
+
+
+def resumo_paciente(paciente_id: int) -> dict:
+    return resumos_pacientes([paciente_id]).get(int(paciente_id), {'exames': [], 'consultas': []})
+
+
+def invalidar(paciente_id: Optional[int]) -> None:
+    """Descarta o resumo do paciente agora e novamente após o commit."""
+    if not paciente_id:
+        return
+    key = _cache_key(paciente_id)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+def invalidar_varios(paciente_ids: Iterable[int]) -> None:
+    """Versão em lote de ``invalidar`` (para ``bulk_create``/``update``, que não disparam sinais)."""
+    keys = [_cache_key(p) for p in {p for p in paciente_ids if p}]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def alertas(itens: List[dict], *, feminino: bool = False, ref_ids: Iterable[int] = ()) -> dict:
+    """Contagens, conflitos com ``ref_ids`` (tipos de exame/especialidades) e textos de detalhe."""
+    hoje = timezone.localdate()
+    ref_ids = set(ref_ids)
+    agendado = 'agendada' if feminino else 'agendado'
+    detalhes = []
+    for i in itens:
+        extra = ''
+        if i['status'] == 'fila' and i['data_solicitacao']:
+            extra = f" (solicitado em {timezone.localtime(i['data_solicitacao']).strftime('%d/%m/%Y')})"
+        if i['status'] == 'autorizado' and i['data_agendada']:
+            extra = f" ({agendado} para {i['data_agendada'].strftime('%d/%m/%Y')}"
+            if i['hora_agendada']:
+                extra += f" {i['hora_agendada'].strftime('%H:%M')}"
+            extra += ")"
+        status_txt = dict(RegulacaoExame.STATUS_CHOICES).get(i['status'], i['status'])
+        detalhes.append(f"{i['ref_nome'] or '-'} (UBS {i['ubs_nome'] or '-'}) - {status_txt}{extra}")
+    conflitos = [i for i in itens if i['ref_id'] in ref_ids]
+    return {
+        'fila_count': sum(1 for i in itens if i['status'] == 'fila'),
+        'agendadas_count': sum(
+            1 for i in itens if i['status'] == 'autorizado' and i['data_agendada'] and i['data_agendada'] >= hoje
+        ),
+        'conflito': bool(conflitos),
+        'conflitos_nomes': sorted({i['ref_nome'] for i in conflitos if i['ref_nome']}),
+        'detalhes': detalhes,
+    }
@@ -0,0 +1,173 @@
+"""Alocação automática da fila de espera nas vagas das agendas (em lote).
+
+Para uma especialidade (consultas) ou um tipo de exame (exames, na especialidade
+do tipo), percorre os itens em ``fila`` por prioridade (alta, média, normal) e
+tempo de espera e distribui cada um na primeira vaga livre de ``AgendaMedicaDia``
+(data mais próxima), sem marcar o paciente duas vezes no mesmo dia.
+
+Tudo é carregado com poucas consultas (fila, agendas com ocupação, compromissos
+dos pacientes no período) e o plano é montado em memória. Ao confirmar, a fila
+e as agendas envolvidas são travadas, o plano é recalculado sob a trava e gravado
+com um ``bulk_update``; a auditoria vai em lote.
+"""
+from collections import defaultdict
+from datetime import date, time, timedelta
+from typing import List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import auditoria, vagas
+from .models import AgendaMedicaDia, Especialidade, RegulacaoConsulta, RegulacaoExame, TipoExame, ordem_prioridade
+from .signals import apos_gravacao_em_lote
+
+HORIZONTE_DIAS = 60
+
+_CAMPOS = [
+    'status', 'regulador', 'data_regulacao', 'data_agendada', 'hora_agendada', 'medico_atendente',
+    'motivo_decisao', 'atualizado_em',
+]
+
+
+class Alvo:
+    """Tabela, filtro da fila e especialidade da agenda de uma alocação."""
+
+    def __init__(self, *, especialidade: Optional[Especialidade] = None, tipo_exame: Optional[TipoExame] = None):
+        if (especialidade is None) == (tipo_exame is None):
+            raise ValueError('Informe uma especialidade ou um tipo de exame.')
+        if tipo_exame is not None:
+            if not tipo_exame.especialidade_id:
+                raise ValueError('Tipo de exame sem especialidade responsável (agenda).')
+            self.tipo, self.model, self.campo_local = 'exame', RegulacaoExame, 'local_realizacao'
+            self.filtro = {'tipo_exame': tipo_exame}
+            self.especialidade_id = tipo_exame.especialidade_id
+        else:
+            self.tipo, self.model, self.campo_local = 'consulta', RegulacaoConsulta, 'local_atendimento'
+            self.filtro = {'especialidade': especialidade}
+            self.especialidade_id = especialidade.pk
+
+    def fila(self, ubs_id: Optional[int] = None):
+        qs = self.model.objects.filter(status='fila', **self.filtro)
+        if ubs_id:
+            qs = qs.filter(ubs_solicitante_id=ubs_id)
+        return qs.order_by(ordem_prioridade(), 'data_solicitacao', 'pk')
+
+
+def _compromissos(paciente_ids, inicio: date, fim: date) -> set:
+    """``{(paciente_id, data)}`` já autorizados no período (exames e consultas)."""
+    ocupados = set()
+    for model in (RegulacaoExame, RegulacaoConsulta):
+        ocupados.update(
+            model.objects
+            .filter(paciente_id__in=paciente_ids, status='autorizado',
+                    data_agendada__gte=inicio, data_agendada__lte=fim)
+            .order_by()
+            .values_list('paciente_id', 'data_agendada')
+            .distinct()
+        )
+    return ocupados
+
+
+def planejar(itens: List, agendas: List[AgendaMedicaDia], compromissos: set) -> List[tuple]:
+    """Atribui itens (já ordenados) às agendas (em ordem de data) e devolve ``[(item, agenda)]``.
+
+    Guloso: cada item fica na primeira agenda com vaga em um dia em que o paciente
+    ainda não tem compromisso. Agendas esgotadas saem da frente da lista.
+    """
+    restantes = [a.restantes for a in agendas]
+    primeira = 0
+    plano = []
+    compromissos = set(compromissos)
+    for item in itens:
+        while primeira < len(agendas) and restantes[primeira] <= 0:
+            primeira += 1
+        if primeira == len(agendas):
+            break
+        for i in range(primeira, len(agendas)):
+            agenda = agendas[i]
+            if restantes[i] > 0 and (item.paciente_id, agenda.data) not in compromissos:
+                restantes[i] -= 1
+                compromissos.add((item.paciente_id, agenda.data))
+                plano.append((item, agenda))
+                break
+    return plano
+
+
+def _montar(alvo: Alvo, inicio: date, fim: date, ubs_id, limite, travar: bool):
+    fila_qs = alvo.fila(ubs_id).select_related('paciente')
+    agendas_qs = vagas.agendas_com_vagas([alvo.especialidade_id], inicio, fim).select_related('medico')
+    if travar:
+        # Serializa alocações concorrentes da mesma especialidade e não pega itens em edição
+        list(AgendaMedicaDia.objects.select_for_update().filter(
+            especialidade_id=alvo.especialidade_id, data__gte=inicio, data__lte=fim,
+        ).values_list('pk', flat=True))
+        fila_qs = fila_qs.select_for_update(of=('self',), skip_locked=True)
+    if limite:
+        fila_qs = fila_qs[:limite]
+    itens = list(fila_qs)
+    agendas = list(agendas_qs)
+    compromissos = _compromissos({i.paciente_id for i in itens}, inicio, fim) if itens and agendas else set()
+    return itens, planejar(itens, agendas, compromissos)
+
+
+def alocar_fila(alvo: Alvo, *, usuario=None, confirmar: bool = False, inicio: Optional[date] = None,
+                fim: Optional[date] = None, ubs_id: Optional[int] = None, limite: Optional[int] = None,
+                hora: Optional[time] = None, local: str = '') -> dict:
+    """Propõe (ou grava, com ``confirmar=True``) a alocação da fila do ``alvo``.
+
+    Retorna ``{'alocados': [...], 'na_fila': n, 'sem_vaga': n, 'confirmado': bool}``;
+    cada alocado tem ``tipo``, ``id``, ``paciente_id``, ``paciente_nome``, ``prioridade``,
+    ``medico_id``, ``medico_nome`` e ``data``.
+    """
+    inicio = inicio or timezone.localdate() + timedelta(days=1)
+    fim = fim or inicio + timedelta(days=HORIZONTE_DIAS)
+    if not confirmar:
+        itens, plano = _montar(alvo, inicio, fim, ubs_id, limite, travar=False)
+    else:
+        agora = timezone.now()
+        with transaction.atomic(), auditoria.lote() as audit:
+            itens, plano = _montar(alvo, inicio, fim, ubs_id, limite, travar=True)
+            campos = list(_CAMPOS) + ([alvo.campo_local] if local else [])
+            for item, agenda in plano:
+                item.status = 'autorizado'
+                item.regulador = usuario
+                item.data_regulacao = agora
+                item.data_agendada = agenda.data
+                item.hora_agendada = hora
+                item.medico_atendente = agenda.medico
+                item.motivo_decisao = item.motivo_decisao or 'Alocação automática da fila.'
+                if local:
+                    setattr(item, alvo.campo_local, local)
+                item.atualizado_em = agora
+                if usuario is not None:
+                    audit.registrar(usuario, f'autorizar_{alvo.tipo}', **{alvo.tipo: item},
+                                    paciente_nome=item.paciente.nome, motivo=item.motivo_decisao)
+            if plano:
+                alvo.model.objects.bulk_update([item for item, _ in plano], campos, batch_size=500)
+                apos_gravacao_em_lote(item for item, _ in plano)
+
+    por_medico_dia = defaultdict(int)
+    for _, agenda in plano:
+        por_medico_dia[(agenda.medico_id, agenda.data)] += 1
+    return {
+        'confirmado': confirmar,
+        'na_fila': len(itens),
+        'sem_vaga': len(itens) - len(plano),
+        'alocados': [
+            {
+                'tipo': alvo.tipo,
+                'id': item.pk,
+                'paciente_id': item.paciente_id,
+                'paciente_nome': item.paciente.nome,
+                'prioridade': item.prioridade,
+                'medico_id': agenda.medico_id,
+                'medico_nome': agenda.medico.nome,
+                'data': agenda.data.isoformat(),
+            }
+            for item, agenda in plano
+        ],
+        'por_medico_dia': [
+            {'medico_id': m, 'data': d.isoformat(), 'alocados': n} for (m, d), n in sorted(por_medico_dia.items(),
+                                                                                         key=lambda kv: kv[0][1])
+        ],
+    }
@@ -0,0 +1,151 @@
+"""API (Django REST framework) para integração dos sistemas das UBS.
+
+Autenticação por token (``Authorization: Token <chave>``). O token pertence a um
+usuário vinculado a uma UBS (``UsuarioUBS``); as solicitações são sempre criadas
+para essa UBS. Usuários da regulação (sem UBS) informam ``ubs_id`` no corpo.
+
+Tokens são criados no admin (Auth Token) ou com ``manage.py drf_create_token <usuario>``.
+"""
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from secretaria_it.access import user_has_access
+
+from . import intake, mudancas
+from .models import UBS, RegulacaoExame
+
+
+def ubs_do_usuario(user, ubs_id=None):
+    """UBS do perfil do usuário; usuários da regulação escolhem pela ``ubs_id``."""
+    perfil = getattr(user, 'perfil_ubs', None)
+    if perfil is not None:
+        return perfil.ubs
+    if ubs_id and user_has_access(user, 'regulacao'):
+        return UBS.objects.filter(pk=ubs_id, ativa=True).first()
+    return None
+
+
+class ItemSolicitacaoSerializer(serializers.Serializer):
+    tipo = serializers.ChoiceField(choices=('exame', 'consulta'))
+    referencia = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    cpf = serializers.CharField(max_length=14, required=False, allow_blank=True)
+    cns = serializers.CharField(max_length=15, required=False, allow_blank=True)
+    tipo_exame_id = serializers.IntegerField(required=False, min_value=1)
+    codigo_sus = serializers.CharField(max_length=20, required=False, allow_blank=True)
+    especialidade_id = serializers.IntegerField(required=False, min_value=1)
+    medico_crm = serializers.CharField(max_length=20)
+    justificativa = serializers.CharField()
+    prioridade = serializers.ChoiceField(choices=RegulacaoExame.PRIORIDADE_CHOICES, required=False)
+    observacoes = serializers.CharField(required=False, allow_blank=True)
+    numero_pedido = serializers.CharField(max_length=50, required=False, allow_blank=True)
+
+    def validate(self, attrs):
+        if not (intake.somente_digitos(attrs.get('cpf')) or intake.somente_digitos(attrs.get('cns'))):
+            raise serializers.ValidationError('Informe o CPF ou o CNS do paciente.')
+        if attrs['tipo'] == 'exame' and not (attrs.get('tipo_exame_id') or attrs.get('codigo_sus')):
+            raise serializers.ValidationError('Informe tipo_exame_id ou codigo_sus.')
+        if attrs['tipo'] == 'consulta' and not attrs.get('especialidade_id'):
+            raise serializers.ValidationError('Informe especialidade_id.')
+        attrs['medico_crm'] = attrs['medico_crm'].strip()
+        return attrs
+
+
+class LoteSolicitacoesSerializer(serializers.Serializer):
+    ubs_id = serializers.IntegerField(required=False, min_value=1)
+    itens = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_itens(self, itens):
+        limite = getattr(settings, 'REGULACAO_API_MAX_ITENS', intake.MAX_ITENS)
+        if len(itens) > limite:
+            raise serializers.ValidationError(f'Máximo de {limite} itens por lote.')
+        return itens
+
+
+class SolicitacoesLoteAPIView(APIView):
+    """``POST`` de um lote de exames/consultas; responde com um resultado por item.
+
+    Itens com formato inválido recebem ``erro`` com as mensagens do serializer; os
+    demais seguem para ``intake.receber_solicitacoes``. Responde ``201`` se algum
+    item foi criado e ``200`` caso contrário. Autenticação/permissão: ``REST_FRAMEWORK``
+    em settings (token ou sessão, usuário autenticado).
+    """
+
+    def post(self, request):
+        lote = LoteSolicitacoesSerializer(data=request.data)
+        lote.is_valid(raise_exception=True)
+        ubs = ubs_do_usuario(request.user, lote.validated_data.get('ubs_id'))
+        if ubs is None:
+            return Response({'detail': 'Usuário sem UBS vinculada (ou ubs_id inválido).'},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        brutos = lote.validated_data['itens']
+        resultados = [None] * len(brutos)
+        validos, posicoes = [], []
+        for pos, bruto in enumerate(brutos):
+            item = ItemSolicitacaoSerializer(data=bruto)
+            if item.is_valid():
+                validos.append(item.validated_data)
+                posicoes.append(pos)
+            else:
+                resultados[pos] = {
+                    'indice': pos, 'referencia': str(bruto.get('referencia') or ''), 'tipo': bruto.get('tipo'),
+                    'ok': False, 'erro': item.errors,
+                }
+        for pos, res in zip(posicoes, intake.receber_solicitacoes(ubs, validos)):
+            res['indice'] = pos
+            resultados[pos] = res
+
+        criados = sum(1 for r in resultados if r['ok'])
+        return Response(
+            {'ubs_id': ubs.pk, 'criados': criados, 'rejeitados': len(resultados) - criados, 'resultados': resultados},
+            status=status.HTTP_201_CREATED if criados else status.HTTP_200_OK,
+        )
+
+
+class MudancasUBSAPIView(APIView):
+    """``GET`` do feed de mudanças da UBS (ver ``mudancas``).
+
+    Parâmetros: ``cursor`` (devolvido pela chamada anterior) ou ``desde`` (ISO 8601,
+    primeira sincronização), ``limite`` e, para a regulação, ``ubs_id``. Com
+    ``If-None-Match`` igual ao ``ETag`` da página, responde ``304`` sem corpo.
+    """
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            ubs_id = int(params.get('ubs_id') or 0)
+            limite = int(params.get('limite') or mudancas.LIMITE_PADRAO)
+        except ValueError:
+            return Response({'detail': 'Parâmetros inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+        ubs = ubs_do_usuario(request.user, ubs_id)
+        if ubs is None:
+            return Response({'detail': 'Usuário sem UBS vinculada (ou ubs_id inválido).'},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        cursor = None
+        try:
+            if params.get('cursor'):
+                cursor = mudancas.decodificar_cursor(params['cursor'])
+            elif params.get('desde'):
+                try:
+                    desde = parse_datetime(params['desde'])
+                except ValueError as exc:
+                    # Bem formada mas inexistente (ex.: 2025-02-30T10:00:00)
+                    raise mudancas.CursorInvalido('Data inválida.') from exc
+                if desde is None:
+                    raise mudancas.CursorInvalido('Data inválida.')
+                cursor = mudancas.cursor_desde(desde)
+        except mudancas.CursorInvalido as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        pagina = mudancas.mudancas(ubs.pk, cursor, limite)
+        cabecalhos = {'ETag': pagina['etag'], 'Cache-Control': 'private, no-cache'}
+        if pagina['etag'] in request.headers.get('If-None-Match', ''):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=cabecalhos)
+        return Response(
+            {'ubs_id': ubs.pk, 'cursor': pagina['cursor'], 'tem_mais': pagina['tem_mais'], 'itens': pagina['itens']},
+            headers=cabecalhos,
+        )
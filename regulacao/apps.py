@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RegulacaoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'regulacao'
+
+    def ready(self):  # pragma: no cover
+        # Eventos em tempo real (SSE) a partir de alterações em exames/consultas
+        from . import signals  # noqa: F401
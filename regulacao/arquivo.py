@@ -0,0 +1,181 @@
+"""Arquivo frio da regulação.
+
+Itens encerrados há mais de N meses (negados, cancelados ou autorizados com
+resultado registrado) saem de ``RegulacaoExame``/``RegulacaoConsulta`` para
+``RegulacaoExameArquivo``/``RegulacaoConsultaArquivo``, junto com suas ações de
+auditoria e mensagens de pendência. Assim fila, agenda e listagens varrem apenas
+o trabalho em aberto.
+
+Leitura combinada (histórico do paciente, relatórios)::
+
+    historico = arquivo.HistoricoUnificado(exames_qs, exames_arquivo_qs, select_related=('tipo_exame',))
+    Paginator(historico, 10)
+
+A movimentação é feita pelo comando ``arquivar_historico`` (``--meses-regulacoes``).
+"""
+from datetime import timedelta
+from typing import Iterable, List, Sequence
+
+from django.db.models import BooleanField, Q, Value
+from django.utils import timezone
+
+from .models import (
+    AcaoUsuario,
+    AcaoUsuarioArquivo,
+    PendenciaMensagemArquivo,
+    PendenciaMensagemConsulta,
+    PendenciaMensagemExame,
+    RegulacaoConsulta,
+    RegulacaoConsultaArquivo,
+    RegulacaoExame,
+    RegulacaoExameArquivo,
+)
+
+ARQUIVO_DE = {
+    RegulacaoExame: RegulacaoExameArquivo,
+    RegulacaoConsulta: RegulacaoConsultaArquivo,
+}
+
+
+def corte_por_meses(meses: int):
+    """Instante de corte aproximado (30 dias por mês) a partir de agora."""
+    return timezone.now() - timedelta(days=30 * meses)
+
+
+def criterio_encerrados(corte) -> Q:
+    """Itens encerrados antes de ``corte``: negados/cancelados ou autorizados com resultado."""
+    com_resultado = Q(status='autorizado', resultado_atendimento__in=['compareceu', 'faltou'])
+    return (
+        Q(status__in=['negado', 'cancelado'], atualizado_em__lt=corte)
+        | (com_resultado & Q(resultado_em__lt=corte))
+        | (com_resultado & Q(resultado_em__isnull=True, data_agendada__lt=timezone.localdate(corte)))
+    )
+
+
+# ---------- Movimentação ----------
+
+def arquivar_acoes(ids: Sequence[int]) -> int:
+    """Copia ``AcaoUsuario`` (por ID) para o arquivo e remove da tabela quente."""
+    campos = ("usuario_id", "tipo_acao", "data_acao", "exame_id", "consulta_id", "paciente_nome", "motivo")
+    linhas = AcaoUsuario.objects.filter(pk__in=ids).values_list(*campos)
+    AcaoUsuarioArquivo.objects.bulk_create(
+        [AcaoUsuarioArquivo(**dict(zip(campos, linha))) for linha in linhas]
+    )
+    return AcaoUsuario.objects.filter(pk__in=ids).delete()[0]
+
+
+def arquivar_mensagens(model, item_tipo: str, ids: Sequence[int]) -> int:
+    """Copia mensagens de pendência (por ID) para o arquivo e remove da tabela quente."""
+    fk = f"{item_tipo}_id"
+    linhas = model.objects.filter(pk__in=ids).values_list(fk, "autor_id", "lado", "tipo", "texto", "criado_em")
+    PendenciaMensagemArquivo.objects.bulk_create([
+        PendenciaMensagemArquivo(
+            item_tipo=item_tipo,
+            item_id=item_id,
+            autor_id=autor_id,
+            lado=lado,
+            tipo=tipo,
+            texto=texto,
+            criado_em=criado_em,
+        )
+        for item_id, autor_id, lado, tipo, texto, criado_em in linhas
+    ])
+    return model.objects.filter(pk__in=ids).delete()[0]
+
+
+def arquivar_regulacoes(model, ids: Sequence[int], corte) -> int:
+    """Move para o arquivo os itens ``ids`` de ``model`` que ainda atendem ao critério.
+
+    Deve ser chamado dentro de uma transação: as linhas são bloqueadas e o critério
+    reavaliado, de modo que um item reaberto entre a seleção e a movimentação fica.
+    Ações e mensagens de pendência do item vão junto para as tabelas de arquivo.
+    """
+    arquivo_model = ARQUIVO_DE[model]
+    ids = list(
+        model.objects.select_for_update()
+        .filter(pk__in=ids)
+        .filter(criterio_encerrados(corte))
+        .values_list('pk', flat=True)
+    )
+    if not ids:
+        return 0
+    campos = [f.attname for f in arquivo_model._meta.concrete_fields if f.attname != 'arquivado_em']
+    arquivo_model.objects.bulk_create(
+        [arquivo_model(**linha) for linha in model.objects.filter(pk__in=ids).values(*campos)]
+    )
+
+    if model is RegulacaoExame:
+        item_tipo, msg_model, acao_fk = 'exame', PendenciaMensagemExame, 'exame_id__in'
+    else:
+        item_tipo, msg_model, acao_fk = 'consulta', PendenciaMensagemConsulta, 'consulta_id__in'
+    msg_ids = list(msg_model.objects.filter(**{f'{item_tipo}_id__in': ids}).values_list('pk', flat=True))
+    if msg_ids:
+        arquivar_mensagens(msg_model, item_tipo, msg_ids)
+    acao_ids = list(AcaoUsuario.objects.filter(**{acao_fk: ids}).values_list('pk', flat=True))
+    if acao_ids:
+        arquivar_acoes(acao_ids)
+
+    model.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+# ---------- Leitura combinada ----------
+
+class HistoricoUnificado:
+    """Sequência paginável sobre uma tabela quente e seu arquivo, por data de solicitação.
+
+    A ordenação e o recorte da página são feitos no banco (``UNION ALL`` só de
+    ``id``/``data_solicitacao``); apenas os itens da página são carregados, com
+    ``select_related``. Compatível com ``django.core.paginator.Paginator``.
+    """
+
+    def __init__(self, quente_qs, arquivo_qs, select_related: Iterable[str] = ()):
+        self.quente_qs = quente_qs
+        self.arquivo_qs = arquivo_qs
+        self.select_related = tuple(select_related)
+        self._count = None
+
+    def _chaves(self):
+        def _ids(qs, arquivado):
+            return (
+                qs.order_by()
+                .annotate(origem_arquivo=Value(arquivado, output_field=BooleanField()))
+                .values_list('id', 'data_solicitacao', 'origem_arquivo')
+            )
+        return _ids(self.quente_qs, False).union(_ids(self.arquivo_qs, True), all=True)
+
+    def count(self) -> int:
+        if self._count is None:
+            self._count = self._chaves().count()
+        return self._count
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[0:self.count()])
+
+    def __getitem__(self, k):
+        if not isinstance(k, slice):
+            return self[k:k + 1][0]
+        chaves = list(self._chaves().order_by('-data_solicitacao', '-id')[k])
+        quentes = self._carregar(self.quente_qs, [pk for pk, _, arq in chaves if not arq])
+        arquivados = self._carregar(self.arquivo_qs, [pk for pk, _, arq in chaves if arq])
+        itens: List = []
+        for pk, _, arq in chaves:
+            obj = (arquivados if arq else quentes).get(pk)
+            if obj is not None:
+                itens.append(obj)
+        return itens
+
+    def _carregar(self, qs, ids):
+        if not ids:
+            return {}
+        if self.select_related:
+            qs = qs.select_related(*self.select_related)
+        return qs.order_by().in_bulk(ids)
+
+
+def contar(model, **filtros) -> int:
+    """``COUNT`` de itens na tabela quente e no arquivo com os mesmos filtros (relatórios)."""
+    return model.objects.filter(**filtros).count() + ARQUIVO_DE[model].objects.filter(**filtros).count()
@@ -0,0 +1,88 @@
+"""Registro de ações dos usuários (``AcaoUsuario``) em lote.
+
+As ações de uma requisição/transação são acumuladas em memória e gravadas com um
+único ``bulk_create`` depois do commit (``transaction.on_commit``), fora do caminho
+crítico do regulador. Se a transação for desfeita, nada é gravado.
+
+Uso::
+
+    with transaction.atomic(), auditoria.lote() as audit:
+        ...
+        audit.registrar(request.user, 'negar_exame', exame=inst, paciente_nome=paciente.nome)
+
+Com ``REGULACAO_AUDITORIA_ASSINCRONA = True`` nas settings, a gravação é entregue a
+uma thread de fundo (uma única, para preservar a ordem).
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import AcaoUsuario
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='auditoria')
+    return _executor
+
+
+def _gravar_agora(objs: List[AcaoUsuario]) -> None:
+    try:
+        AcaoUsuario.objects.bulk_create(objs)
+    except Exception:
+        logger.exception('Falha ao gravar %s ação(ões) de auditoria.', len(objs))
+
+
+def _gravar_em_fundo(objs: List[AcaoUsuario]) -> None:
+    try:
+        _gravar_agora(objs)
+    finally:
+        # Conexão própria da thread de fundo
+        connection.close()
+
+
+def gravar(objs: List[AcaoUsuario]) -> None:
+    """Grava as ações informadas (síncrono ou em fundo, conforme settings)."""
+    if not objs:
+        return
+    if getattr(settings, 'REGULACAO_AUDITORIA_ASSINCRONA', False):
+        _get_executor().submit(_gravar_em_fundo, objs)
+    else:
+        _gravar_agora(objs)
+
+
+class LoteAuditoria:
+    """Acumula ações de auditoria até o fim do bloco ``lote()``."""
+
+    def __init__(self):
+        self.acoes: List[AcaoUsuario] = []
+
+    def registrar(self, usuario, tipo_acao: str, *, exame=None, consulta=None,
+                  paciente_nome: str = '', motivo: str = '') -> None:
+        self.acoes.append(AcaoUsuario(
+            usuario=usuario,
+            tipo_acao=tipo_acao,
+            exame=exame,
+            consulta=consulta,
+            paciente_nome=paciente_nome or '',
+            motivo=motivo or '',
+        ))
+
+
+@contextmanager
+def lote():
+    """Abre um lote de auditoria; grava após o commit se o bloco terminar sem erro."""
+    buffer = LoteAuditoria()
+    yield buffer
+    if buffer.acoes:
+        acoes = list(buffer.acoes)
+        transaction.on_commit(lambda: gravar(acoes))
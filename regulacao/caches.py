@@ -0,0 +1,15 @@
+"""Validade das chaves de cache da regulação conforme o backend configurado.
+
+Com Redis (``REDIS_URL``) o cache é compartilhado entre processos e as
+invalidações feitas por um worker valem para todos. Sem ele o ``LocMemCache`` é
+por processo: um contador ajustado ou uma chave descartada em um worker continua
+antiga nos demais. Nesse caso a validade é limitada por
+``REGULACAO_CACHE_TIMEOUT_MAX`` e a divergência entre workers dura no máximo isso.
+"""
+from django.conf import settings
+
+
+def validade(segundos: int) -> int:
+    """``segundos``, limitado a ``REGULACAO_CACHE_TIMEOUT_MAX`` quando o cache é local."""
+    limite = getattr(settings, 'REGULACAO_CACHE_TIMEOUT_MAX', None)
+    return segundos if limite is None else min(segundos, limite)
@@ -0,0 +1,94 @@
+"""Busca no catálogo de tipos de exame (seletor do formulário de solicitação).
+
+O formulário não renderiza mais o catálogo inteiro: o seletor consulta
+``tipo_exame_busca`` conforme o usuário digita. A busca combina prefixo (nome,
+código, código SUS) e similaridade por trigramas no nome (``pg_trgm``) e ordena
+por: prefixo primeiro, depois frequência de uso recente, depois similaridade.
+
+A frequência de uso (solicitações por tipo nos últimos ``DIAS_USO`` dias) é um
+único ``GROUP BY`` mantido em cache.
+"""
+from datetime import timedelta
+from typing import Dict
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core.cache import cache
+from django.db.models import BooleanField, Case, Count, Q, Value, When
+from django.utils import timezone
+
+from .models import RegulacaoExame, TipoExame
+
+CACHE_KEY_USO = 'regulacao:catalogo:uso_tipos_exame'
+CACHE_TIMEOUT_USO = 60 * 60
+DIAS_USO = 365
+MAX_CANDIDATOS = 200
+TAMANHO_PAGINA = 20
+MIN_SIMILARIDADE = 0.2
+
+
+def uso_por_tipo() -> Dict[int, int]:
+    """Quantidade de solicitações recentes por tipo de exame (cache de 1h)."""
+    uso = cache.get(CACHE_KEY_USO)
+    if uso is None:
+        desde = timezone.now() - timedelta(days=DIAS_USO)
+        uso = dict(
+            RegulacaoExame.objects.filter(data_solicitacao__gte=desde)
+            .order_by()
+            .values_list('tipo_exame_id')
+            .annotate(n=Count('id'))
+            .values_list('tipo_exame_id', 'n')
+        )
+        cache.set(CACHE_KEY_USO, uso, CACHE_TIMEOUT_USO)
+    return uso
+
+
+def buscar_tipos_exame(termo: str, pagina: int = 1, tamanho: int = TAMANHO_PAGINA) -> dict:
+    """Uma página de tipos de exame ativos que casam com ``termo``.
+
+    Sem termo, devolve os mais usados. Retorna ``{'results', 'page', 'has_next'}``.
+    """
+    termo = (termo or '').strip()
+    pagina = max(1, pagina)
+    tamanho = max(1, min(tamanho, 50))
+    uso = uso_por_tipo()
+    ativos = TipoExame.objects.filter(ativo=True)
+
+    if not termo:
+        ids = [pk for pk, _ in sorted(uso.items(), key=lambda kv: -kv[1])][:MAX_CANDIDATOS]
+        por_id = ativos.in_bulk(ids)
+        candidatos = [por_id[pk] for pk in ids if pk in por_id]
+        if len(candidatos) < MAX_CANDIDATOS:
+            candidatos += list(ativos.exclude(pk__in=ids).order_by('nome')[:MAX_CANDIDATOS - len(candidatos)])
+    else:
+        prefixo = Q(nome__istartswith=termo) | Q(codigo__istartswith=termo) | Q(codigo_sus__startswith=termo)
+        filtro = prefixo | Q(nome__icontains=termo)
+        if len(termo) >= 3:
+            filtro |= Q(nome__trigram_similar=termo)
+        candidatos = list(
+            ativos.filter(filtro)
+            .annotate(
+                eh_prefixo=Case(When(prefixo, then=Value(True)), default=Value(False), output_field=BooleanField()),
+                similaridade=TrigramSimilarity('nome', termo),
+            )
+            .order_by('-eh_prefixo', '-similaridade', 'nome')[:MAX_CANDIDATOS]
+        )
+        candidatos = [
+            t for t in candidatos if t.eh_prefixo or t.similaridade >= MIN_SIMILARIDADE or termo.lower() in t.nome.lower()
+        ]
+        candidatos.sort(key=lambda t: (not t.eh_prefixo, -uso.get(t.pk, 0), -t.similaridade, t.nome))
+
+    inicio = (pagina - 1) * tamanho
+    pagina_itens = candidatos[inicio:inicio + tamanho]
+    return {
+        'results': [
+            {
+                'id': t.pk,
+                'nome': t.nome,
+                'codigo_sus': t.codigo_sus,
+                'uso': uso.get(t.pk, 0),
+            }
+            for t in pagina_itens
+        ],
+        'page': pagina,
+        'has_next': len(candidatos) > inicio + tamanho,
+    }
@@ -0,0 +1,60 @@
+"""Código de barras Code 128 (conjunto B) em SVG, sem dependências externas.
+
+Usado nos comprovantes impressos para codificar o ``numero_protocolo``
+(``exa19102025-0001``), lido pelo leitor da recepção (``recepcao_checkin``).
+Leitores USB comuns funcionam como teclado: digitam o texto e enviam Enter.
+"""
+from django.utils.html import escape
+
+# Larguras (barra, espaço, barra, espaço, barra, espaço) dos símbolos 0–105; 106 é a parada
+_PADROES = (
+    '212222', '222122', '222221', '121223', '121322', '131222', '122213', '122312', '132212', '221213',
+    '221312', '231212', '112232', '122132', '122231', '113222', '123122', '123221', '223211', '221132',
+    '221231', '213212', '223112', '312131', '311222', '321122', '321221', '312212', '322112', '322211',
+    '212123', '212321', '232121', '111323', '131123', '131321', '112313', '132113', '132311', '211313',
+    '231113', '231311', '112133', '112331', '132131', '113123', '113321', '133121', '313121', '211331',
+    '231131', '213113', '213311', '213131', '311123', '311321', '331121', '312113', '312311', '332111',
+    '314111', '221411', '431111', '111224', '111422', '121124', '121421', '141122', '141221', '112214',
+    '112412', '122114', '122411', '142112', '142211', '241211', '221114', '413111', '241112', '134111',
+    '111242', '121142', '121241', '114212', '124112', '124211', '411212', '421112', '421211', '212141',
+    '214121', '412121', '111143', '111341', '131141', '114113', '114311', '411113', '411311', '113141',
+    '114131', '311141', '411131', '211412', '211214', '211232', '2331112',
+)
+INICIO_B = 104
+PARADA = 106
+MARGEM = 10  # zona de silêncio, em módulos
+
+
+def simbolos(texto: str) -> list:
+    """Valores Code 128 B de ``texto`` com início, dígito verificador e parada."""
+    valores = []
+    for c in texto:
+        if not 32 <= ord(c) <= 126:
+            raise ValueError(f'Caractere fora do Code 128 B: {c!r}')
+        valores.append(ord(c) - 32)
+    verificador = (INICIO_B + sum(i * v for i, v in enumerate(valores, start=1))) % 103
+    return [INICIO_B, *valores, verificador, PARADA]
+
+
+def barras(texto: str) -> list:
+    """``[(inicio, largura), ...]`` das barras, em módulos, já com a zona de silêncio."""
+    x, resultado = MARGEM, []
+    for simbolo in simbolos(texto):
+        for i, largura in enumerate(_PADROES[simbolo]):
+            largura = int(largura)
+            if i % 2 == 0:
+                resultado.append((x, largura))
+            x += largura
+    return resultado
+
+
+def svg(texto: str, altura: int = 40, modulo: float = 1.5) -> str:
+    """SVG do código de barras de ``texto`` (``modulo`` = largura da barra mais fina, em px)."""
+    lista = barras(texto)
+    total = lista[-1][0] + lista[-1][1] + MARGEM
+    retangulos = ''.join(f'<rect x="{x}" width="{w}" height="{altura}"/>' for x, w in lista)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{total * modulo:g}" height="{altura}" '
+        f'viewBox="0 0 {total} {altura}" preserveAspectRatio="none" shape-rendering="crispEdges" '
+        f'role="img" aria-label="{escape(texto)}">{retangulos}</svg>'
+    )
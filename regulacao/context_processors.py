@@ -0,0 +1,25 @@
+from typing import Dict
+
+
+def notificacoes_badge(request) -> Dict[str, int]:
+    """Contador de notificações não lidas para o badge do menu.
+    Lido do cache por usuário (ver regulacao.notificacoes); não consulta o banco quando em cache.
+    """
+    user = getattr(request, 'user', None)
+    if not (user and user.is_authenticated):
+        return {}
+    from .notificacoes import contar_nao_lidas
+    try:
+        return {'notif_nao_lidas_count': contar_nao_lidas(user)}
+    except Exception:
+        return {}
+
+
+def eventos_config(request) -> Dict[str, object]:
+    """Modo de atualização dos contadores em base.html: SSE (ASGI) ou consulta periódica."""
+    from django.conf import settings
+    from .eventos import INTERVALO_POLLING
+    return {
+        'regulacao_sse_asgi': getattr(settings, 'REGULACAO_SSE_ASGI', False),
+        'regulacao_polling_ms': INTERVALO_POLLING * 1000,
+    }
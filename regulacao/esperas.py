@@ -0,0 +1,207 @@
+"""Tempos de espera da regulação: percentis em SQL e agregados diários.
+
+Duas etapas, em dias: ``regulacao`` (solicitação → regulação) e ``agendamento``
+(regulação → data agendada, só autorizados com data). Os percentis são calculados
+no PostgreSQL com ``percentile_cont`` sobre um ``GROUP BY`` por dia de regulação e
+dimensão (geral, especialidade, UBS, tipo de exame) e gravados em ``EsperaDiaria``.
+
+``atualizar`` é incremental: recalcula apenas os últimos ``REPROCESSAR_DIAS`` dias
+já agregados (decisões revistas, datas remarcadas) até hoje. Os painéis leem só a
+tabela de agregados: ``serie`` (por dia, com média móvel de 7 dias por função de
+janela, ou por semana/mês) e ``comparativo`` (chaves de uma dimensão no período).
+Semanas e meses combinam os percentis diários pela média ponderada pela quantidade
+(aproximação; o percentil exato exigiria reler as tabelas quentes).
+
+As tabelas de arquivo não são lidas: ``arquivar_historico`` atualiza os agregados
+antes de mover itens, de modo que os dias já agregados não perdem dados.
+"""
+from datetime import date, timedelta
+from typing import List, Optional
+
+from django.db import transaction
+from django.db.models import (
+    Aggregate, Avg, Count, DurationField, ExpressionWrapper, F, FloatField, Max, Min, Q, Sum, Value, Window,
+)
+from django.db.models.functions import Extract, TruncDate, TruncMonth, TruncWeek
+from django.db.models.expressions import RowRange
+from django.utils import timezone
+
+from secretaria_it.datas import filtro_periodo
+
+from .models import EsperaDiaria, RegulacaoConsulta, RegulacaoExame
+
+REPROCESSAR_DIAS = 3
+MAX_DIAS_SERIE = 3 * 366
+AGRUPAMENTOS = {'dia': None, 'semana': TruncWeek, 'mes': TruncMonth}
+ETAPAS = ('regulacao', 'agendamento')
+
+
+class PercentilCont(Aggregate):
+    """``percentile_cont(fracao) WITHIN GROUP (ORDER BY expressao)`` (PostgreSQL)."""
+    function = 'PERCENTILE_CONT'
+    template = '%(function)s(%(fracao)s) WITHIN GROUP (ORDER BY %(expressions)s)'
+    output_field = FloatField()
+
+    def __init__(self, expression, fracao: float, **extra):
+        super().__init__(expression, fracao=float(fracao), **extra)
+
+
+def _dias(expressao):
+    return ExpressionWrapper(Extract(ExpressionWrapper(expressao, output_field=DurationField()), 'epoch')
+                             / Value(86400.0), output_field=FloatField())
+
+
+ESPERA_REGULACAO = _dias(F('data_regulacao') - F('data_solicitacao'))
+ESPERA_AGENDAMENTO = _dias(F('data_agendada') - TruncDate('data_regulacao'))
+AGENDADO = Q(status='autorizado', data_agendada__isnull=False)
+
+_FONTES = {
+    'exame': (RegulacaoExame, {
+        'geral': None, 'especialidade': 'tipo_exame__especialidade_id', 'ubs': 'ubs_solicitante_id',
+        'tipo_exame': 'tipo_exame_id',
+    }),
+    'consulta': (RegulacaoConsulta, {
+        'geral': None, 'especialidade': 'especialidade_id', 'ubs': 'ubs_solicitante_id',
+    }),
+}
+
+
+def _agregados(model, ref: Optional[str], inicio: date, fim: date):
+    """Um ``GROUP BY`` (dia, chave) com as duas etapas, para dias de regulação em ``[inicio, fim]``."""
+    qs = (
+        model.objects
+        .filter(filtro_periodo('data_regulacao', inicio, fim))
+        .exclude(status='fila')
+        .annotate(dia=TruncDate('data_regulacao'), chave=F(ref) if ref else Value(0))
+    )
+    if ref:
+        qs = qs.filter(**{f'{ref}__isnull': False})
+    return qs.order_by().values('dia', 'chave').annotate(
+        regulacao_qtd=Count('id'),
+        regulacao_p50=PercentilCont(ESPERA_REGULACAO, 0.5),
+        regulacao_p90=PercentilCont(ESPERA_REGULACAO, 0.9),
+        regulacao_media=Avg(ESPERA_REGULACAO),
+        agendamento_qtd=Count('id', filter=AGENDADO),
+        agendamento_p50=PercentilCont(ESPERA_AGENDAMENTO, 0.5, filter=AGENDADO),
+        agendamento_p90=PercentilCont(ESPERA_AGENDAMENTO, 0.9, filter=AGENDADO),
+        agendamento_media=Avg(ESPERA_AGENDAMENTO, filter=AGENDADO),
+    )
+
+
+def calcular(inicio: date, fim: date) -> List[EsperaDiaria]:
+    """Agregados de ``[inicio, fim]`` (não gravados): um ``GROUP BY`` por tipo e dimensão."""
+    linhas = []
+    for tipo, (model, dimensoes) in _FONTES.items():
+        for dimensao, ref in dimensoes.items():
+            for valores in _agregados(model, ref, inicio, fim):
+                linhas.append(EsperaDiaria(tipo=tipo, dimensao=dimensao, **valores))
+    return linhas
+
+
+def atualizar(desde: Optional[date] = None, ate: Optional[date] = None) -> dict:
+    """Recalcula e grava os agregados de ``desde`` até ``ate`` (padrão: incremental até hoje).
+
+    Sem ``desde``, parte do último dia agregado menos ``REPROCESSAR_DIAS`` ou, na primeira
+    execução, da regulação mais antiga. Os dias do período são substituídos em uma transação.
+    """
+    ate = ate or timezone.localdate()
+    if desde is None:
+        ultimo = EsperaDiaria.objects.aggregate(m=Max('dia'))['m']
+        if ultimo:
+            desde = ultimo - timedelta(days=REPROCESSAR_DIAS)
+        else:
+            primeiras = [model.objects.aggregate(m=Min('data_regulacao'))['m'] for model in (RegulacaoExame,
+                                                                                            RegulacaoConsulta)]
+            primeiras = [timezone.localdate(m) for m in primeiras if m]
+            if not primeiras:
+                return {'desde': None, 'ate': ate.isoformat(), 'linhas': 0}
+            desde = min(primeiras)
+    linhas = calcular(desde, ate)
+    with transaction.atomic():
+        EsperaDiaria.objects.filter(dia__gte=desde, dia__lte=ate).delete()
+        EsperaDiaria.objects.bulk_create(linhas, batch_size=1000)
+    return {'desde': desde.isoformat(), 'ate': ate.isoformat(), 'linhas': len(linhas)}
+
+
+def _etapas(linha: dict, sufixo: str = '') -> dict:
+    def valor(etapa, k):
+        v = linha[f'{etapa}_{k}{sufixo}']
+        return round(v, 1) if v is not None else None
+
+    return {
+        etapa: {'qtd': linha[f'{etapa}_qtd{sufixo}'] or 0, **{k: valor(etapa, k) for k in ('p50', 'p90', 'media')}}
+        for etapa in ETAPAS
+    }
+
+
+_SUFIXO = '_periodo'
+
+
+def _ponderados():
+    """Combinação dos dias: percentis e médias ponderados pela quantidade de cada dia (``*_periodo``)."""
+    valores = {}
+    for etapa in ETAPAS:
+        qtd = f'{etapa}_qtd'
+        valores[qtd + _SUFIXO] = Sum(qtd)
+        for k in ('p50', 'p90', 'media'):
+            campo = f'{etapa}_{k}'
+            com_valor = Q(**{f'{campo}__isnull': False})
+            valores[campo + _SUFIXO] = ExpressionWrapper(
+                Sum(ExpressionWrapper(F(campo) * F(qtd), output_field=FloatField()), filter=com_valor)
+                / Sum(qtd, filter=com_valor, output_field=FloatField()),
+                output_field=FloatField(),
+            )
+    return valores
+
+
+def _filtro(tipo: str, dimensao: str, inicio: date, fim: date):
+    if tipo not in _FONTES or dimensao not in _FONTES[tipo][1]:
+        raise ValueError('Tipo ou dimensão inválidos.')
+    if fim < inicio or (fim - inicio).days > MAX_DIAS_SERIE:
+        raise ValueError(f'Período inválido (máximo de {MAX_DIAS_SERIE} dias).')
+    return EsperaDiaria.objects.filter(tipo=tipo, dimensao=dimensao, dia__gte=inicio, dia__lte=fim)
+
+
+def serie(tipo: str, dimensao: str, chave: int, inicio: date, fim: date, agrupar: str = 'dia') -> list:
+    """Evolução da espera de uma chave: ``[{'periodo', 'regulacao', 'agendamento'}]``.
+
+    Por dia, cada ponto traz também ``p50_movel_7d`` (média móvel do p50 da etapa nos
+    últimos 7 dias com dados, calculada com ``AVG() OVER``).
+    """
+    if agrupar not in AGRUPAMENTOS:
+        raise ValueError('Agrupamento inválido.')
+    qs = _filtro(tipo, dimensao, inicio, fim).filter(chave=chave if dimensao != 'geral' else 0)
+    if agrupar == 'dia':
+        janela = {'order_by': F('dia').asc(), 'frame': RowRange(start=-6, end=0)}
+        linhas = qs.order_by('dia').values(
+            'dia', *(f'{e}_{k}' for e in ETAPAS for k in ('qtd', 'p50', 'p90', 'media')),
+        ).annotate(**{f'{e}_movel': Window(Avg(f'{e}_p50'), **janela) for e in ETAPAS})
+        resultado = []
+        for linha in linhas:
+            ponto = {'periodo': linha['dia'].isoformat(), **_etapas(linha)}
+            for etapa in ETAPAS:
+                movel = linha[f'{etapa}_movel']
+                ponto[etapa]['p50_movel_7d'] = round(movel, 1) if movel is not None else None
+            resultado.append(ponto)
+        return resultado
+    linhas = (
+        qs.annotate(periodo=AGRUPAMENTOS[agrupar]('dia'))
+        .order_by()
+        .values('periodo')
+        .annotate(**_ponderados())
+        .order_by('periodo')
+    )
+    return [{'periodo': linha['periodo'].isoformat(), **_etapas(linha, _SUFIXO)} for linha in linhas]
+
+
+def comparativo(tipo: str, dimensao: str, inicio: date, fim: date) -> list:
+    """Chaves da dimensão no período, da maior para a menor p90 de regulação."""
+    linhas = (
+        _filtro(tipo, dimensao, inicio, fim)
+        .order_by()
+        .values('chave')
+        .annotate(**_ponderados())
+    )
+    resultado = [{'chave': linha['chave'], **_etapas(linha, _SUFIXO)} for linha in linhas]
+    resultado.sort(key=lambda x: -(x['regulacao']['p90'] or 0))
+    return resultado
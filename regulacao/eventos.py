@@ -0,0 +1,133 @@
+"""Eventos em tempo real da regulação (Server-Sent Events).
+
+Um ``Broadcaster`` em processo distribui eventos para as conexões SSE abertas
+(``eventos_stream`` em views). Cada conexão assina canais:
+
+- ``user:<id>``: novas notificações do usuário;
+- ``ubs:<id>``: mudanças de fila/pendência de uma UBS (UBS do usuário ou malote do regulador).
+
+A publicação é feita a partir de código síncrono (views, serviços) e só ocorre
+após o commit da transação. Em implantações com vários processos, as conexões
+também recalculam os contadores periodicamente (``INTERVALO_RECALCULO``), de modo
+que eventos publicados em outro processo aparecem com atraso limitado.
+
+O stream mantém a conexão aberta indefinidamente e só é servido quando
+``REGULACAO_SSE_ASGI`` está ligado (servidor ASGI). Sob WSGI cada conexão
+prenderia um worker; nesse caso a página consulta ``eventos_contadores`` a cada
+``INTERVALO_POLLING`` segundos.
+"""
+import asyncio
+import json
+import threading
+from typing import Dict, Iterable, Set, Tuple
+
+from django.db import transaction
+from django.db.models import Count, Q
+
+INTERVALO_HEARTBEAT = 25  # segundos
+INTERVALO_RECALCULO = 120  # segundos
+INTERVALO_POLLING = 60  # segundos, sem ASGI
+
+
+class Broadcaster:
+    """Distribui eventos para filas asyncio registradas por canal (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinaturas: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def assinar(self, canais: Iterable[str]) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        fila: asyncio.Queue = asyncio.Queue(maxsize=100)
+        with self._lock:
+            for canal in canais:
+                self._assinaturas.setdefault(canal, set()).add((loop, fila))
+        return fila
+
+    def cancelar(self, fila: asyncio.Queue) -> None:
+        with self._lock:
+            for canal in list(self._assinaturas.keys()):
+                subs = self._assinaturas[canal]
+                subs.difference_update({s for s in subs if s[1] is fila})
+                if not subs:
+                    del self._assinaturas[canal]
+
+    def publicar(self, canal: str, evento: str, dados: dict) -> None:
+        with self._lock:
+            subs = list(self._assinaturas.get(canal, ()))
+        for loop, fila in subs:
+            try:
+                loop.call_soon_threadsafe(_enfileirar, fila, (evento, dados))
+            except RuntimeError:
+                # Loop encerrado: a conexão será removida ao sair do stream
+                pass
+
+
+def _enfileirar(fila: asyncio.Queue, item) -> None:
+    try:
+        fila.put_nowait(item)
+    except asyncio.QueueFull:
+        # Cliente lento: descartar; o recálculo periódico corrige os contadores
+        pass
+
+
+broadcaster = Broadcaster()
+
+
+def publicar_notificacoes(notificacoes) -> None:
+    """Publica novas notificações (após commit) no canal de cada usuário."""
+    payload = [(n.user_id, {'id': n.pk, 'texto': n.texto, 'url': n.url}) for n in notificacoes]
+    if not payload:
+        return
+
+    def _publicar():
+        for user_id, dados in payload:
+            broadcaster.publicar(f'user:{user_id}', 'notificacao', dados)
+
+    transaction.on_commit(_publicar)
+
+
+def publicar_mudanca_ubs(ubs_ids: Iterable[int]) -> None:
+    """Avisa (após commit) que fila/pendências das UBS informadas mudaram."""
+    ids = {int(i) for i in ubs_ids if i}
+    if not ids:
+        return
+
+    def _publicar():
+        for ubs_id in ids:
+            broadcaster.publicar(f'ubs:{ubs_id}', 'mudanca', {'ubs_id': ubs_id})
+
+    transaction.on_commit(_publicar)
+
+
+def contadores_ubs(ubs_id: int) -> dict:
+    """Contadores exibidos nos painéis (pacientes em fila e pendências) de uma UBS.
+    Duas consultas agregadas (exames e consultas).
+    """
+    from .models import RegulacaoConsulta, RegulacaoExame
+
+    agg = {
+        'fila_pacientes': Count('paciente_id', filter=Q(status='fila'), distinct=True),
+        'pendentes': Count('id', filter=Q(status='pendente')),
+    }
+    ex = RegulacaoExame.objects.filter(ubs_solicitante_id=ubs_id, status__in=['fila', 'pendente']).aggregate(**agg)
+    co = RegulacaoConsulta.objects.filter(ubs_solicitante_id=ubs_id, status__in=['fila', 'pendente']).aggregate(**agg)
+    return {
+        'pacientes_fila_exames_count': ex['fila_pacientes'],
+        'pacientes_fila_consultas_count': co['fila_pacientes'],
+        'pend_ex_count': ex['pendentes'],
+        'pend_co_count': co['pendentes'],
+    }
+
+
+def contadores_usuario(user, ubs_id) -> dict:
+    """Contadores da UBS (quando houver) mais as notificações não lidas do usuário."""
+    from .notificacoes import contar_nao_lidas
+
+    dados = contadores_ubs(ubs_id) if ubs_id else {}
+    dados['notif_nao_lidas_count'] = contar_nao_lidas(user)
+    return dados
+
+
+def formatar_sse(evento: str, dados: dict) -> str:
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
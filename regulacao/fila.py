@@ -0,0 +1,91 @@
+"""Fila de trabalho dos reguladores: "próximos itens" por prioridade e tempo de espera.
+
+``puxar`` devolve os próximos N itens em ``fila`` ordenados por prioridade (alta,
+média, normal) e data de solicitação, no escopo pedido (UBS/malote e
+especialidade ou tipo de exame). A leitura usa ``SELECT ... FOR UPDATE SKIP
+LOCKED``: dois reguladores puxando ao mesmo tempo recebem itens diferentes, sem
+esperar um pelo outro. Os itens entregues ficam reservados ao regulador por
+``RESERVA_MINUTOS`` (``reservado_por``/``reservado_ate``), o que os tira da fila
+dos demais até serem decididos, liberados ou a reserva expirar.
+
+A ordenação coincide com os índices parciais ``*_fila_prio_idx`` e
+``*_fila_ubs_prio_idx`` (ver ``models.ordem_prioridade``).
+"""
+from datetime import timedelta
+from typing import Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import RegulacaoConsulta, RegulacaoExame, ordem_prioridade
+
+RESERVA_MINUTOS = 15
+MAX_ITENS = 50
+
+_TIPOS = {
+    'exame': (RegulacaoExame, 'tipo_exame', 'ex'),
+    'consulta': (RegulacaoConsulta, 'especialidade', 'co'),
+}
+
+
+def _disponiveis(model, usuario, agora):
+    return model.objects.filter(status='fila').filter(
+        Q(reservado_ate__isnull=True) | Q(reservado_ate__lt=agora) | Q(reservado_por=usuario)
+    )
+
+
+def puxar(usuario, tipo: str, quantidade: int = 10, *, ubs_id: Optional[int] = None,
+          especialidade_id: Optional[int] = None, tipo_exame_id: Optional[int] = None) -> List[dict]:
+    """Reserva e devolve os próximos ``quantidade`` itens de ``tipo`` (``exame``/``consulta``)."""
+    model, ref, only = _TIPOS[tipo]
+    quantidade = max(1, min(int(quantidade), MAX_ITENS))
+    agora = timezone.now()
+    ate = agora + timedelta(minutes=RESERVA_MINUTOS)
+    qs = _disponiveis(model, usuario, agora)
+    if ubs_id:
+        qs = qs.filter(ubs_solicitante_id=ubs_id)
+    if tipo == 'exame':
+        if tipo_exame_id:
+            qs = qs.filter(tipo_exame_id=tipo_exame_id)
+        elif especialidade_id:
+            qs = qs.filter(tipo_exame__especialidade_id=especialidade_id)
+    elif especialidade_id:
+        qs = qs.filter(especialidade_id=especialidade_id)
+
+    with transaction.atomic():
+        itens = list(
+            qs.select_related('paciente', ref, 'ubs_solicitante')
+            .select_for_update(of=('self',), skip_locked=True)
+            .order_by(ordem_prioridade(), 'data_solicitacao', 'pk')[:quantidade]
+        )
+        for item in itens:
+            item.reservado_por = usuario
+            item.reservado_ate = ate
+        if itens:
+            # Só a reserva muda: não toca em ``atualizado_em`` (o feed de mudanças não a vê)
+            model.objects.bulk_update(itens, ['reservado_por', 'reservado_ate'])
+
+    return [
+        {
+            'tipo': tipo,
+            'id': item.pk,
+            'numero_protocolo': item.numero_protocolo,
+            'prioridade': item.prioridade,
+            'data_solicitacao': item.data_solicitacao.isoformat(),
+            'paciente_id': item.paciente_id,
+            'paciente_nome': item.paciente.nome,
+            'ref_nome': getattr(getattr(item, ref), 'nome', ''),
+            'ubs_nome': item.ubs_solicitante.nome,
+            'reservado_ate': ate.isoformat(),
+            'url': reverse('paciente-pedido', kwargs={'paciente_id': item.paciente_id}) + f'?only={only}',
+        }
+        for item in itens
+    ]
+
+
+def liberar(usuario, tipo: str, ids: Iterable[int]) -> int:
+    """Desfaz as reservas do usuário nos itens ``ids`` (devolve quantos foram liberados)."""
+    model = _TIPOS[tipo][0]
+    return model.objects.filter(pk__in=list(ids), reservado_por=usuario).update(reservado_por=None, reservado_ate=None)
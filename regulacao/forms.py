@@ -1,6 +1,7 @@
 from django import forms
 from django.db.models import Q
 from pacientes.models import Paciente
+from . import vagas
 from .models import UBS, MedicoSolicitante, TipoExame, RegulacaoExame, Especialidade, RegulacaoConsulta, LocalAtendimento, MedicoAmbulatorio, AgendaMedica, AgendaMedicaDia
 
 
@@ -432,10 +433,11 @@ class RegulacaoExameCreateForm(forms.ModelForm):
     """Formulário de criação com múltiplos exames no mesmo pedido."""
     tipos_exame = forms.ModelMultipleChoiceField(
         label='Tipos de Exame',
+        # Restrito no __init__ aos tipos selecionados; a busca é feita em ``tipo-exame-busca``
         queryset=TipoExame.objects.filter(ativo=True).order_by('nome'),
         widget=forms.SelectMultiple(attrs={'class': 'form-select', 'size': 8}),
         required=True,
-        help_text='Segure Ctrl (ou Cmd) para selecionar mais de um.'
+        help_text='Busque pelo nome ou código SUS e adicione quantos quiser.'
     )
 
     class Meta:
@@ -496,6 +498,27 @@ class RegulacaoExameCreateForm(forms.ModelForm):
             if pre_ids:
                 self.fields['tipos_exame'].initial = pre_ids
 
+        # Renderizar/validar apenas os tipos selecionados (o catálogo completo não vai para a página)
+        tipos_ids = set()
+        if self.is_bound:
+            valores = self.data.getlist(self.add_prefix('tipos_exame')) if hasattr(self.data, 'getlist') \
+                else (self.data.get(self.add_prefix('tipos_exame')) or [])
+            for v in valores:
+                try:
+                    tipos_ids.add(int(v))
+                except (TypeError, ValueError):
+                    continue
+        else:
+            for v in (self.fields['tipos_exame'].initial or []):
+                try:
+                    tipos_ids.add(int(getattr(v, 'pk', v)))
+                except (TypeError, ValueError):
+                    continue
+        self.fields['tipos_exame'].queryset = (
+            TipoExame.objects.filter(ativo=True, pk__in=tipos_ids).order_by('nome') if tipos_ids
+            else TipoExame.objects.none()
+        )
+
     def clean(self):
         cleaned = super().clean()
         # Regras UBS: ubs obrigatoriamente igual do usuário e médico da mesma UBS
@@ -621,7 +644,7 @@ class RegulacaoExameBatchForm(forms.ModelForm):
                 ).first()
                 if not agenda_dia:
                     raise forms.ValidationError('Não há agenda cadastrada para este médico nesta data (agenda do dia).')
-                capacidade = agenda_dia.capacidade or 0
+                capacidade = vagas.capacidade_efetiva(agenda_dia)
                 if usados_exames + usados_consultas >= capacidade:
                     raise forms.ValidationError('Não há vagas disponíveis para este médico nesta data (agenda do dia).')
         if negar:
@@ -733,7 +756,7 @@ class RegulacaoConsultaBatchForm(forms.ModelForm):
                 agenda_dia = AgendaMedicaDia.objects.filter(medico=medico, especialidade=espec, data=data, ativo=True).first()
                 if not agenda_dia:
                     raise forms.ValidationError('Não há agenda cadastrada para este médico nesta data (agenda do dia).')
-                if usados >= (agenda_dia.capacidade or 0):
+                if usados >= vagas.capacidade_efetiva(agenda_dia):
                     raise forms.ValidationError('Não há vagas disponíveis para este médico nesta data (agenda do dia).')
             # Não permitir datas passadas
             from django.utils import timezone
@@ -0,0 +1,212 @@
+"""Recebimento em lote de solicitações enviadas pelos sistemas das UBS (API).
+
+Um lote traz exames e consultas de vários pacientes. Tudo é resolvido com
+poucas consultas, independentemente do tamanho do lote:
+
+- pacientes por CPF/CNS (um ``SELECT`` para o lote inteiro);
+- tipos de exame, especialidades e médicos solicitantes (um ``SELECT`` cada);
+- duplicidades em fila/autorizado com agenda futura (um ``SELECT`` por tabela),
+  além de repetições dentro do próprio lote;
+- inserção com um ``bulk_create`` por tabela e protocolos reservados em bloco
+  (``SequenciaProtocolo.reservar``).
+
+Cada item recebe um resultado próprio, na mesma ordem do envio; itens inválidos
+não impedem os demais.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from pacientes.models import Paciente
+
+from .models import (
+    UBS,
+    Especialidade,
+    MedicoSolicitante,
+    RegulacaoConsulta,
+    RegulacaoExame,
+    SequenciaProtocolo,
+    TipoExame,
+)
+from .signals import apos_gravacao_em_lote
+
+MAX_ITENS = 500
+
+_TIPOS = {
+    'exame': (RegulacaoExame, 'exa', 'tipo_exame'),
+    'consulta': (RegulacaoConsulta, 'con', 'especialidade'),
+}
+
+
+def somente_digitos(valor) -> str:
+    return ''.join(filter(str.isdigit, str(valor or '')))
+
+
+def _cpf_formatado(cpf: str) -> str:
+    return f"{cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
+
+
+def _resultado(pos: int, item: dict, ok: bool, erro: str = '', obj=None) -> dict:
+    res = {'indice': pos, 'referencia': item.get('referencia') or '', 'tipo': item.get('tipo'), 'ok': ok}
+    if obj is not None:
+        res['id'] = obj.pk
+        res['numero_protocolo'] = obj.numero_protocolo
+    if erro:
+        res['erro'] = erro
+    return res
+
+
+def localizar_pacientes(cpfs: Iterable[str], cnss: Iterable[str]) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """Mapas ``cpf -> paciente_id`` e ``cns -> paciente_id`` (só dígitos) em uma consulta.
+
+    O CPF é gravado sem máscara pelo cadastro, mas registros antigos podem tê-la;
+    as duas formas são procuradas.
+    """
+    cpfs = {c for c in map(somente_digitos, cpfs) if len(c) == 11}
+    cnss = {c for c in map(somente_digitos, cnss) if len(c) == 15}
+    if not (cpfs or cnss):
+        return {}, {}
+    filtro = Q()
+    if cpfs:
+        filtro |= Q(cpf__in=cpfs | {_cpf_formatado(c) for c in cpfs})
+    if cnss:
+        filtro |= Q(cns__in=cnss)
+    por_cpf, por_cns = {}, {}
+    for pid, cpf, cns in Paciente.objects.filter(filtro).values_list('id', 'cpf', 'cns'):
+        if cpf and somente_digitos(cpf) in cpfs:
+            por_cpf[somente_digitos(cpf)] = pid
+        if cns and cns in cnss:
+            # CNS não é único no cadastro: fica o primeiro encontrado
+            por_cns.setdefault(cns, pid)
+    return por_cpf, por_cns
+
+
+def _abertos(model, ref: str, pids: Iterable[int], ref_ids: Iterable[int]) -> set:
+    """Pares ``(paciente_id, ref_id)`` já em fila ou autorizados com agenda futura/sem data."""
+    hoje = timezone.localdate()
+    return set(
+        model.objects
+        .filter(paciente_id__in=set(pids), **{f'{ref}_id__in': set(ref_ids)})
+        .filter(Q(status='fila') | (Q(status='autorizado') & (Q(data_agendada__isnull=True) | Q(data_agendada__gte=hoje))))
+        .order_by()
+        .values_list('paciente_id', f'{ref}_id')
+        .distinct()
+    )
+
+
+def _resolver_referencias(itens: List[dict]) -> Tuple[dict, dict, dict, dict]:
+    """Tipos de exame (por id e por código SUS), especialidades e médicos (por CRM) do lote."""
+    tipo_ids = {i['tipo_exame_id'] for i in itens if i.get('tipo_exame_id')}
+    codigos = {i['codigo_sus'] for i in itens if i.get('codigo_sus') and not i.get('tipo_exame_id')}
+    tipos_por_id, tipos_por_codigo = {}, {}
+    if tipo_ids or codigos:
+        for t in TipoExame.objects.filter(Q(pk__in=tipo_ids) | Q(codigo_sus__in=codigos), ativo=True).only(
+                'id', 'codigo_sus'):
+            tipos_por_id[t.pk] = t
+            if t.codigo_sus in codigos:
+                tipos_por_codigo.setdefault(t.codigo_sus, t)
+    esp_ids = {i['especialidade_id'] for i in itens if i.get('especialidade_id')}
+    especialidades = Especialidade.objects.filter(ativa=True).in_bulk(esp_ids) if esp_ids else {}
+    crms = {i['medico_crm'] for i in itens if i.get('medico_crm')}
+    medicos = (
+        {m.crm: m for m in MedicoSolicitante.objects.filter(crm__in=crms, ativo=True)} if crms else {}
+    )
+    return tipos_por_id, tipos_por_codigo, especialidades, medicos
+
+
+def _paciente_do_item(item: dict, por_cpf: dict, por_cns: dict) -> Tuple[Optional[int], str]:
+    cpf = somente_digitos(item.get('cpf'))
+    cns = somente_digitos(item.get('cns'))
+    pid_cpf = por_cpf.get(cpf) if cpf else None
+    pid_cns = por_cns.get(cns) if cns else None
+    if pid_cpf and pid_cns and pid_cpf != pid_cns:
+        return None, 'CPF e CNS pertencem a pacientes diferentes.'
+    pid = pid_cpf or pid_cns
+    if not pid:
+        return None, 'Paciente não encontrado pelo CPF/CNS informado.'
+    return pid, ''
+
+
+def receber_solicitacoes(ubs: UBS, itens: List[dict]) -> List[dict]:
+    """Cria as solicitações válidas de ``itens`` para ``ubs`` e devolve um resultado por item.
+
+    Cada item (já validado quanto a formato, ver ``api.ItemSolicitacaoSerializer``) tem
+    ``tipo`` (``exame``/``consulta``), ``cpf`` e/ou ``cns``, ``tipo_exame_id`` ou
+    ``codigo_sus`` (exames), ``especialidade_id`` (consultas), ``medico_crm`` (médico
+    vinculado a ``ubs``), ``justificativa`` e, opcionalmente, ``prioridade``,
+    ``observacoes``, ``numero_pedido`` e ``referencia`` (identificador do sistema de
+    origem, devolvido no resultado).
+    """
+    resultados: List[Optional[dict]] = [None] * len(itens)
+    por_cpf, por_cns = localizar_pacientes(
+        (i.get('cpf') for i in itens), (i.get('cns') for i in itens)
+    )
+    tipos_por_id, tipos_por_codigo, especialidades, medicos = _resolver_referencias(itens)
+
+    # 1) Resolver paciente e referências de cada item
+    candidatos: Dict[str, List[Tuple[int, dict, int, object, MedicoSolicitante]]] = {'exame': [], 'consulta': []}
+    for pos, item in enumerate(itens):
+        pid, erro = _paciente_do_item(item, por_cpf, por_cns)
+        ref = medico = None
+        if not erro:
+            if item['tipo'] == 'exame':
+                ref = tipos_por_id.get(item.get('tipo_exame_id')) or tipos_por_codigo.get(item.get('codigo_sus'))
+                erro = '' if ref else 'Tipo de exame inexistente ou inativo.'
+            else:
+                ref = especialidades.get(item.get('especialidade_id'))
+                erro = '' if ref else 'Especialidade inexistente ou inativa.'
+        if not erro:
+            medico = medicos.get(item.get('medico_crm'))
+            if not medico:
+                erro = 'Médico solicitante não encontrado pelo CRM.'
+            elif medico.ubs_padrao_id != ubs.pk:
+                # Mesma regra de RegulacaoExameCreateForm.clean para usuários de UBS
+                erro = 'Escolha um médico vinculado à sua UBS.'
+        if erro:
+            resultados[pos] = _resultado(pos, item, False, erro)
+            continue
+        candidatos[item['tipo']].append((pos, item, pid, ref, medico))
+
+    # 2) Duplicidades (banco e lote) e inserção em bloco por tabela
+    criados = []
+    with transaction.atomic():
+        for tipo, (model, prefixo, ref_campo) in _TIPOS.items():
+            do_tipo = candidatos[tipo]
+            if not do_tipo:
+                continue
+            ocupados = _abertos(model, ref_campo, (c[2] for c in do_tipo), (c[3].pk for c in do_tipo))
+            novos = []
+            for pos, item, pid, ref, medico in do_tipo:
+                if (pid, ref.pk) in ocupados:
+                    resultados[pos] = _resultado(
+                        pos, item, False, 'Paciente já possui solicitação em fila ou com agendamento futuro.'
+                    )
+                    continue
+                ocupados.add((pid, ref.pk))
+                campos = dict(
+                    paciente_id=pid,
+                    ubs_solicitante=ubs,
+                    medico_solicitante=medico,
+                    justificativa=item['justificativa'],
+                    prioridade=item.get('prioridade') or 'normal',
+                    observacoes_solicitacao=item.get('observacoes') or '',
+                    status='fila',
+                    **{ref_campo: ref},
+                )
+                if tipo == 'exame':
+                    campos['numero_pedido'] = item.get('numero_pedido') or ''
+                novos.append((pos, item, model(**campos)))
+            if not novos:
+                continue
+            protocolos = SequenciaProtocolo.reservar(model, prefixo, len(novos))
+            for (_, _, obj), protocolo in zip(novos, protocolos):
+                obj.numero_protocolo = protocolo
+            model.objects.bulk_create([obj for _, _, obj in novos])
+            for pos, item, obj in novos:
+                resultados[pos] = _resultado(pos, item, True, obj=obj)
+                criados.append(obj)
+
+        apos_gravacao_em_lote(criados, ocupacao=False)
+    return resultados
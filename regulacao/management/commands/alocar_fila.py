@@ -0,0 +1,66 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date, parse_time
+
+from regulacao import alocacao
+from regulacao.models import Especialidade, TipoExame
+
+
+class Command(BaseCommand):
+    help = (
+        "Aloca a fila de espera de uma especialidade (consultas) ou de um tipo de exame nas vagas livres "
+        "das agendas por dia, por prioridade e tempo de espera. Sem --confirmar, apenas mostra a proposta."
+    )
+
+    def add_arguments(self, parser):
+        alvo = parser.add_mutually_exclusive_group(required=True)
+        alvo.add_argument("--especialidade", dest="especialidade_id", type=int, help="ID da especialidade.")
+        alvo.add_argument("--tipo-exame", dest="tipo_exame_id", type=int, help="ID do tipo de exame.")
+        parser.add_argument("--inicio", help="Primeira data de agenda (AAAA-MM-DD). Padrão: amanhã.")
+        parser.add_argument("--fim", help=f"Última data de agenda (AAAA-MM-DD). Padrão: início + "
+                                          f"{alocacao.HORIZONTE_DIAS} dias.")
+        parser.add_argument("--ubs", dest="ubs_id", type=int, help="Restringe a fila a uma UBS.")
+        parser.add_argument("--limite", type=int, help="Máximo de itens da fila a considerar.")
+        parser.add_argument("--hora", help="Hora de atendimento gravada nos itens (HH:MM).")
+        parser.add_argument("--local", default="", help="Local de atendimento/realização gravado nos itens.")
+        parser.add_argument("--usuario", help="Usuário registrado como regulador (obrigatório com --confirmar).")
+        parser.add_argument("--confirmar", action="store_true", help="Grava a alocação.")
+
+    def handle(self, *args, **options):
+        try:
+            alvo = alocacao.Alvo(
+                especialidade=Especialidade.objects.get(pk=options["especialidade_id"])
+                if options["especialidade_id"] else None,
+                tipo_exame=TipoExame.objects.get(pk=options["tipo_exame_id"]) if options["tipo_exame_id"] else None,
+            )
+        except (Especialidade.DoesNotExist, TipoExame.DoesNotExist):
+            raise CommandError("Especialidade/tipo de exame não encontrado.")
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        usuario = None
+        if options["confirmar"]:
+            if not options["usuario"]:
+                raise CommandError("Informe --usuario para gravar a alocação.")
+            try:
+                usuario = get_user_model().objects.get(username=options["usuario"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Usuário {options['usuario']} não encontrado.")
+
+        inicio = parse_date(options["inicio"]) if options["inicio"] else None
+        fim = parse_date(options["fim"]) if options["fim"] else None
+        hora = parse_time(options["hora"]) if options["hora"] else None
+        if (options["inicio"] and not inicio) or (options["fim"] and not fim) or (options["hora"] and not hora):
+            raise CommandError("Datas devem estar em AAAA-MM-DD e hora em HH:MM.")
+
+        resultado = alocacao.alocar_fila(
+            alvo, usuario=usuario, confirmar=options["confirmar"], inicio=inicio, fim=fim,
+            ubs_id=options["ubs_id"], limite=options["limite"], hora=hora, local=options["local"],
+        )
+        for linha in resultado["por_medico_dia"]:
+            self.stdout.write(f"{linha['data']} médico {linha['medico_id']}: {linha['alocados']}")
+        acao = "Alocados" if resultado["confirmado"] else "Alocáveis (proposta)"
+        self.stdout.write(self.style.SUCCESS(
+            f"{acao}: {len(resultado['alocados'])} de {resultado['na_fila']} na fila; "
+            f"sem vaga no período: {resultado['sem_vaga']}."
+        ))
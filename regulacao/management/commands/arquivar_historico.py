@@ -0,0 +1,140 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from regulacao import arquivo, esperas
+from regulacao.models import (
+    AcaoUsuario,
+    Notificacao,
+    PendenciaMensagemConsulta,
+    PendenciaMensagemExame,
+    RegulacaoConsulta,
+    RegulacaoExame,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Move exames/consultas encerrados, registros antigos de AcaoUsuario e mensagens de pendência "
+        "para as tabelas de arquivo e exclui notificações lidas fora do prazo de retenção. "
+        "Processa em lotes por ID."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--meses-regulacoes",
+            dest="meses_regulacoes",
+            type=int,
+            default=getattr(settings, "REGULACAO_ARQUIVO_MESES", 12),
+            help="Exames/consultas encerrados (negados, cancelados ou com resultado) há mais de N meses "
+                 "vão para o arquivo.",
+        )
+        parser.add_argument(
+            "--dias-acoes",
+            dest="dias_acoes",
+            type=int,
+            default=getattr(settings, "REGULACAO_RETENCAO_ACOES_DIAS", 180),
+            help="Ações de usuários mais antigas que N dias vão para o arquivo.",
+        )
+        parser.add_argument(
+            "--dias-mensagens",
+            dest="dias_mensagens",
+            type=int,
+            default=getattr(settings, "REGULACAO_RETENCAO_MENSAGENS_DIAS", 365),
+            help="Mensagens de pendência mais antigas que N dias (de itens que não estão mais pendentes).",
+        )
+        parser.add_argument(
+            "--dias-notificacoes",
+            dest="dias_notificacoes",
+            type=int,
+            default=getattr(settings, "REGULACAO_RETENCAO_NOTIFICACOES_LIDAS_DIAS", 90),
+            help="Notificações já lidas mais antigas que N dias são excluídas.",
+        )
+        parser.add_argument(
+            "--lote",
+            dest="lote",
+            type=int,
+            default=5000,
+            help="Quantidade de registros por transação.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            dest="dry_run",
+            action="store_true",
+            help="Apenas conta o que seria movido/excluído.",
+        )
+
+    def handle(self, *args, **options):
+        lote = options["lote"]
+        if lote < 1:
+            raise CommandError("--lote deve ser maior que zero.")
+        for chave in ("dias_acoes", "dias_mensagens", "dias_notificacoes"):
+            if options[chave] < 1:
+                raise CommandError("Os prazos de retenção devem ser de pelo menos 1 dia.")
+        if options["meses_regulacoes"] < 1:
+            raise CommandError("--meses-regulacoes deve ser de pelo menos 1 mês.")
+        dry_run = bool(options["dry_run"])
+        agora = timezone.now()
+
+        corte_reg = arquivo.corte_por_meses(options["meses_regulacoes"])
+        exames_qs = RegulacaoExame.objects.filter(arquivo.criterio_encerrados(corte_reg))
+        consultas_qs = RegulacaoConsulta.objects.filter(arquivo.criterio_encerrados(corte_reg))
+
+        acoes_qs = AcaoUsuario.objects.filter(data_acao__lt=agora - timedelta(days=options["dias_acoes"]))
+        corte_msg = agora - timedelta(days=options["dias_mensagens"])
+        msg_ex_qs = PendenciaMensagemExame.objects.filter(criado_em__lt=corte_msg).exclude(exame__status="pendente")
+        msg_co_qs = PendenciaMensagemConsulta.objects.filter(criado_em__lt=corte_msg).exclude(consulta__status="pendente")
+        notif_qs = Notificacao.objects.filter(
+            lida=True, criado_em__lt=agora - timedelta(days=options["dias_notificacoes"])
+        )
+
+        if dry_run:
+            self.stdout.write(
+                f"Exames encerrados a arquivar: {exames_qs.count()}\n"
+                f"Consultas encerradas a arquivar: {consultas_qs.count()}\n"
+                f"Ações a arquivar: {acoes_qs.count()}\n"
+                f"Mensagens de exames a arquivar: {msg_ex_qs.count()}\n"
+                f"Mensagens de consultas a arquivar: {msg_co_qs.count()}\n"
+                f"Notificações lidas a excluir: {notif_qs.count()}"
+            )
+            return
+
+        # Agregados de espera em dia antes que os itens saiam das tabelas quentes (regulacao/esperas.py)
+        esperas.atualizar()
+
+        # Regulações primeiro: levam junto suas ações e mensagens, qualquer que seja a idade delas
+        exames = self._mover(exames_qs, lote, lambda ids: arquivo.arquivar_regulacoes(RegulacaoExame, ids, corte_reg))
+        consultas = self._mover(
+            consultas_qs, lote, lambda ids: arquivo.arquivar_regulacoes(RegulacaoConsulta, ids, corte_reg)
+        )
+        acoes = self._mover(acoes_qs, lote, arquivo.arquivar_acoes)
+        msg_ex = self._mover(msg_ex_qs, lote, lambda ids: arquivo.arquivar_mensagens(PendenciaMensagemExame, "exame", ids))
+        msg_co = self._mover(
+            msg_co_qs, lote, lambda ids: arquivo.arquivar_mensagens(PendenciaMensagemConsulta, "consulta", ids)
+        )
+        notif = self._mover(notif_qs, lote, lambda ids: Notificacao.objects.filter(pk__in=ids).delete()[0])
+
+        self.stdout.write(self.style.SUCCESS("Arquivamento concluído."))
+        self.stdout.write(
+            f"Regulações arquivadas — exames: {exames}, consultas: {consultas}\n"
+            f"Ações arquivadas: {acoes}\n"
+            f"Mensagens arquivadas — exames: {msg_ex}, consultas: {msg_co}\n"
+            f"Notificações lidas excluídas: {notif}"
+        )
+
+    def _mover(self, qs, lote, func):
+        """Aplica ``func`` a lotes de IDs (ordem crescente), cada lote em sua transação.
+        ``func`` retorna quantos registros efetivamente moveu/excluiu."""
+        total = 0
+        ultimo_id = 0
+        while True:
+            ids = list(qs.filter(pk__gt=ultimo_id).order_by("pk").values_list("pk", flat=True)[:lote])
+            if not ids:
+                break
+            with transaction.atomic():
+                total += func(ids)
+            ultimo_id = ids[-1]
+        return total
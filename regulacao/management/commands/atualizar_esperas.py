@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from regulacao import esperas
+
+
+class Command(BaseCommand):
+    help = (
+        "Atualiza os agregados diários de tempo de espera (EsperaDiaria). Sem --desde, reprocessa apenas "
+        f"os últimos {esperas.REPROCESSAR_DIAS} dias já agregados até hoje (uso em cron). "
+        "Dias cujos itens já foram para o arquivo não devem ser reprocessados: as tabelas de arquivo não são lidas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Primeiro dia a recalcular (AAAA-MM-DD).")
+        parser.add_argument("--ate", help="Último dia a recalcular (AAAA-MM-DD). Padrão: hoje.")
+
+    def handle(self, *args, **options):
+        desde = parse_date(options["desde"]) if options["desde"] else None
+        ate = parse_date(options["ate"]) if options["ate"] else None
+        if (options["desde"] and not desde) or (options["ate"] and not ate):
+            raise CommandError("Datas devem estar em AAAA-MM-DD.")
+        if desde and ate and ate < desde:
+            raise CommandError("--ate deve ser posterior a --desde.")
+        resultado = esperas.atualizar(desde, ate)
+        if resultado["desde"] is None:
+            self.stdout.write(self.style.WARNING("Nenhuma regulação registrada. Nada a fazer."))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Agregados de {resultado['desde']} a {resultado['ate']}: {resultado['linhas']} linhas."
+        ))
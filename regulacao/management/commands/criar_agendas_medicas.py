@@ -1,10 +1,11 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.utils import timezone
 
-from regulacao.models import AgendaMedica, AgendaMedicaDia, MedicoAmbulatorio
+from regulacao import agendas
+from regulacao.models import MedicoAmbulatorio
 
 
 class Command(BaseCommand):
@@ -99,33 +100,24 @@ class Command(BaseCommand):
             "medicos_processados": 0,
         }
 
+        pares = []
+        for medico in medicos_qs:
+            especialidades = [e for e in medico.especialidades.all() if getattr(e, "ativa", True)]
+            if not especialidades:
+                continue
+            stats["medicos_processados"] += 1
+            pares.extend((medico.pk, especialidade.pk) for especialidade in especialidades)
+
         with transaction.atomic():
-            for medico in medicos_qs:
-                especialidades = [e for e in medico.especialidades.all() if getattr(e, "ativa", True)]
-                if not especialidades:
-                    continue
-                stats["medicos_processados"] += 1
-                for especialidade in especialidades:
-                    if not somente_dia:
-                        self._criar_agenda_semanal(
-                            medico,
-                            especialidade,
-                            dias_semana,
-                            capacidade,
-                            sobrescrever,
-                            stats,
-                        )
-                    if not somente_semanal:
-                        self._criar_agenda_por_dia(
-                            medico,
-                            especialidade,
-                            inicio,
-                            meses,
-                            dias_semana,
-                            capacidade,
-                            sobrescrever,
-                            stats,
-                        )
+            if not somente_dia:
+                stats["weekly_created"], stats["weekly_updated"] = agendas.gerar_agendas_semanais(
+                    pares, dias_semana, capacidade, sobrescrever
+                )
+            if not somente_semanal:
+                datas = agendas.datas_do_periodo(inicio, agendas.somar_meses(inicio, meses), dias_semana)
+                stats["daily_created"], stats["daily_updated"] = agendas.gerar_agendas_dia(
+                    pares, datas, capacidade, sobrescrever
+                )
 
         self.stdout.write(self.style.SUCCESS("Agendas geradas/atualizadas com sucesso."))
         self.stdout.write(
@@ -159,69 +151,3 @@ class Command(BaseCommand):
         if not dias:
             raise CommandError("Informe ao menos um dia da semana em --dias.")
         return sorted(set(dias))
-
-    def _relativedelta(self, months):
-        try:
-            from dateutil.relativedelta import relativedelta
-
-            return relativedelta(months=months)
-        except Exception:
-            class SimpleRelativeDelta:
-                def __init__(self, months):
-                    self.months = months
-
-                def __radd__(self, other):
-                    return other + timedelta(days=30 * self.months)
-
-            return SimpleRelativeDelta(months)
-
-    def _criar_agenda_semanal(self, medico, especialidade, dias, capacidade, sobrescrever, stats):
-        for dia in dias:
-            obj, created = AgendaMedica.objects.get_or_create(
-                medico=medico,
-                especialidade=especialidade,
-                dia_semana=dia,
-                defaults={"capacidade": capacidade, "ativo": True},
-            )
-            if created:
-                stats["weekly_created"] += 1
-            elif sobrescrever:
-                needs_update = obj.capacidade != capacidade or not obj.ativo
-                if needs_update:
-                    obj.capacidade = capacidade
-                    obj.ativo = True
-                    obj.save(update_fields=["capacidade", "ativo", "atualizado_em"])
-                    stats["weekly_updated"] += 1
-
-    def _criar_agenda_por_dia(
-        self,
-        medico,
-        especialidade,
-        inicio,
-        meses,
-        dias,
-        capacidade,
-        sobrescrever,
-        stats,
-    ):
-        delta = self._relativedelta(meses)
-        fim = inicio + delta
-        dia_atual = inicio
-        while dia_atual < fim:
-            if dia_atual.weekday() in dias:
-                obj, created = AgendaMedicaDia.objects.get_or_create(
-                    medico=medico,
-                    especialidade=especialidade,
-                    data=dia_atual,
-                    defaults={"capacidade": capacidade, "ativo": True},
-                )
-                if created:
-                    stats["daily_created"] += 1
-                elif sobrescrever:
-                    needs_update = obj.capacidade != capacidade or not obj.ativo
-                    if needs_update:
-                        obj.capacidade = capacidade
-                        obj.ativo = True
-                        obj.save(update_fields=["capacidade", "ativo", "atualizado_em"])
-                        stats["daily_updated"] += 1
-            dia_atual += timedelta(days=1)
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from regulacao import simulacao
+from regulacao.models import Especialidade
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula a fila de espera por especialidade e mostra a espera projetada (p50/p90/p95, em dias) "
+        "no cenário atual e, com --extra-semana/--fator-demanda, no cenário alternativo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--especialidade", dest="especialidade_id", type=int,
+                            help="ID da especialidade (padrão: todas as ativas).")
+        parser.add_argument("--dias", type=int, default=180, help="Horizonte da simulação em dias.")
+        parser.add_argument("--execucoes", type=int, default=1000, help="Número de execuções por cenário.")
+        parser.add_argument("--extra-semana", dest="extra_semana", type=int, default=0,
+                            help="Vagas a mais por semana no cenário alternativo.")
+        parser.add_argument("--fator-demanda", dest="fator_demanda", type=float, default=1.0,
+                            help="Multiplicador das solicitações no cenário alternativo.")
+        parser.add_argument("--reentrada", type=float, default=1.0,
+                            help="Fração dos faltosos que volta à fila (0 a 1).")
+        parser.add_argument("--semente", type=int, help="Semente do gerador aleatório (resultado reprodutível).")
+
+    def handle(self, *args, **options):
+        especialidades = Especialidade.objects.filter(ativa=True).order_by("nome")
+        if options["especialidade_id"]:
+            especialidades = Especialidade.objects.filter(pk=options["especialidade_id"])
+            if not especialidades.exists():
+                raise CommandError("Especialidade não encontrada.")
+
+        vistas = set()
+        for especialidade in especialidades:
+            if especialidade.pk in vistas:
+                continue
+            try:
+                resultado = simulacao.simular(
+                    especialidade.pk, dias=options["dias"], execucoes=options["execucoes"],
+                    capacidade_extra_semanal=options["extra_semana"], fator_demanda=options["fator_demanda"],
+                    reentrada=options["reentrada"], semente=options["semente"],
+                )
+            except ValueError as exc:
+                raise CommandError(str(exc))
+            vistas.update(resultado["especialidades"])
+            p = resultado["parametros"]
+            self.stdout.write(self.style.MIGRATE_HEADING(especialidade.nome))
+            self.stdout.write(
+                f"  fila atual: {p['fila_atual']}; solicitações/semana: {p['chegadas_semana']}; "
+                f"vagas/semana: {p['capacidade_semana']}; taxa de faltas: {p['taxa_falta']:.1%}"
+            )
+            for rotulo, cenario in (("atual", resultado["atual"]), ("cenário", resultado["cenario"])):
+                if cenario is None:
+                    continue
+                espera = cenario["espera_dias"]
+                texto = (f"p50 {espera['p50']}d, p90 {espera['p90']}d, p95 {espera['p95']}d"
+                         if espera else "sem atendimentos no horizonte")
+                self.stdout.write(f"  {rotulo}: {texto}; fila ao final (p50): {cenario['fila_final']['p50']}")
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('regulacao', '0024_tipoexame_especialidade_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AcaoUsuarioArquivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_acao', models.CharField(choices=[('autorizar_exame', 'Autorizar Exame'), ('negar_exame', 'Negar Exame'), ('pendenciar_exame', 'Pendenciar Exame'), ('autorizar_consulta', 'Autorizar Consulta'), ('negar_consulta', 'Negar Consulta'), ('pendenciar_consulta', 'Pendenciar Consulta')], max_length=30, verbose_name='Tipo de Ação')),
+                ('data_acao', models.DateTimeField(db_index=True, verbose_name='Data da Ação')),
+                ('paciente_nome', models.CharField(max_length=200, verbose_name='Nome do Paciente')),
+                ('motivo', models.TextField(blank=True, verbose_name='Motivo/Observação')),
+                ('arquivado_em', models.DateTimeField(auto_now_add=True)),
+                ('consulta', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='regulacao.regulacaoconsulta')),
+                ('exame', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='regulacao.regulacaoexame')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Ação do Usuário (arquivo)',
+                'verbose_name_plural': 'Ações dos Usuários (arquivo)',
+                'ordering': ['-data_acao'],
+                'indexes': [models.Index(fields=['usuario', 'data_acao'], name='regulacao_a_usuario_0ec880_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PendenciaMensagemArquivo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_tipo', models.CharField(choices=[('exame', 'Exame'), ('consulta', 'Consulta')], max_length=10)),
+                ('item_id', models.BigIntegerField()),
+                ('lado', models.CharField(choices=[('ubs', 'UBS'), ('regulacao', 'Regulação')], max_length=20)),
+                ('tipo', models.CharField(choices=[('mensagem', 'Mensagem'), ('abertura', 'Abertura da Pendência')], default='mensagem', max_length=20)),
+                ('texto', models.TextField()),
+                ('criado_em', models.DateTimeField()),
+                ('arquivado_em', models.DateTimeField(auto_now_add=True)),
+                ('autor', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Mensagem de Pendência (arquivo)',
+                'verbose_name_plural': 'Mensagens de Pendência (arquivo)',
+                'ordering': ['criado_em'],
+                'indexes': [models.Index(fields=['item_tipo', 'item_id', 'criado_em'], name='regulacao_p_item_ti_93f559_idx')],
+            },
+        ),
+    ]
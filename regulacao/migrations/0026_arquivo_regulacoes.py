@@ -0,0 +1,108 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0008_allow_null_data_nascimento'),
+        ('regulacao', '0025_arquivo_historico'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegulacaoConsultaArquivo',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('justificativa', models.TextField(verbose_name='Justificativa Clínica')),
+                ('prioridade', models.CharField(choices=[('normal', 'Normal'), ('media', 'Média'), ('alta', 'Alta')], max_length=20, verbose_name='Prioridade')),
+                ('observacoes_solicitacao', models.TextField(blank=True, verbose_name='Observações da Solicitação')),
+                ('status', models.CharField(choices=[('fila', 'Fila de Espera'), ('pendente', 'Pendente'), ('autorizado', 'Autorizado'), ('negado', 'Negado'), ('cancelado', 'Cancelado')], max_length=20, verbose_name='Status')),
+                ('data_solicitacao', models.DateTimeField(db_index=True, verbose_name='Data da Solicitação')),
+                ('data_regulacao', models.DateTimeField(blank=True, null=True, verbose_name='Data da Regulação')),
+                ('motivo_decisao', models.TextField(blank=True, verbose_name='Motivo da Decisão')),
+                ('local_atendimento', models.CharField(blank=True, max_length=200, verbose_name='Local de Atendimento')),
+                ('data_agendada', models.DateField(blank=True, null=True, verbose_name='Data Agendada')),
+                ('hora_agendada', models.TimeField(blank=True, null=True, verbose_name='Hora Agendada')),
+                ('observacoes_regulacao', models.TextField(blank=True, verbose_name='Observações da Regulação')),
+                ('numero_protocolo', models.CharField(max_length=50, unique=True, verbose_name='Número do Protocolo')),
+                ('criado_em', models.DateTimeField()),
+                ('atualizado_em', models.DateTimeField()),
+                ('resultado_atendimento', models.CharField(choices=[('pendente', 'Aguardando'), ('compareceu', 'Compareceu'), ('faltou', 'Faltou')], default='pendente', max_length=12, verbose_name='Resultado do Atendimento')),
+                ('resultado_observacao', models.TextField(blank=True, verbose_name='Observação do Resultado')),
+                ('resultado_em', models.DateTimeField(blank=True, null=True, verbose_name='Resultado registrado em')),
+                ('pendencia_motivo', models.TextField(blank=True, verbose_name='Motivo da Pendência')),
+                ('pendencia_aberta_em', models.DateTimeField(blank=True, null=True, verbose_name='Pendência aberta em')),
+                ('pendencia_resposta', models.TextField(blank=True, verbose_name='Resposta da UBS')),
+                ('pendencia_respondida_em', models.DateTimeField(blank=True, null=True, verbose_name='Pendência respondida em')),
+                ('pendencia_resolvida_em', models.DateTimeField(blank=True, null=True, verbose_name='Pendência resolvida em')),
+                ('arquivado_em', models.DateTimeField(auto_now_add=True)),
+                ('especialidade', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='regulacao.especialidade', verbose_name='Especialidade')),
+                ('medico_atendente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='regulacao.medicoambulatorio', verbose_name='Médico Atendente')),
+                ('medico_solicitante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='regulacao.medicosolicitante', verbose_name='Médico Solicitante')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pacientes.paciente', verbose_name='Paciente')),
+                ('pendencia_aberta_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('pendencia_resolvida_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('pendencia_respondida_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('regulador', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Regulador')),
+                ('resultado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('ubs_solicitante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='regulacao.ubs', verbose_name='UBS Solicitante')),
+            ],
+            options={
+                'verbose_name': 'Regulação de Consulta (arquivo)',
+                'verbose_name_plural': 'Regulações de Consultas (arquivo)',
+                'ordering': ['-data_solicitacao'],
+                'indexes': [models.Index(fields=['paciente', 'data_solicitacao'], name='regulacao_r_pacient_a75371_idx'), models.Index(fields=['ubs_solicitante', 'status', 'data_solicitacao'], name='regulacao_r_ubs_sol_c81ce9_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='RegulacaoExameArquivo',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('justificativa', models.TextField(verbose_name='Justificativa Clínica')),
+                ('prioridade', models.CharField(choices=[('normal', 'Normal'), ('media', 'Média'), ('alta', 'Alta')], max_length=20, verbose_name='Prioridade')),
+                ('observacoes_solicitacao', models.TextField(blank=True, verbose_name='Observações da Solicitação')),
+                ('status', models.CharField(choices=[('fila', 'Fila de Espera'), ('pendente', 'Pendente'), ('autorizado', 'Autorizado'), ('negado', 'Negado'), ('cancelado', 'Cancelado')], max_length=20, verbose_name='Status')),
+                ('data_solicitacao', models.DateTimeField(db_index=True, verbose_name='Data da Solicitação')),
+                ('data_regulacao', models.DateTimeField(blank=True, null=True, verbose_name='Data da Regulação')),
+                ('motivo_decisao', models.TextField(blank=True, verbose_name='Motivo da Decisão')),
+                ('local_realizacao', models.CharField(blank=True, max_length=200, verbose_name='Local de Realização')),
+                ('data_agendada', models.DateField(blank=True, null=True, verbose_name='Data Agendada')),
+                ('hora_agendada', models.TimeField(blank=True, null=True, verbose_name='Hora Agendada')),
+                ('observacoes_regulacao', models.TextField(blank=True, verbose_name='Observações da Regulação')),
+                ('numero_pedido', models.CharField(blank=True, db_index=True, max_length=50, verbose_name='Número do Pedido')),
+                ('numero_protocolo', models.CharField(max_length=50, unique=True, verbose_name='Número do Protocolo')),
+                ('criado_em', models.DateTimeField()),
+                ('atualizado_em', models.DateTimeField()),
+                ('resultado_atendimento', models.CharField(choices=[('pendente', 'Aguardando'), ('compareceu', 'Compareceu'), ('faltou', 'Faltou')], default='pendente', max_length=12, verbose_name='Resultado do Atendimento')),
+                ('resultado_observacao', models.TextField(blank=True, verbose_name='Observação do Resultado')),
+                ('resultado_em', models.DateTimeField(blank=True, null=True, verbose_name='Resultado registrado em')),
+                ('pendencia_motivo', models.TextField(blank=True, verbose_name='Motivo da Pendência')),
+                ('pendencia_aberta_em', models.DateTimeField(blank=True, null=True, verbose_name='Pendência aberta em')),
+                ('pendencia_resposta', models.TextField(blank=True, verbose_name='Resposta da UBS')),
+                ('pendencia_respondida_em', models.DateTimeField(blank=True, null=True, verbose_name='Pendência respondida em')),
+                ('pendencia_resolvida_em', models.DateTimeField(blank=True, null=True, verbose_name='Pendência resolvida em')),
+                ('arquivado_em', models.DateTimeField(auto_now_add=True)),
+                ('medico_atendente', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='regulacao.medicoambulatorio', verbose_name='Médico Atendente')),
+                ('medico_solicitante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='regulacao.medicosolicitante', verbose_name='Médico Solicitante')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pacientes.paciente', verbose_name='Paciente')),
+                ('pendencia_aberta_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('pendencia_resolvida_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('pendencia_respondida_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('regulador', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Regulador')),
+                ('resultado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('tipo_exame', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='regulacao.tipoexame', verbose_name='Tipo de Exame')),
+                ('ubs_solicitante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='regulacao.ubs', verbose_name='UBS Solicitante')),
+            ],
+            options={
+                'verbose_name': 'Regulação de Exame (arquivo)',
+                'verbose_name_plural': 'Regulações de Exames (arquivo)',
+                'ordering': ['-data_solicitacao'],
+                'indexes': [models.Index(fields=['paciente', 'data_solicitacao'], name='regulacao_r_pacient_abdde7_idx'), models.Index(fields=['ubs_solicitante', 'status', 'data_solicitacao'], name='regulacao_r_ubs_sol_0e2465_idx')],
+            },
+        ),
+    ]
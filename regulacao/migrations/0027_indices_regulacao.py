@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0008_allow_null_data_nascimento'),
+        ('regulacao', '0026_arquivo_regulacoes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='regulacaoconsulta',
+            index=models.Index(fields=['status', 'ubs_solicitante', 'data_solicitacao'], name='regcons_st_ubs_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoconsulta',
+            index=models.Index(fields=['medico_atendente', 'data_agendada', 'status'], name='regcons_med_dt_st_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoconsulta',
+            index=models.Index(fields=['paciente', 'status'], name='regcons_pac_st_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoconsulta',
+            index=models.Index(condition=models.Q(('status', 'fila')), fields=['ubs_solicitante', 'data_solicitacao'], name='regcons_fila_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoconsulta',
+            index=models.Index(condition=models.Q(('data_agendada__isnull', False), ('status', 'autorizado')), fields=['data_agendada'], name='regcons_agenda_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoexame',
+            index=models.Index(fields=['status', 'ubs_solicitante', 'data_solicitacao'], name='regexame_st_ubs_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoexame',
+            index=models.Index(fields=['medico_atendente', 'data_agendada', 'status'], name='regexame_med_dt_st_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoexame',
+            index=models.Index(fields=['paciente', 'status'], name='regexame_pac_st_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoexame',
+            index=models.Index(condition=models.Q(('status', 'fila')), fields=['ubs_solicitante', 'data_solicitacao'], name='regexame_fila_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoexame',
+            index=models.Index(condition=models.Q(('data_agendada__isnull', False), ('status', 'autorizado')), fields=['data_agendada'], name='regexame_agenda_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0008_allow_null_data_nascimento'),
+        ('regulacao', '0027_indices_regulacao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='regulacaoconsulta',
+            index=models.Index(fields=['regulador', 'data_regulacao'], name='regcons_reg_dt_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoexame',
+            index=models.Index(fields=['regulador', 'data_regulacao'], name='regexame_reg_dt_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:18
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('regulacao', '0028_indices_periodo'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name='tipoexame',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('nome'), name='gin_trgm_ops'), name='tipoexame_nome_upper_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='tipoexame',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['nome'], name='tipoexame_nome_trgm', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='tipoexame',
+            index=models.Index(fields=['codigo_sus'], name='tipoexame_codsus_like_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('regulacao', '0029_busca_tipos_exame'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SequenciaProtocolo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('base', models.CharField(max_length=20, unique=True)),
+                ('ultimo', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Sequência de Protocolo',
+                'verbose_name_plural': 'Sequências de Protocolo',
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0008_allow_null_data_nascimento'),
+        ('regulacao', '0031_indice_feed_mudancas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='regulacaoconsulta',
+            name='reservado_ate',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Reservado até'),
+        ),
+        migrations.AddField(
+            model_name='regulacaoconsulta',
+            name='reservado_por',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Reservado por'),
+        ),
+        migrations.AddField(
+            model_name='regulacaoexame',
+            name='reservado_ate',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Reservado até'),
+        ),
+        migrations.AddField(
+            model_name='regulacaoexame',
+            name='reservado_por',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Reservado por'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoconsulta',
+            index=models.Index(models.Case(models.When(prioridade='alta', then=models.Value(0)), models.When(prioridade='media', then=models.Value(1)), models.When(prioridade='normal', then=models.Value(2)), default=models.Value(3), output_field=models.IntegerField()), models.F('data_solicitacao'), condition=models.Q(('status', 'fila')), name='regcons_fila_prio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoconsulta',
+            index=models.Index(models.F('ubs_solicitante'), models.Case(models.When(prioridade='alta', then=models.Value(0)), models.When(prioridade='media', then=models.Value(1)), models.When(prioridade='normal', then=models.Value(2)), default=models.Value(3), output_field=models.IntegerField()), models.F('data_solicitacao'), condition=models.Q(('status', 'fila')), name='regcons_fila_ubs_prio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoexame',
+            index=models.Index(models.Case(models.When(prioridade='alta', then=models.Value(0)), models.When(prioridade='media', then=models.Value(1)), models.When(prioridade='normal', then=models.Value(2)), default=models.Value(3), output_field=models.IntegerField()), models.F('data_solicitacao'), condition=models.Q(('status', 'fila')), name='regexame_fila_prio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoexame',
+            index=models.Index(models.F('ubs_solicitante'), models.Case(models.When(prioridade='alta', then=models.Value(0)), models.When(prioridade='media', then=models.Value(1)), models.When(prioridade='normal', then=models.Value(2)), default=models.Value(3), output_field=models.IntegerField()), models.F('data_solicitacao'), condition=models.Q(('status', 'fila')), name='regexame_fila_ubs_prio_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('regulacao', '0032_fila_trabalho'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agendamedicadia',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['especialidade', 'data'], name='agendadia_esp_data_idx'),
+        ),
+    ]
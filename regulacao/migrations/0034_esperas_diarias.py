@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0008_allow_null_data_nascimento'),
+        ('regulacao', '0033_indice_vagas_especialidade'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EsperaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(verbose_name='Dia da regulação')),
+                ('tipo', models.CharField(choices=[('exame', 'Exame'), ('consulta', 'Consulta')], max_length=10, verbose_name='Tipo')),
+                ('dimensao', models.CharField(choices=[('geral', 'Geral'), ('especialidade', 'Especialidade'), ('ubs', 'UBS'), ('tipo_exame', 'Tipo de exame')], max_length=15, verbose_name='Dimensão')),
+                ('chave', models.PositiveIntegerField(default=0, verbose_name='Chave')),
+                ('regulacao_qtd', models.PositiveIntegerField(default=0)),
+                ('regulacao_p50', models.FloatField(blank=True, null=True)),
+                ('regulacao_p90', models.FloatField(blank=True, null=True)),
+                ('regulacao_media', models.FloatField(blank=True, null=True)),
+                ('agendamento_qtd', models.PositiveIntegerField(default=0)),
+                ('agendamento_p50', models.FloatField(blank=True, null=True)),
+                ('agendamento_p90', models.FloatField(blank=True, null=True)),
+                ('agendamento_media', models.FloatField(blank=True, null=True)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Espera diária',
+                'verbose_name_plural': 'Esperas diárias',
+                'ordering': ['dia'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoconsulta',
+            index=models.Index(condition=models.Q(('data_regulacao__isnull', False)), fields=['data_regulacao'], name='regcons_dt_reg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='regulacaoexame',
+            index=models.Index(condition=models.Q(('data_regulacao__isnull', False)), fields=['data_regulacao'], name='regexame_dt_reg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='esperadiaria',
+            index=models.Index(fields=['dimensao', 'tipo', 'chave', 'dia'], name='espera_dim_chave_dia_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='esperadiaria',
+            constraint=models.UniqueConstraint(fields=('dia', 'tipo', 'dimensao', 'chave'), name='uniq_espera_diaria'),
+        ),
+    ]
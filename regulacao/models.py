@@ -1,7 +1,21 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db import models, transaction
+from django.db.models.functions import Upper
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+# Ordem de atendimento da fila: alta, média, normal (usada em consultas e nos índices da fila)
+PRIORIDADE_ORDEM = {'alta': 0, 'media': 1, 'normal': 2}
+
+
+def ordem_prioridade():
+    """Expressão ``CASE`` da prioridade (0 = mais urgente), idêntica à dos índices da fila."""
+    return models.Case(
+        *(models.When(prioridade=p, then=models.Value(n)) for p, n in PRIORIDADE_ORDEM.items()),
+        default=models.Value(len(PRIORIDADE_ORDEM)),
+        output_field=models.IntegerField(),
+    )
+
 
 class UBS(models.Model):
     """Unidade Básica de Saúde - cadastro das UBS solicitantes"""
@@ -116,11 +130,54 @@ class TipoExame(models.Model):
         verbose_name = 'Tipo de Exame'
         verbose_name_plural = 'Tipos de Exames'
         ordering = ['nome']
+        indexes = [
+            # Busca do seletor (regulacao.catalogo): ILIKE/trigramas no nome e prefixo do código SUS
+            GinIndex(OpClass(Upper('nome'), name='gin_trgm_ops'), name='tipoexame_nome_upper_trgm'),
+            GinIndex(fields=['nome'], opclasses=['gin_trgm_ops'], name='tipoexame_nome_trgm'),
+            models.Index(fields=['codigo_sus'], opclasses=['varchar_pattern_ops'], name='tipoexame_codsus_like_idx'),
+        ]
     
     def __str__(self):
         return self.nome
 
 
+class SequenciaProtocolo(models.Model):
+    """Último sufixo de protocolo usado por prefixo diário (ex.: ``exa19102025``).
+
+    ``reservar`` trava a linha do dia (``SELECT ... FOR UPDATE``) e devolve um bloco
+    de números consecutivos, permitindo criar vários itens com um único ``bulk_create``.
+    Se a transação for desfeita, a reserva também é, sem deixar buracos.
+    """
+    base = models.CharField(max_length=20, unique=True)
+    ultimo = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Sequência de Protocolo'
+        verbose_name_plural = 'Sequências de Protocolo'
+
+    def __str__(self):  # pragma: no cover
+        return f"{self.base}: {self.ultimo}"
+
+    @classmethod
+    def reservar(cls, model, prefixo: str, quantidade: int = 1) -> list:
+        """Reserva ``quantidade`` números ``<prefixo><ddmmaaaa>-NNNN`` para ``model``."""
+        base = f"{prefixo}{timezone.localdate().strftime('%d%m%Y')}"
+        with transaction.atomic():
+            seq, criada = cls.objects.select_for_update().get_or_create(base=base)
+            if criada:
+                # Primeira reserva do dia: continuar após os números já gravados hoje
+                for numero in model.objects.filter(numero_protocolo__startswith=f"{base}-").values_list(
+                        'numero_protocolo', flat=True):
+                    try:
+                        seq.ultimo = max(seq.ultimo, int(numero.rsplit('-', 1)[1]))
+                    except (IndexError, ValueError):
+                        continue
+            inicio = seq.ultimo + 1
+            seq.ultimo += quantidade
+            seq.save(update_fields=['ultimo'])
+        return [f"{base}-{n:04d}" for n in range(inicio, inicio + quantidade)]
+
+
 class RegulacaoExame(models.Model):
     """Solicitação e regulação de exames"""
     
@@ -220,11 +277,43 @@ class RegulacaoExame(models.Model):
     pendencia_resolvida_por = models.ForeignKey(
         User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='Pendência resolvida por'
     )
+
+    # Fila de trabalho: item separado por um regulador até ``reservado_ate`` (ver regulacao/fila.py)
+    reservado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                                      verbose_name='Reservado por')
+    reservado_ate = models.DateTimeField('Reservado até', null=True, blank=True)
     
     class Meta:
         verbose_name = 'Regulação de Exame'
         verbose_name_plural = 'Regulações de Exames'
         ordering = ['-data_solicitacao']
+        # Índices das consultas quentes (ver ``EXPLAIN`` em regulacao/tests.py)
+        indexes = [
+            # Fila/malote e pendências por UBS, ordenadas por data
+            models.Index(fields=['status', 'ubs_solicitante', 'data_solicitacao'], name='regexame_st_ubs_dt_idx'),
+            # Capacidade por médico/dia (vagas usadas)
+            models.Index(fields=['medico_atendente', 'data_agendada', 'status'], name='regexame_med_dt_st_idx'),
+            # Alertas do paciente e paciente_pedido
+            models.Index(fields=['paciente', 'status'], name='regexame_pac_st_idx'),
+            # "O que fiz hoje": decisões do regulador por período
+            models.Index(fields=['regulador', 'data_regulacao'], name='regexame_reg_dt_idx'),
+            # Agregados de espera: regulados por período (ver regulacao/esperas.py)
+            models.Index(fields=['data_regulacao'], name='regexame_dt_reg_idx',
+                         condition=models.Q(data_regulacao__isnull=False)),
+            # Feed de mudanças por UBS (cursor por atualizado_em/id)
+            models.Index(fields=['ubs_solicitante', 'atualizado_em', 'id'], name='regexame_ubs_upd_idx'),
+            # Fila de espera: só as linhas em fila (pequeno mesmo com histórico grande)
+            models.Index(fields=['ubs_solicitante', 'data_solicitacao'], name='regexame_fila_idx',
+                         condition=models.Q(status='fila')),
+            # Fila de trabalho: próximos por prioridade e tempo de espera (geral e por UBS)
+            models.Index(ordem_prioridade(), 'data_solicitacao', name='regexame_fila_prio_idx',
+                         condition=models.Q(status='fila')),
+            models.Index('ubs_solicitante', ordem_prioridade(), 'data_solicitacao', name='regexame_fila_ubs_prio_idx',
+                         condition=models.Q(status='fila')),
+            # Agenda: autorizados por data agendada
+            models.Index(fields=['data_agendada'], name='regexame_agenda_idx',
+                         condition=models.Q(status='autorizado', data_agendada__isnull=False)),
+        ]
     
     def __str__(self):
         return f"Protocolo {self.numero_protocolo} - {self.paciente.nome} - {self.tipo_exame.nome}"
@@ -232,14 +321,7 @@ class RegulacaoExame(models.Model):
     def save(self, *args, **kwargs):
         # Gerar número de protocolo no padrão: exa + ddmmyyyy + sufixo incremental diário
         if not self.numero_protocolo:
-            base = f"exa{timezone.localdate().strftime('%d%m%Y')}"
-            # Garante unicidade adicionando um sufixo incremental por dia
-            seq = 1
-            numero = f"{base}-{seq:04d}"
-            while type(self).objects.filter(numero_protocolo=numero).exists():
-                seq += 1
-                numero = f"{base}-{seq:04d}"
-            self.numero_protocolo = numero
+            self.numero_protocolo = SequenciaProtocolo.reservar(type(self), 'exa')[0]
         super().save(*args, **kwargs)
     
     def get_status_badge_class(self):
@@ -390,10 +472,42 @@ class RegulacaoConsulta(models.Model):
         User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='Pendência resolvida por'
     )
 
+    # Fila de trabalho: item separado por um regulador até ``reservado_ate`` (ver regulacao/fila.py)
+    reservado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                                      verbose_name='Reservado por')
+    reservado_ate = models.DateTimeField('Reservado até', null=True, blank=True)
+
     class Meta:
         verbose_name = 'Regulação de Consulta'
         verbose_name_plural = 'Regulações de Consultas'
         ordering = ['-data_solicitacao']
+        # Índices das consultas quentes (ver ``EXPLAIN`` em regulacao/tests.py)
+        indexes = [
+            # Fila/malote e pendências por UBS, ordenadas por data
+            models.Index(fields=['status', 'ubs_solicitante', 'data_solicitacao'], name='regcons_st_ubs_dt_idx'),
+            # Capacidade por médico/dia (vagas usadas)
+            models.Index(fields=['medico_atendente', 'data_agendada', 'status'], name='regcons_med_dt_st_idx'),
+            # Alertas do paciente e paciente_pedido
+            models.Index(fields=['paciente', 'status'], name='regcons_pac_st_idx'),
+            # "O que fiz hoje": decisões do regulador por período
+            models.Index(fields=['regulador', 'data_regulacao'], name='regcons_reg_dt_idx'),
+            # Agregados de espera: regulados por período (ver regulacao/esperas.py)
+            models.Index(fields=['data_regulacao'], name='regcons_dt_reg_idx',
+                         condition=models.Q(data_regulacao__isnull=False)),
+            # Feed de mudanças por UBS (cursor por atualizado_em/id)
+            models.Index(fields=['ubs_solicitante', 'atualizado_em', 'id'], name='regcons_ubs_upd_idx'),
+            # Fila de espera: só as linhas em fila (pequeno mesmo com histórico grande)
+            models.Index(fields=['ubs_solicitante', 'data_solicitacao'], name='regcons_fila_idx',
+                         condition=models.Q(status='fila')),
+            # Fila de trabalho: próximos por prioridade e tempo de espera (geral e por UBS)
+            models.Index(ordem_prioridade(), 'data_solicitacao', name='regcons_fila_prio_idx',
+                         condition=models.Q(status='fila')),
+            models.Index('ubs_solicitante', ordem_prioridade(), 'data_solicitacao', name='regcons_fila_ubs_prio_idx',
+                         condition=models.Q(status='fila')),
+            # Agenda: autorizados por data agendada
+            models.Index(fields=['data_agendada'], name='regcons_agenda_idx',
+                         condition=models.Q(status='autorizado', data_agendada__isnull=False)),
+        ]
 
     def __str__(self):
         return f"Protocolo {self.numero_protocolo} - {self.paciente.nome} - {self.especialidade.nome}"
@@ -401,13 +515,7 @@ class RegulacaoConsulta(models.Model):
     def save(self, *args, **kwargs):
         # Gerar número de protocolo no padrão: con + ddmmyyyy + sufixo incremental diário
         if not self.numero_protocolo:
-            base = f"con{timezone.localdate().strftime('%d%m%Y')}"
-            seq = 1
-            numero = f"{base}-{seq:04d}"
-            while type(self).objects.filter(numero_protocolo=numero).exists():
-                seq += 1
-                numero = f"{base}-{seq:04d}"
-            self.numero_protocolo = numero
+            self.numero_protocolo = SequenciaProtocolo.reservar(type(self), 'con')[0]
         super().save(*args, **kwargs)
 
     def get_status_badge_class(self):
@@ -595,7 +703,9 @@ class AgendaMedicaDia(models.Model):
             models.UniqueConstraint(fields=['medico', 'especialidade', 'data'], name='uniq_agenda_medica_dia')
         ]
         indexes = [
-            models.Index(fields=['medico', 'especialidade', 'data', 'ativo'])
+            models.Index(fields=['medico', 'especialidade', 'data', 'ativo']),
+            # Busca de vagas por especialidade entre todos os médicos (ver regulacao/vagas.py)
+            models.Index(fields=['especialidade', 'data'], name='agendadia_esp_data_idx', condition=models.Q(ativo=True)),
         ]
 
     def __str__(self):  # pragma: no cover
@@ -640,3 +750,242 @@ class AcaoUsuario(models.Model):
         return f"{self.usuario.username} - {self.get_tipo_acao_display()} - {self.data_acao.strftime('%d/%m/%Y %H:%M')}"
 
 
+
+
+# ============ Arquivo (histórico frio) ============
+# Tabelas de arquivo recebem registros antigos movidos pelo comando
+# ``arquivar_historico``. Mantêm as tabelas "quentes" (e seus índices) pequenas.
+# As referências não usam constraint no banco para que o arquivo sobreviva à
+# limpeza das tabelas de origem.
+
+class AcaoUsuarioArquivo(models.Model):
+    """Ações de usuários arquivadas (mesmas colunas de ``AcaoUsuario``)."""
+    usuario = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    tipo_acao = models.CharField('Tipo de Ação', max_length=30, choices=AcaoUsuario.TIPO_ACAO_CHOICES)
+    data_acao = models.DateTimeField('Data da Ação', db_index=True)
+    exame = models.ForeignKey('regulacao.RegulacaoExame', on_delete=models.DO_NOTHING, db_constraint=False,
+                              null=True, blank=True, related_name='+')
+    consulta = models.ForeignKey('regulacao.RegulacaoConsulta', on_delete=models.DO_NOTHING, db_constraint=False,
+                                 null=True, blank=True, related_name='+')
+    paciente_nome = models.CharField('Nome do Paciente', max_length=200)
+    motivo = models.TextField('Motivo/Observação', blank=True)
+    arquivado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Ação do Usuário (arquivo)'
+        verbose_name_plural = 'Ações dos Usuários (arquivo)'
+        ordering = ['-data_acao']
+        indexes = [
+            models.Index(fields=['usuario', 'data_acao']),
+        ]
+
+    def __str__(self):  # pragma: no cover
+        return f"{self.get_tipo_acao_display()} - {self.data_acao:%d/%m/%Y %H:%M}"
+
+
+class PendenciaMensagemArquivo(models.Model):
+    """Mensagens de pendência arquivadas (exames e consultas na mesma tabela)."""
+    ITEM_TIPO_CHOICES = [
+        ('exame', 'Exame'),
+        ('consulta', 'Consulta'),
+    ]
+    item_tipo = models.CharField(max_length=10, choices=ITEM_TIPO_CHOICES)
+    item_id = models.BigIntegerField()
+    autor = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                              related_name='+')
+    lado = models.CharField(max_length=20, choices=PendenciaMensagemExame.LADO_CHOICES)
+    tipo = models.CharField(max_length=20, choices=PendenciaMensagemExame.TIPO_CHOICES, default='mensagem')
+    texto = models.TextField()
+    criado_em = models.DateTimeField()
+    arquivado_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Mensagem de Pendência (arquivo)'
+        verbose_name_plural = 'Mensagens de Pendência (arquivo)'
+        ordering = ['criado_em']
+        indexes = [
+            models.Index(fields=['item_tipo', 'item_id', 'criado_em']),
+        ]
+
+
+class RegulacaoExameArquivo(models.Model):
+    """Exames encerrados há muito tempo (negados, cancelados ou autorizados com resultado).
+
+    Mesmas colunas de ``RegulacaoExame``; o ``id`` original é preservado para que
+    ``AcaoUsuarioArquivo``/``PendenciaMensagemArquivo`` continuem apontando para o item.
+    Leitura combinada com a tabela quente em ``regulacao.arquivo``.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    paciente = models.ForeignKey('pacientes.Paciente', on_delete=models.CASCADE, related_name='+',
+                                 verbose_name='Paciente')
+    ubs_solicitante = models.ForeignKey(UBS, on_delete=models.CASCADE, related_name='+',
+                                        verbose_name='UBS Solicitante')
+    medico_solicitante = models.ForeignKey(MedicoSolicitante, on_delete=models.CASCADE, related_name='+',
+                                           verbose_name='Médico Solicitante')
+    tipo_exame = models.ForeignKey(TipoExame, on_delete=models.CASCADE, related_name='+',
+                                   verbose_name='Tipo de Exame')
+    justificativa = models.TextField('Justificativa Clínica')
+    prioridade = models.CharField('Prioridade', max_length=20, choices=RegulacaoExame.PRIORIDADE_CHOICES)
+    observacoes_solicitacao = models.TextField('Observações da Solicitação', blank=True)
+    status = models.CharField('Status', max_length=20, choices=RegulacaoExame.STATUS_CHOICES)
+    data_solicitacao = models.DateTimeField('Data da Solicitação', db_index=True)
+    data_regulacao = models.DateTimeField('Data da Regulação', null=True, blank=True)
+    regulador = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                                  verbose_name='Regulador')
+    motivo_decisao = models.TextField('Motivo da Decisão', blank=True)
+    local_realizacao = models.CharField('Local de Realização', max_length=200, blank=True)
+    data_agendada = models.DateField('Data Agendada', null=True, blank=True)
+    hora_agendada = models.TimeField('Hora Agendada', null=True, blank=True)
+    medico_atendente = models.ForeignKey('regulacao.MedicoAmbulatorio', on_delete=models.SET_NULL, null=True,
+                                         blank=True, related_name='+', verbose_name='Médico Atendente')
+    observacoes_regulacao = models.TextField('Observações da Regulação', blank=True)
+    numero_pedido = models.CharField('Número do Pedido', max_length=50, blank=True, db_index=True)
+    numero_protocolo = models.CharField('Número do Protocolo', max_length=50, unique=True)
+    criado_em = models.DateTimeField()
+    atualizado_em = models.DateTimeField()
+    resultado_atendimento = models.CharField('Resultado do Atendimento', max_length=12,
+                                             choices=RegulacaoExame.RESULTADO_CHOICES, default='pendente')
+    resultado_observacao = models.TextField('Observação do Resultado', blank=True)
+    resultado_em = models.DateTimeField('Resultado registrado em', null=True, blank=True)
+    resultado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    pendencia_motivo = models.TextField('Motivo da Pendência', blank=True)
+    pendencia_aberta_em = models.DateTimeField('Pendência aberta em', null=True, blank=True)
+    pendencia_aberta_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    pendencia_resposta = models.TextField('Resposta da UBS', blank=True)
+    pendencia_respondida_em = models.DateTimeField('Pendência respondida em', null=True, blank=True)
+    pendencia_respondida_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                                 related_name='+')
+    pendencia_resolvida_em = models.DateTimeField('Pendência resolvida em', null=True, blank=True)
+    pendencia_resolvida_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                                related_name='+')
+    arquivado_em = models.DateTimeField(auto_now_add=True)
+
+    arquivado = True
+
+    class Meta:
+        verbose_name = 'Regulação de Exame (arquivo)'
+        verbose_name_plural = 'Regulações de Exames (arquivo)'
+        ordering = ['-data_solicitacao']
+        indexes = [
+            models.Index(fields=['paciente', 'data_solicitacao']),
+            models.Index(fields=['ubs_solicitante', 'status', 'data_solicitacao']),
+        ]
+
+    def __str__(self):  # pragma: no cover
+        return f"Protocolo {self.numero_protocolo} (arquivo)"
+
+    get_status_badge_class = RegulacaoExame.get_status_badge_class
+    get_prioridade_badge_class = RegulacaoExame.get_prioridade_badge_class
+    get_resultado_badge_class = RegulacaoExame.get_resultado_badge_class
+
+
+class RegulacaoConsultaArquivo(models.Model):
+    """Consultas encerradas há muito tempo (mesmas colunas de ``RegulacaoConsulta``, ``id`` preservado)."""
+    id = models.BigIntegerField(primary_key=True)
+    paciente = models.ForeignKey('pacientes.Paciente', on_delete=models.CASCADE, related_name='+',
+                                 verbose_name='Paciente')
+    ubs_solicitante = models.ForeignKey(UBS, on_delete=models.CASCADE, related_name='+',
+                                        verbose_name='UBS Solicitante')
+    medico_solicitante = models.ForeignKey(MedicoSolicitante, on_delete=models.CASCADE, related_name='+',
+                                           verbose_name='Médico Solicitante')
+    especialidade = models.ForeignKey(Especialidade, on_delete=models.CASCADE, related_name='+',
+                                      verbose_name='Especialidade')
+    justificativa = models.TextField('Justificativa Clínica')
+    prioridade = models.CharField('Prioridade', max_length=20, choices=RegulacaoConsulta.PRIORIDADE_CHOICES)
+    observacoes_solicitacao = models.TextField('Observações da Solicitação', blank=True)
+    status = models.CharField('Status', max_length=20, choices=RegulacaoConsulta.STATUS_CHOICES)
+    data_solicitacao = models.DateTimeField('Data da Solicitação', db_index=True)
+    data_regulacao = models.DateTimeField('Data da Regulação', null=True, blank=True)
+    regulador = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+                                  verbose_name='Regulador')
+    motivo_decisao = models.TextField('Motivo da Decisão', blank=True)
+    local_atendimento = models.CharField('Local de Atendimento', max_length=200, blank=True)
+    data_agendada = models.DateField('Data Agendada', null=True, blank=True)
+    hora_agendada = models.TimeField('Hora Agendada', null=True, blank=True)
+    medico_atendente = models.ForeignKey('regulacao.MedicoAmbulatorio', on_delete=models.SET_NULL, null=True,
+                                         blank=True, related_name='+', verbose_name='Médico Atendente')
+    observacoes_regulacao = models.TextField('Observações da Regulação', blank=True)
+    numero_protocolo = models.CharField('Número do Protocolo', max_length=50, unique=True)
+    criado_em = models.DateTimeField()
+    atualizado_em = models.DateTimeField()
+    resultado_atendimento = models.CharField('Resultado do Atendimento', max_length=12,
+                                             choices=RegulacaoConsulta.RESULTADO_CHOICES, default='pendente')
+    resultado_observacao = models.TextField('Observação do Resultado', blank=True)
+    resultado_em = models.DateTimeField('Resultado registrado em', null=True, blank=True)
+    resultado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    pendencia_motivo = models.TextField('Motivo da Pendência', blank=True)
+    pendencia_aberta_em = models.DateTimeField('Pendência aberta em', null=True, blank=True)
+    pendencia_aberta_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    pendencia_resposta = models.TextField('Resposta da UBS', blank=True)
+    pendencia_respondida_em = models.DateTimeField('Pendência respondida em', null=True, blank=True)
+    pendencia_respondida_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                                 related_name='+')
+    pendencia_resolvida_em = models.DateTimeField('Pendência resolvida em', null=True, blank=True)
+    pendencia_resolvida_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                                related_name='+')
+    arquivado_em = models.DateTimeField(auto_now_add=True)
+
+    arquivado = True
+
+    class Meta:
+        verbose_name = 'Regulação de Consulta (arquivo)'
+        verbose_name_plural = 'Regulações de Consultas (arquivo)'
+        ordering = ['-data_solicitacao']
+        indexes = [
+            models.Index(fields=['paciente', 'data_solicitacao']),
+            models.Index(fields=['ubs_solicitante', 'status', 'data_solicitacao']),
+        ]
+
+    def __str__(self):  # pragma: no cover
+        return f"Protocolo {self.numero_protocolo} (arquivo)"
+
+    get_status_badge_class = RegulacaoConsulta.get_status_badge_class
+    get_prioridade_badge_class = RegulacaoConsulta.get_prioridade_badge_class
+    get_resultado_badge_class = RegulacaoConsulta.get_resultado_badge_class
+
+
+# ============ Tempos de espera (agregados diários) ============
+
+class EsperaDiaria(models.Model):
+    """Percentis diários dos tempos de espera por dimensão (ver ``regulacao.esperas``).
+
+    Uma linha por dia de regulação, tipo (exame/consulta), dimensão e chave (ID da
+    especialidade, UBS ou tipo de exame; 0 no total geral). Etapas, em dias:
+    ``regulacao`` (solicitação → regulação) e ``agendamento`` (regulação → data agendada,
+    só autorizados com data).
+    """
+    TIPO_CHOICES = [('exame', 'Exame'), ('consulta', 'Consulta')]
+    DIMENSAO_CHOICES = [
+        ('geral', 'Geral'),
+        ('especialidade', 'Especialidade'),
+        ('ubs', 'UBS'),
+        ('tipo_exame', 'Tipo de exame'),
+    ]
+
+    dia = models.DateField('Dia da regulação')
+    tipo = models.CharField('Tipo', max_length=10, choices=TIPO_CHOICES)
+    dimensao = models.CharField('Dimensão', max_length=15, choices=DIMENSAO_CHOICES)
+    chave = models.PositiveIntegerField('Chave', default=0)
+    regulacao_qtd = models.PositiveIntegerField(default=0)
+    regulacao_p50 = models.FloatField(null=True, blank=True)
+    regulacao_p90 = models.FloatField(null=True, blank=True)
+    regulacao_media = models.FloatField(null=True, blank=True)
+    agendamento_qtd = models.PositiveIntegerField(default=0)
+    agendamento_p50 = models.FloatField(null=True, blank=True)
+    agendamento_p90 = models.FloatField(null=True, blank=True)
+    agendamento_media = models.FloatField(null=True, blank=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Espera diária'
+        verbose_name_plural = 'Esperas diárias'
+        ordering = ['dia']
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'tipo', 'dimensao', 'chave'], name='uniq_espera_diaria'),
+        ]
+        indexes = [
+            models.Index(fields=['dimensao', 'tipo', 'chave', 'dia'], name='espera_dim_chave_dia_idx'),
+        ]
+
+    def __str__(self):  # pragma: no cover
+        return f"{self.dia:%d/%m/%Y} {self.tipo} {self.dimensao}={self.chave}"
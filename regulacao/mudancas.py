@@ -0,0 +1,128 @@
+"""Feed incremental de mudanças por UBS (sincronização de integrações e do portal).
+
+Em vez de re-renderizar ``status_ubs``/``agenda_regulacao``, o cliente guarda um
+cursor e pede só o que mudou depois dele. A ordem é ``(atualizado_em, origem, id)``
+sobre exames e consultas juntos (``UNION ALL`` ordenado e recortado no banco); cada
+tabela é filtrada por ``ubs_solicitante`` + chave do cursor, servida pelo índice
+``(ubs_solicitante, atualizado_em, id)``.
+
+O cursor é opaco para o cliente (base64 de ``atualizado_em|origem|id``). Itens
+alterados há menos de ``MARGEM_SEGUNDOS`` ainda não são entregues, para que uma
+transação mais lenta que grave um ``atualizado_em`` anterior ao cursor já
+entregue não seja pulada. Exclusões não aparecem no feed (cancelamentos sim,
+como mudança de status).
+"""
+import base64
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from django.db.models import CharField, F, Q, Value
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import RegulacaoConsulta, RegulacaoExame
+
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 500
+MARGEM_SEGUNDOS = 5
+
+COLUNAS = (
+    'origem', 'id', 'atualizado_em', 'numero_protocolo', 'paciente_id', 'paciente_nome', 'ref_nome',
+    'status', 'prioridade', 'data_agendada', 'hora_agendada', 'local', 'medico_atendente_nome',
+    'pendencia_motivo', 'pendencia_aberta_em', 'pendencia_respondida_em', 'resultado_atendimento',
+)
+
+_FONTES = (
+    # (origem, model, relação de referência, campo de local)
+    ('consulta', RegulacaoConsulta, 'especialidade', 'local_atendimento'),
+    ('exame', RegulacaoExame, 'tipo_exame', 'local_realizacao'),
+)
+
+Cursor = Tuple[datetime, str, int]
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def codificar_cursor(cursor: Cursor) -> str:
+    momento, origem, pk = cursor
+    bruto = f"{momento.isoformat()}|{origem}|{pk}".encode()
+    return base64.urlsafe_b64encode(bruto).decode().rstrip('=')
+
+
+def decodificar_cursor(token: str) -> Cursor:
+    try:
+        bruto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        momento_txt, origem, pk = bruto.split('|')
+        momento = parse_datetime(momento_txt)
+        if momento is None or origem not in {'', *(f[0] for f in _FONTES)}:
+            raise ValueError
+        return momento, origem, int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise CursorInvalido('Cursor inválido.') from exc
+
+
+def cursor_desde(momento: datetime) -> Cursor:
+    """Cursor inicial a partir de um instante (itens com ``atualizado_em`` posterior)."""
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento, '', 0
+
+
+def _apos_cursor(origem: str, cursor: Optional[Cursor]) -> Q:
+    """Chave ``(atualizado_em, origem, id) > cursor`` para as linhas de ``origem``."""
+    if cursor is None:
+        return Q()
+    momento, origem_c, pk = cursor
+    if origem > origem_c:
+        return Q(atualizado_em__gte=momento)
+    if origem == origem_c:
+        return Q(atualizado_em__gt=momento) | Q(atualizado_em=momento, id__gt=pk)
+    return Q(atualizado_em__gt=momento)
+
+
+def _linhas(origem, model, ref, local, ubs_id, cursor, ate):
+    return (
+        model.objects
+        .filter(_apos_cursor(origem, cursor), ubs_solicitante_id=ubs_id, atualizado_em__lte=ate)
+        .order_by()
+        .annotate(
+            origem=Value(origem, output_field=CharField()),
+            paciente_nome=F('paciente__nome'),
+            ref_nome=F(f'{ref}__nome'),
+            local=F(local),
+            medico_atendente_nome=F('medico_atendente__nome'),
+        )
+        .values_list(*COLUNAS)
+    )
+
+
+def mudancas(ubs_id: int, cursor: Optional[Cursor] = None, limite: int = LIMITE_PADRAO) -> dict:
+    """Até ``limite`` itens da UBS alterados após ``cursor``, em ordem de alteração.
+
+    Retorna ``{'itens', 'cursor', 'tem_mais', 'etag'}``. ``cursor`` é o da última linha
+    entregue (ou o recebido, se não houver novidade); ``etag`` identifica a página e
+    permite responder ``304`` a quem já a tem.
+    """
+    limite = max(1, min(int(limite), LIMITE_MAXIMO))
+    ate = timezone.now() - timedelta(seconds=MARGEM_SEGUNDOS)
+    consultas, exames = (_linhas(*fonte, ubs_id, cursor, ate) for fonte in _FONTES)
+    linhas = list(consultas.union(exames, all=True).order_by('atualizado_em', 'origem', 'id')[:limite + 1])
+    tem_mais = len(linhas) > limite
+    itens = [dict(zip(COLUNAS, linha)) for linha in linhas[:limite]]
+    if itens:
+        ultimo = itens[-1]
+        token = codificar_cursor((ultimo['atualizado_em'], ultimo['origem'], ultimo['id']))
+    else:
+        token = codificar_cursor(cursor) if cursor else ''
+    assinatura = hashlib.md5(f"{ubs_id}:{token}:{tem_mais}".encode())
+    for item in itens:
+        assinatura.update(f"|{item['origem']}:{item['id']}:{item['atualizado_em'].isoformat()}".encode())
+    return {
+        'itens': itens,
+        'cursor': token,
+        'tem_mais': tem_mais,
+        'etag': f'W/"{assinatura.hexdigest()}"',
+    }
@@ -0,0 +1,153 @@
+"""Serviço de notificações da regulação.
+
+Centraliza a criação de ``Notificacao`` (fan-out em um único ``bulk_create``)
+e mantém em cache um contador de não lidas por usuário, usado pelo badge do
+menu sem consultar o banco.
+
+O contador é "preguiçoso": se a chave não estiver no cache, é recalculada com um
+``COUNT`` na próxima leitura. Incrementos/decrementos usam ``cache.incr``/``decr``
+(atômicos no Redis/Memcached) e só são aplicados após o commit da transação.
+Com cache local (sem Redis) cada processo tem o seu contador, por isso a
+validade é curta (``caches.validade``).
+"""
+from typing import Iterable, Optional, Tuple
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+from .caches import validade
+from .eventos import publicar_notificacoes
+from .models import Notificacao, UsuarioUBS
+
+CACHE_KEY_NAO_LIDAS = 'regulacao:notif:nao_lidas:{user_id}'
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def _cache_key(user_id: int) -> str:
+    return CACHE_KEY_NAO_LIDAS.format(user_id=user_id)
+
+
+def _ajustar_contador(user_id: int, delta: int) -> None:
+    """Aplica ``delta`` ao contador em cache; se a chave não existir, nada a fazer."""
+    if not delta:
+        return
+    key = _cache_key(user_id)
+    try:
+        if delta > 0:
+            cache.incr(key, delta)
+        else:
+            novo = cache.decr(key, -delta)
+            if novo < 0:
+                cache.delete(key)
+    except ValueError:
+        # Chave ausente/expirada: será recalculada na próxima leitura
+        pass
+
+
+def contar_nao_lidas(user) -> int:
+    """Quantidade de notificações não lidas do usuário (cache primeiro, banco se necessário)."""
+    user_id = getattr(user, 'pk', user)
+    if not user_id:
+        return 0
+    key = _cache_key(user_id)
+    valor = cache.get(key)
+    if valor is None:
+        valor = Notificacao.objects.filter(user_id=user_id, lida=False).count()
+        cache.add(key, valor, validade(CACHE_TIMEOUT))
+    return int(valor)
+
+
+def invalidar_contador(user) -> None:
+    cache.delete(_cache_key(getattr(user, 'pk', user)))
+
+
+def criar_notificacoes(itens: Iterable[Tuple[int, str, str]]) -> int:
+    """Cria várias notificações em um único INSERT.
+
+    ``itens``: iterável de tuplas ``(user_id, texto, url)``.
+    Retorna a quantidade criada.
+    """
+    objs = [Notificacao(user_id=uid, texto=texto, url=url or '') for uid, texto, url in itens if uid]
+    if not objs:
+        return 0
+    Notificacao.objects.bulk_create(objs)
+    publicar_notificacoes(objs)
+    por_usuario = {}
+    for o in objs:
+        por_usuario[o.user_id] = por_usuario.get(o.user_id, 0) + 1
+
+    def _atualizar():
+        for uid, n in por_usuario.items():
+            _ajustar_contador(uid, n)
+
+    transaction.on_commit(_atualizar)
+    return len(objs)
+
+
+def notificar_usuarios(user_ids: Iterable[int], texto: str, url: str = '') -> int:
+    """Envia a mesma notificação para vários usuários (uma escrita)."""
+    return criar_notificacoes((uid, texto, url) for uid in set(user_ids))
+
+
+def usuarios_da_ubs(ubs) -> list:
+    """IDs dos usuários vinculados à UBS (uma consulta, sem carregar ``User``)."""
+    ubs_id = getattr(ubs, 'pk', ubs)
+    if not ubs_id:
+        return []
+    return list(UsuarioUBS.objects.filter(ubs_id=ubs_id).values_list('user_id', flat=True))
+
+
+def usuarios_reguladores() -> list:
+    """IDs dos usuários do grupo 'regulacao'."""
+    return list(User.objects.filter(groups__name='regulacao').values_list('id', flat=True).distinct())
+
+
+def notificar_ubs(ubs, texto: str, url: str = '') -> int:
+    return notificar_usuarios(usuarios_da_ubs(ubs), texto, url)
+
+
+def notificar_reguladores(texto: str, url: str = '') -> int:
+    return notificar_usuarios(usuarios_reguladores(), texto, url)
+
+
+def notificar_varias_ubs(itens: Iterable[Tuple[int, str, str]]) -> int:
+    """Fan-out de várias mensagens para usuários de várias UBS.
+
+    ``itens``: iterável de tuplas ``(ubs_id, texto, url)``. Os vínculos de todas as
+    UBS envolvidas são lidos em uma consulta e as notificações gravadas em um INSERT.
+    """
+    itens = [i for i in itens if i[0]]
+    if not itens:
+        return 0
+    por_ubs = {}
+    vinculos = UsuarioUBS.objects.filter(ubs_id__in={i[0] for i in itens}).values_list('ubs_id', 'user_id')
+    for ubs_id, user_id in vinculos:
+        por_ubs.setdefault(ubs_id, []).append(user_id)
+    return criar_notificacoes(
+        (uid, texto, url) for ubs_id, texto, url in itens for uid in por_ubs.get(ubs_id, [])
+    )
+
+
+def marcar_lida(user, pk: int) -> bool:
+    """Marca uma notificação do usuário como lida. Retorna True se houve alteração."""
+    user_id = getattr(user, 'pk', user)
+    alteradas = Notificacao.objects.filter(pk=pk, user_id=user_id, lida=False).update(lida=True)
+    if alteradas:
+        transaction.on_commit(lambda: _ajustar_contador(user_id, -alteradas))
+    return bool(alteradas)
+
+
+def marcar_todas_lidas(user, ids: Optional[Iterable[int]] = None) -> int:
+    """Marca todas (ou as ``ids`` informadas) as notificações do usuário como lidas em um UPDATE."""
+    user_id = getattr(user, 'pk', user)
+    qs = Notificacao.objects.filter(user_id=user_id, lida=False)
+    if ids is not None:
+        qs = qs.filter(pk__in=list(ids))
+    alteradas = qs.update(lida=True)
+    if alteradas:
+        if ids is None:
+            transaction.on_commit(lambda: cache.set(_cache_key(user_id), 0, validade(CACHE_TIMEOUT)))
+        else:
+            transaction.on_commit(lambda: _ajustar_contador(user_id, -alteradas))
+    return alteradas
@@ -0,0 +1,138 @@
+"""Mapa de ocupação das agendas (capacidade × agendados × comparecimentos × faltas).
+
+Dois recortes:
+
+- ``medico``: médico × dia;
+- ``especialidade``: especialidade × semana (segunda-feira da semana).
+
+Cada fonte é um único ``GROUP BY`` no período: capacidade em ``AgendaMedicaDia`` e
+agendamentos (com resultado) em exames e consultas autorizados. O resultado fica
+em cache por período/filtros; a chave inclui um número de versão incrementado a
+cada agendamento, resultado ou mudança de agenda (``invalidar``), de modo que não
+é preciso enumerar as chaves. Com cache compartilhado (Redis) o incremento vale
+para todos os processos; com o ``LocMemCache`` ele só alcança o próprio processo
+e os demais servem o mapa antigo até expirar, por isso a validade é curta
+(``caches.validade``).
+"""
+from collections import defaultdict
+from datetime import date
+from typing import Optional
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncWeek
+
+from .caches import validade
+from .models import AgendaMedicaDia, Especialidade, MedicoAmbulatorio, RegulacaoConsulta, RegulacaoExame
+
+CACHE_KEY_VERSAO = 'regulacao:ocupacao:versao'
+CACHE_KEY_MAPA = 'regulacao:ocupacao:v{versao}:{modo}:{inicio}:{fim}:{especialidade_id}:{medico_id}'
+CACHE_TIMEOUT = 60 * 60
+MAX_DIAS = 366
+MODOS = ('medico', 'especialidade')
+
+
+def _versao() -> int:
+    versao = cache.get(CACHE_KEY_VERSAO)
+    if versao is None:
+        cache.add(CACHE_KEY_VERSAO, 1, None)
+        versao = cache.get(CACHE_KEY_VERSAO, 1)
+    return versao
+
+
+def _incrementar():
+    try:
+        cache.incr(CACHE_KEY_VERSAO)
+    except ValueError:
+        cache.set(CACHE_KEY_VERSAO, 1, None)
+
+
+def invalidar() -> None:
+    """Torna obsoletos todos os mapas em cache (após o commit da transação atual)."""
+    transaction.on_commit(_incrementar)
+
+
+def _capacidades(modo, inicio, fim, especialidade_id, medico_id):
+    qs = AgendaMedicaDia.objects.filter(ativo=True, data__gte=inicio, data__lte=fim)
+    if especialidade_id:
+        qs = qs.filter(especialidade_id=especialidade_id)
+    if medico_id:
+        qs = qs.filter(medico_id=medico_id)
+    if modo == 'medico':
+        qs = qs.values_list('medico_id', 'data')
+    else:
+        qs = qs.annotate(semana=TruncWeek('data')).values_list('especialidade_id', 'semana')
+    return qs.order_by().annotate(total=Sum('capacidade'))
+
+
+def _agendados(model, ref_especialidade, modo, inicio, fim, especialidade_id, medico_id):
+    qs = model.objects.filter(status='autorizado', data_agendada__gte=inicio, data_agendada__lte=fim,
+                              medico_atendente__isnull=False)
+    if especialidade_id:
+        qs = qs.filter(**{ref_especialidade: especialidade_id})
+    if medico_id:
+        qs = qs.filter(medico_atendente_id=medico_id)
+    if modo == 'medico':
+        qs = qs.values_list('medico_atendente_id', 'data_agendada')
+    else:
+        qs = qs.annotate(esp=F(ref_especialidade), semana=TruncWeek('data_agendada')).values_list('esp', 'semana')
+    return qs.order_by().annotate(
+        agendados=Count('id'),
+        compareceu=Count('id', filter=Q(resultado_atendimento='compareceu')),
+        faltou=Count('id', filter=Q(resultado_atendimento='faltou')),
+    )
+
+
+def calcular(modo: str, inicio: date, fim: date, especialidade_id: Optional[int] = None,
+             medico_id: Optional[int] = None) -> dict:
+    """Mapa sem cache. Retorna ``{'modo', 'inicio', 'fim', 'linhas', 'celulas'}``.
+
+    ``linhas`` é ``[{'id', 'nome'}]`` (médicos ou especialidades presentes) e ``celulas``
+    ``[{'linha', 'dia', 'capacidade', 'agendados', 'compareceu', 'faltou'}]``, com ``dia``
+    sendo a data (modo ``medico``) ou a segunda-feira da semana (modo ``especialidade``).
+    """
+    celulas = defaultdict(lambda: {'capacidade': 0, 'agendados': 0, 'compareceu': 0, 'faltou': 0})
+    for linha, dia, total in _capacidades(modo, inicio, fim, especialidade_id, medico_id):
+        celulas[(linha, dia.isoformat())]['capacidade'] += total or 0
+    for model, ref in ((RegulacaoExame, 'tipo_exame__especialidade_id'), (RegulacaoConsulta, 'especialidade_id')):
+        for linha, dia, agendados, compareceu, faltou in _agendados(
+                model, ref, modo, inicio, fim, especialidade_id, medico_id):
+            if linha is None:
+                continue
+            c = celulas[(linha, dia.isoformat())]
+            c['agendados'] += agendados
+            c['compareceu'] += compareceu
+            c['faltou'] += faltou
+
+    ids = {linha for linha, _ in celulas}
+    model_linha = MedicoAmbulatorio if modo == 'medico' else Especialidade
+    nomes = dict(model_linha.objects.filter(pk__in=ids).values_list('pk', 'nome'))
+    return {
+        'modo': modo,
+        'inicio': inicio.isoformat(),
+        'fim': fim.isoformat(),
+        'linhas': sorted(({'id': pk, 'nome': nomes.get(pk, '')} for pk in ids), key=lambda x: x['nome']),
+        'celulas': [
+            {'linha': linha, 'dia': dia, **valores}
+            for (linha, dia), valores in sorted(celulas.items(), key=lambda kv: (kv[0][1], kv[0][0]))
+        ],
+    }
+
+
+def mapa(modo: str, inicio: date, fim: date, especialidade_id: Optional[int] = None,
+         medico_id: Optional[int] = None) -> dict:
+    """``calcular`` com cache por período/filtros (descartado a cada mudança de agenda)."""
+    if modo not in MODOS:
+        raise ValueError('Modo inválido.')
+    if fim < inicio or (fim - inicio).days > MAX_DIAS:
+        raise ValueError(f'Período inválido (máximo de {MAX_DIAS} dias).')
+    key = CACHE_KEY_MAPA.format(
+        versao=_versao(), modo=modo, inicio=inicio.isoformat(), fim=fim.isoformat(),
+        especialidade_id=especialidade_id or 0, medico_id=medico_id or 0,
+    )
+    resultado = cache.get(key)
+    if resultado is None:
+        resultado = calcular(modo, inicio, fim, especialidade_id, medico_id)
+        cache.set(key, resultado, validade(CACHE_TIMEOUT))
+    return resultado
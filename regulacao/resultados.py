@@ -0,0 +1,160 @@
+"""Registro do resultado do atendimento (compareceu/faltou/aguardando) em lote.
+
+Usado pela agenda (``registrar_resultados_agenda``) e pelos registros de um item.
+Os itens de uma tabela são lidos em uma consulta (linhas travadas com
+``SELECT ... FOR UPDATE``), validados em memória e gravados com um
+``bulk_update`` por tabela e por resultado, em vez de um ``save`` por item.
+Itens cujo resultado e observação não mudam não são regravados.
+
+Cada item recebe um resultado próprio; itens inválidos não impedem os demais.
+
+``check_in`` é o registro da recepção pelo código de barras do comprovante: um
+``UPDATE`` pelo ``numero_protocolo`` (único) do item agendado para hoje.
+"""
+from collections import defaultdict
+from typing import Iterable, List, Tuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import ocupacao
+from .models import RegulacaoConsulta, RegulacaoExame
+from .signals import apos_gravacao_em_lote
+
+RESULTADOS = ('compareceu', 'faltou', 'pendente')
+TIPOS = {'ex': RegulacaoExame, 'co': RegulacaoConsulta}
+CAMPOS = ['resultado_atendimento', 'resultado_observacao', 'resultado_por', 'resultado_em', 'atualizado_em']
+BATCH_SIZE = 500
+
+ERROS = {
+    'nao_encontrado': 'Item não encontrado.',
+    'nao_autorizado': 'Somente itens autorizados e com data agendada podem receber resultado.',
+    'data_futura': 'Não é possível registrar resultado antes da data agendada.',
+    'resultado_invalido': 'Resultado inválido.',
+}
+
+
+def _resultado(tipo: str, pk: int, codigo: str = '', alterado: bool = False) -> dict:
+    res = {'tipo': tipo, 'id': pk, 'ok': not codigo, 'alterado': alterado}
+    if codigo:
+        res['codigo'] = codigo
+        res['erro'] = ERROS[codigo]
+    return res
+
+
+def registrar(usuario, itens: Iterable[Tuple[str, int, str, str]]) -> List[dict]:
+    """Aplica ``[(tipo, id, resultado, observacao), ...]`` (``tipo`` em ``'ex'``/``'co'``).
+
+    Devolve, na mesma ordem, ``{'tipo', 'id', 'ok', 'alterado'}`` (com ``codigo`` e
+    ``erro`` quando ``ok`` é falso). Um item repetido vale pela última ocorrência.
+    """
+    itens = [(tipo, int(pk), (valor or '').strip(), (obs or '').strip()) for tipo, pk, valor, obs in itens]
+    resultados: List[dict] = [None] * len(itens)
+    hoje = timezone.localdate()
+    agora = timezone.now()
+
+    with transaction.atomic():
+        for tipo, model in TIPOS.items():
+            posicoes, do_tipo = defaultdict(list), {}
+            for pos, (t, pk, valor, obs) in enumerate(itens):
+                if t == tipo:
+                    posicoes[pk].append(pos)
+                    do_tipo[pk] = (valor, obs)
+            if not do_tipo:
+                continue
+            travados = {
+                obj.pk: obj
+                for obj in model.objects.select_for_update(of=('self',))
+                .only('pk', 'status', 'data_agendada', 'paciente_id', 'ubs_solicitante_id',
+                      'resultado_atendimento', 'resultado_observacao')
+                .filter(pk__in=list(do_tipo))
+            }
+            por_valor = defaultdict(list)
+            for pk, (valor, obs) in do_tipo.items():
+                obj = travados.get(pk)
+                if obj is None:
+                    res = _resultado(tipo, pk, 'nao_encontrado')
+                elif obj.status != 'autorizado' or not obj.data_agendada:
+                    res = _resultado(tipo, pk, 'nao_autorizado')
+                elif obj.data_agendada > hoje:
+                    res = _resultado(tipo, pk, 'data_futura')
+                elif valor not in RESULTADOS:
+                    res = _resultado(tipo, pk, 'resultado_invalido')
+                elif obj.resultado_atendimento == valor and obj.resultado_observacao == obs:
+                    res = _resultado(tipo, pk)
+                else:
+                    obj.resultado_atendimento = valor
+                    obj.resultado_observacao = obs
+                    obj.resultado_por = usuario
+                    obj.resultado_em = agora
+                    obj.atualizado_em = agora
+                    por_valor[valor].append(obj)
+                    res = _resultado(tipo, pk, alterado=True)
+                for pos in posicoes[pk]:
+                    resultados[pos] = res
+
+            if not por_valor:
+                continue
+            for objs in por_valor.values():
+                model.objects.bulk_update(objs, CAMPOS, batch_size=BATCH_SIZE)
+            apos_gravacao_em_lote(obj for objs in por_valor.values() for obj in objs)
+    return resultados
+
+
+# Prefixo do ``numero_protocolo`` (``SequenciaProtocolo.reservar``) -> tipo
+PREFIXOS = {'exa': 'ex', 'con': 'co'}
+
+
+def _tipos_do_protocolo(protocolo: str) -> list:
+    tipo = PREFIXOS.get(protocolo[:3].lower())
+    return [tipo] if tipo else list(TIPOS)
+
+
+def check_in(usuario, protocolo: str) -> dict:
+    """Marca ``compareceu`` no item de ``protocolo`` agendado para hoje (leitura na recepção).
+
+    Um ``UPDATE`` pelo índice único de ``numero_protocolo`` (a tabela vem do prefixo) e
+    uma leitura pelo mesmo índice para a resposta. Devolve ``{'ok', 'protocolo', 'tipo',
+    'ja_registrado', 'paciente', 'item', 'data', 'hora'}`` ou ``{'ok': False, 'erro'}``.
+    """
+    protocolo = (protocolo or '').strip()
+    if not protocolo:
+        return {'ok': False, 'protocolo': protocolo, 'erro': 'Protocolo não informado.'}
+    hoje = timezone.localdate()
+    agora = timezone.now()
+    for tipo in _tipos_do_protocolo(protocolo):
+        model = TIPOS[tipo]
+        marcados = (
+            model.objects
+            .filter(numero_protocolo=protocolo, status='autorizado', data_agendada=hoje)
+            .exclude(resultado_atendimento='compareceu')
+            .update(resultado_atendimento='compareceu', resultado_por=usuario, resultado_em=agora,
+                    atualizado_em=agora)
+        )
+        if marcados:
+            # ``update`` não dispara post_save; dos caches, só os mapas de ocupação contam comparecimentos
+            ocupacao.invalidar()
+        ref = 'tipo_exame__nome' if tipo == 'ex' else 'especialidade__nome'
+        item = (
+            model.objects.filter(numero_protocolo=protocolo)
+            .values('status', 'data_agendada', 'hora_agendada', 'resultado_atendimento', 'paciente__nome', ref)
+            .first()
+        )
+        if item is None:
+            continue
+        res = {
+            'protocolo': protocolo,
+            'tipo': tipo,
+            'paciente': item['paciente__nome'],
+            'item': item[ref],
+            'data': item['data_agendada'].isoformat() if item['data_agendada'] else None,
+            'hora': item['hora_agendada'].strftime('%H:%M') if item['hora_agendada'] else None,
+        }
+        ja_registrado = (item['status'] == 'autorizado' and item['data_agendada'] == hoje
+                         and item['resultado_atendimento'] == 'compareceu')
+        if marcados or ja_registrado:
+            return {'ok': True, 'ja_registrado': not marcados, **res}
+        if item['status'] != 'autorizado' or not item['data_agendada']:
+            return {'ok': False, 'erro': ERROS['nao_autorizado'], **res}
+        return {'ok': False, 'erro': f"Agendado para {item['data_agendada']:%d/%m/%Y}, não para hoje.", **res}
+    return {'ok': False, 'protocolo': protocolo, 'erro': 'Protocolo não encontrado.'}
@@ -0,0 +1,41 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import alertas
+from . import ocupacao as mapas_ocupacao
+from .eventos import publicar_mudanca_ubs
+from .models import AgendaMedicaDia, RegulacaoConsulta, RegulacaoExame
+
+
+def apos_gravacao_em_lote(objs, ocupacao: bool = True) -> None:
+    """Efeitos de ``avisar_mudanca_regulacao`` para exames/consultas gravados sem sinais.
+
+    ``bulk_create``, ``bulk_update`` e ``update`` não disparam ``post_save``: quem grava
+    em lote chama esta função com os objetos afetados. Publica a mudança das UBS,
+    descarta os resumos dos pacientes e, salvo ``ocupacao=False`` (itens novos, ainda
+    sem agenda), os mapas de ocupação.
+    """
+    objs = list(objs)
+    if not objs:
+        return
+    publicar_mudanca_ubs({o.ubs_solicitante_id for o in objs})
+    alertas.invalidar_varios({o.paciente_id for o in objs})
+    if ocupacao:
+        mapas_ocupacao.invalidar()
+
+
+@receiver(post_save, sender=RegulacaoExame)
+@receiver(post_save, sender=RegulacaoConsulta)
+@receiver(post_delete, sender=RegulacaoExame)
+@receiver(post_delete, sender=RegulacaoConsulta)
+def avisar_mudanca_regulacao(sender, instance, **kwargs):
+    """Publica mudança de fila/pendência da UBS para as conexões SSE abertas
+    e descarta o resumo de itens em aberto do paciente e os mapas de ocupação."""
+    apos_gravacao_em_lote([instance])
+
+
+@receiver(post_save, sender=AgendaMedicaDia)
+@receiver(post_delete, sender=AgendaMedicaDia)
+def avisar_mudanca_agenda(sender, instance, **kwargs):
+    """Capacidade alterada: descarta os mapas de ocupação em cache."""
+    mapas_ocupacao.invalidar()
@@ -0,0 +1,267 @@
+"""Simulação da fila de espera por especialidade (dimensionamento de agendas).
+
+Responde a perguntas como "se a cardiologia ganhar mais um dia de agenda por
+semana, quanto a espera diminui?". Os parâmetros vêm do banco em poucos
+``GROUP BY``:
+
+- chegadas: solicitações (exames e consultas) por dia da semana na janela recente;
+- fila atual: itens em ``fila`` por idade (dias desde a solicitação);
+- capacidade: agendas por dia já cadastradas no horizonte, descontados os
+  agendamentos já feitos; depois da última agenda cadastrada, o perfil semanal
+  das 8 semanas anteriores. Usa a capacidade efetiva (overbooking, ver ``vagas``);
+- faltas: taxa de faltas dos atendimentos da especialidade na janela.
+
+A simulação é discreta por dia e vetorizada em NumPy: cada linha da matriz
+``execucoes × coortes`` é uma execução independente, com chegadas Poisson e
+faltas binomiais; as vagas do dia atendem a fila por ordem de chegada. Faltosos
+voltam à fila na posição original com probabilidade ``reentrada``. O cenário
+alternativo é simulado com a mesma semente (números aleatórios comuns), de modo
+que a diferença entre os dois reflete a mudança de capacidade/demanda.
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractIsoWeekDay, TruncDate
+from django.utils import timezone
+
+from . import vagas
+from .models import AgendaMedicaDia, RegulacaoConsulta, RegulacaoExame
+
+JANELA_DIAS = 90
+SEMANAS_PERFIL = 8
+MAX_DIAS = 365
+MAX_EXECUCOES = 5000
+# Limites do endpoint HTTP (dois cenários no thread da requisição); o comando simular_fila usa os de cima
+MAX_DIAS_WEB = 180
+MAX_EXECUCOES_WEB = 1000
+MAX_IDADE = 730
+PERCENTIS = (50, 90, 95)
+
+_FONTES = ((RegulacaoExame, 'tipo_exame__especialidade_id'), (RegulacaoConsulta, 'especialidade_id'))
+
+
+def executar(fila_inicial, chegadas, capacidade, taxa_falta: float, reentrada: float, execucoes: int, rng):
+    """Roda ``execucoes`` simulações de ``len(capacidade)`` dias.
+
+    ``fila_inicial[g]`` é a quantidade de itens com ``g`` dias de espera hoje;
+    ``chegadas[t]`` a média de solicitações e ``capacidade[t]`` as vagas do dia ``t``,
+    em que ``t = 0`` é amanhã (como em ``parametros``).
+    Retorna ``(histograma_esperas, fila_final, atendidos)``: o histograma (soma das
+    execuções) conta os atendimentos por dias de espera; os outros dois são por execução.
+    """
+    fila_inicial = np.asarray(fila_inicial, dtype=np.int64)
+    chegadas = np.asarray(chegadas, dtype=float)
+    capacidade = np.asarray(capacidade, dtype=np.int64)
+    idades, dias = len(fila_inicial), len(capacidade)
+    # Coortes em ordem de chegada: fila atual (mais antiga primeiro) e uma por dia simulado.
+    # Hoje é o dia -1: um item com ``g`` dias de espera hoje chegou no dia ``-g - 1``
+    dia_chegada = np.concatenate([-np.arange(idades)[::-1] - 1, np.arange(dias)])
+    fila = np.zeros((execucoes, idades + dias), dtype=np.int64)
+    fila[:, :idades] = fila_inicial[::-1]
+    esperas = np.zeros(idades + dias, dtype=np.int64)
+    atendidos = np.zeros(execucoes, dtype=np.int64)
+    cabeca = 0
+    for t in range(dias):
+        fim = idades + t + 1
+        fila[:, fim - 1] = rng.poisson(chegadas[t], execucoes)
+        if capacidade[t] <= 0:
+            continue
+        while cabeca < fim and not fila[:, cabeca].any():
+            cabeca += 1
+        if cabeca == fim:
+            continue
+        ativo = fila[:, cabeca:fim]
+        antes = np.cumsum(ativo, axis=1) - ativo
+        servidos = np.minimum(ativo, np.clip(capacidade[t] - antes, 0, None))
+        faltas = rng.binomial(servidos, taxa_falta) if taxa_falta > 0 else np.zeros_like(servidos)
+        voltam = rng.binomial(faltas, reentrada) if reentrada > 0 else np.zeros_like(faltas)
+        fila[:, cabeca:fim] -= servidos - voltam
+        compareceram = servidos - faltas
+        esperas[t - dia_chegada[cabeca:fim]] += compareceram.sum(axis=0)
+        atendidos += compareceram.sum(axis=1)
+    return esperas, fila.sum(axis=1), atendidos
+
+
+def _percentis(histograma) -> Optional[dict]:
+    total = int(histograma.sum())
+    if not total:
+        return None
+    acumulado = np.cumsum(histograma)
+    resumo = {f'p{q}': int(np.searchsorted(acumulado, total * q / 100)) for q in PERCENTIS}
+    resumo['media'] = round(float((histograma * np.arange(len(histograma))).sum() / total), 1)
+    return resumo
+
+
+def _resumo(esperas, fila_final, atendidos) -> dict:
+    return {
+        'espera_dias': _percentis(esperas),
+        'atendidos_media': round(float(atendidos.mean()), 1),
+        'fila_final': {f'p{q}': int(np.percentile(fila_final, q)) for q in (10, 50, 90)},
+    }
+
+
+def _chegadas_semana(especialidade_ids, agora, janela_dias: int) -> np.ndarray:
+    """Média de solicitações por dia da semana (0=segunda) na janela."""
+    contagem = np.zeros(7)
+    for model, ref in _FONTES:
+        linhas = (
+            model.objects
+            .filter(**{f'{ref}__in': especialidade_ids}, data_solicitacao__gte=agora - timedelta(days=janela_dias))
+            .annotate(dow=ExtractIsoWeekDay('data_solicitacao'))
+            .order_by()
+            .values_list('dow')
+            .annotate(n=Count('id'))
+        )
+        for dow, n in linhas:
+            contagem[dow - 1] += n
+    return contagem / (janela_dias / 7)
+
+
+def _fila_por_idade(especialidade_ids, hoje: date) -> np.ndarray:
+    idades = np.zeros(1, dtype=np.int64)
+    for model, ref in _FONTES:
+        linhas = (
+            model.objects
+            .filter(**{f'{ref}__in': especialidade_ids}, status='fila')
+            .annotate(dia=TruncDate('data_solicitacao'))
+            .order_by()
+            .values_list('dia')
+            .annotate(n=Count('id'))
+        )
+        for dia, n in linhas:
+            idade = min(max((hoje - dia).days, 0), MAX_IDADE)
+            if idade >= len(idades):
+                idades = np.concatenate([idades, np.zeros(idade + 1 - len(idades), dtype=np.int64)])
+            idades[idade] += n
+    return idades
+
+
+def _capacidades(especialidade_ids, inicio: date, fim: date) -> Dict[date, int]:
+    """Vagas efetivas por data em ``[inicio, fim]``."""
+    return dict(
+        AgendaMedicaDia.objects
+        .filter(especialidade_id__in=especialidade_ids, ativo=True, medico__ativo=True,
+                data__gte=inicio, data__lte=fim)
+        .order_by()
+        .values_list('data')
+        .annotate(total=Sum(vagas.capacidade_efetiva_expr()))
+    )
+
+
+def _comprometidos(especialidade_ids, inicio: date, fim: date) -> Dict[date, int]:
+    """Agendamentos já autorizados por data (ocupam vagas do horizonte)."""
+    usados: Dict[date, int] = defaultdict(int)
+    for model, ref in _FONTES:
+        linhas = (
+            model.objects
+            .filter(**{f'{ref}__in': especialidade_ids}, status='autorizado',
+                    data_agendada__gte=inicio, data_agendada__lte=fim)
+            .order_by()
+            .values_list('data_agendada')
+            .annotate(n=Count('id'))
+        )
+        for dia, n in linhas:
+            usados[dia] += n
+    return usados
+
+
+def _taxa_falta(especialidade_ids, janela_dias: int) -> float:
+    faltas = total = 0
+    ids = set(especialidade_ids)
+    for (_, esp_id), (f, n) in vagas.taxas_falta(janela_dias).items():
+        if esp_id in ids:
+            faltas += f
+            total += n
+    return faltas / total if total else 0.0
+
+
+def _extra_por_dia_semana(perfil: np.ndarray, capacidade_extra_semanal: int) -> np.ndarray:
+    """Distribui as vagas extras da semana pelos dias que já têm agenda (ou segunda a sexta)."""
+    dias = [d for d in range(7) if perfil[d] > 0] or list(range(5))
+    extra = np.zeros(7, dtype=np.int64)
+    for i, d in enumerate(dias):
+        extra[d] = capacidade_extra_semanal // len(dias) + (1 if i < capacidade_extra_semanal % len(dias) else 0)
+    return extra
+
+
+def parametros(especialidade_ids: Iterable[int], dias: int, janela_dias: int = JANELA_DIAS) -> dict:
+    """Lê do banco os parâmetros da simulação a partir de amanhã (ver docstring do módulo)."""
+    especialidade_ids = list(especialidade_ids)
+    hoje = timezone.localdate()
+    inicio, fim = hoje + timedelta(days=1), hoje + timedelta(days=dias)
+    agendadas = _capacidades(especialidade_ids, inicio, fim)
+    referencia = max(agendadas) if agendadas else hoje
+    perfil = np.zeros(7)
+    for dia, total in _capacidades(especialidade_ids, referencia - timedelta(weeks=SEMANAS_PERFIL) + timedelta(days=1),
+                                   referencia).items():
+        perfil[dia.weekday()] += total or 0
+    perfil = np.floor(perfil / SEMANAS_PERFIL)
+    comprometidos = _comprometidos(especialidade_ids, inicio, fim)
+    datas = [inicio + timedelta(days=t) for t in range(dias)]
+    return {
+        'datas': datas,
+        'chegadas_semana': _chegadas_semana(especialidade_ids, timezone.now(), janela_dias),
+        'fila_inicial': _fila_por_idade(especialidade_ids, hoje),
+        'perfil_semana': perfil,
+        'capacidade': np.array([
+            max(0, ((agendadas.get(d) or 0) if d <= referencia else int(perfil[d.weekday()]))
+                - comprometidos.get(d, 0))
+            for d in datas
+        ], dtype=np.int64),
+        'taxa_falta': _taxa_falta(especialidade_ids, janela_dias),
+    }
+
+
+def simular(especialidade_id: int, *, dias: int = 180, execucoes: int = 1000, capacidade_extra_semanal: int = 0,
+            fator_demanda: float = 1.0, reentrada: float = 1.0, semente: Optional[int] = None,
+            max_dias: int = MAX_DIAS, max_execucoes: int = MAX_EXECUCOES) -> dict:
+    """Projeta a espera da especialidade (e homônimas) no cenário atual e no alternativo.
+
+    ``capacidade_extra_semanal`` (vagas a mais por semana) e ``fator_demanda``
+    (multiplicador das chegadas) definem o cenário; sem mudança, só o atual é simulado.
+    Cada cenário traz ``espera_dias`` (p50/p90/p95/média dos atendidos no horizonte),
+    ``atendidos_media`` e ``fila_final`` (p10/p50/p90 entre as execuções). ``dias`` e
+    ``execucoes`` são limitados a ``max_dias``/``max_execucoes``.
+    """
+    ids = vagas.especialidades_equivalentes(especialidade_id)
+    if not ids:
+        raise ValueError('Especialidade não encontrada.')
+    dias = max(1, min(int(dias), max_dias, MAX_DIAS))
+    execucoes = max(1, min(int(execucoes), max_execucoes, MAX_EXECUCOES))
+    if fator_demanda < 0 or not 0 <= reentrada <= 1 or capacidade_extra_semanal < 0:
+        raise ValueError('Parâmetros do cenário inválidos.')
+    p = parametros(ids, dias)
+    dow = np.array([d.weekday() for d in p['datas']])
+    chegadas = p['chegadas_semana'][dow]
+    semente = semente if semente is not None else int(np.random.SeedSequence().entropy % (2 ** 32))
+
+    def rodar(chegadas_dia, capacidade):
+        return _resumo(*executar(p['fila_inicial'], chegadas_dia, capacidade, p['taxa_falta'], reentrada,
+                                 execucoes, np.random.default_rng(semente)))
+
+    atual = rodar(chegadas, p['capacidade'])
+    cenario = None
+    if capacidade_extra_semanal or fator_demanda != 1.0:
+        extra = _extra_por_dia_semana(p['perfil_semana'], int(capacidade_extra_semanal))
+        cenario = rodar(chegadas * fator_demanda, p['capacidade'] + extra[dow])
+    return {
+        'especialidade_id': especialidade_id,
+        'especialidades': ids,
+        'dias': dias,
+        'execucoes': execucoes,
+        'semente': semente,
+        'parametros': {
+            'fila_atual': int(p['fila_inicial'].sum()),
+            'chegadas_semana': round(float(p['chegadas_semana'].sum()), 1),
+            'capacidade_semana': int(p['perfil_semana'].sum()),
+            'taxa_falta': round(p['taxa_falta'], 3),
+            'reentrada': reentrada,
+            'capacidade_extra_semanal': int(capacidade_extra_semanal),
+            'fator_demanda': fator_demanda,
+        },
+        'atual': atual,
+        'cenario': cenario,
+    }
@@ -1,4 +1,7 @@
 from django import template
+from django.utils.safestring import mark_safe
+
+from regulacao import codigo_barras as _codigo_barras
 
 register = template.Library()
 
@@ -20,4 +23,14 @@ def get_attr(obj, attr_name):
 @register.filter
 def make_key(paciente_id, data):
     """Cria uma chave combinando paciente_id e data para busca no dicionário."""
-    return f"{paciente_id}_{data}"
\ No newline at end of file
+    return f"{paciente_id}_{data}"
+
+@register.filter
+def codigo_barras(texto, altura=40):
+    """SVG Code 128 de ``texto`` (ex.: ``numero_protocolo`` nos comprovantes)."""
+    if not texto:
+        return ''
+    try:
+        return mark_safe(_codigo_barras.svg(str(texto), altura=int(altura)))
+    except ValueError:
+        return ''
@@ -1 +1,603 @@
-"""Tests for regulacao app (placeholder)."""
+"""Tests for regulacao app."""
+import threading
+from contextlib import contextmanager
+from datetime import date, timedelta
+from unittest import mock, skipUnless
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, connections, transaction
+from django.db.models import Case
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from pacientes.models import Paciente
+from secretaria_it.datas import filtro_dia, filtro_periodo
+
+from . import acoes, alertas, alocacao, fila, intake, mudancas, resultados, vagas
+from .models import (
+    UBS,
+    AgendaMedicaDia,
+    Especialidade,
+    MedicoAmbulatorio,
+    MedicoSolicitante,
+    PendenciaMensagemConsulta,
+    RegulacaoConsulta,
+    RegulacaoExame,
+    TipoExame,
+    ordem_prioridade,
+)
+from .codigo_barras import barras, simbolos
+from .simulacao import executar
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN/índices parciais exigem PostgreSQL')
+class IndicesRegulacaoExplainTests(TestCase):
+    """Garante que as consultas quentes da regulação usam índice (e não varredura sequencial).
+
+    Com poucos dados o planejador sempre prefere ``Seq Scan``; por isso cada plano é
+    obtido com ``enable_seqscan = off``. Se nenhum índice servir para o filtro, o
+    PostgreSQL ainda assim escolhe ``Seq Scan`` e o teste falha.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ubs = [UBS.objects.create(nome=f'UBS {i}') for i in range(3)]
+        cls.medico_sol = MedicoSolicitante.objects.create(nome='Solicitante', crm='CRM-SOL')
+        cls.especialidade = Especialidade.objects.create(nome='Cardiologia')
+        cls.tipo = TipoExame.objects.create(nome='Hemograma', ativo=True, especialidade=cls.especialidade)
+        cls.medico_amb = MedicoAmbulatorio.objects.create(nome='Atendente', crm='CRM-AMB')
+        cls.pacientes = Paciente.objects.bulk_create([Paciente(nome=f'Paciente {i}') for i in range(20)])
+        hoje = timezone.localdate()
+        status_ciclo = ['fila', 'pendente', 'autorizado', 'negado', 'cancelado']
+        exames, consultas = [], []
+        for i in range(200):
+            status = status_ciclo[i % len(status_ciclo)]
+            comum = dict(
+                paciente=cls.pacientes[i % len(cls.pacientes)],
+                ubs_solicitante=cls.ubs[i % len(cls.ubs)],
+                medico_solicitante=cls.medico_sol,
+                justificativa='Teste',
+                status=status,
+                data_agendada=hoje + timedelta(days=i % 30) if status == 'autorizado' else None,
+                medico_atendente=cls.medico_amb if status == 'autorizado' else None,
+            )
+            exames.append(RegulacaoExame(tipo_exame=cls.tipo, numero_protocolo=f'exa-teste-{i}', **comum))
+            consultas.append(RegulacaoConsulta(especialidade=cls.especialidade,
+                                               numero_protocolo=f'con-teste-{i}', **comum))
+        RegulacaoExame.objects.bulk_create(exames)
+        RegulacaoConsulta.objects.bulk_create(consultas)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE regulacao_regulacaoexame')
+            cursor.execute('ANALYZE regulacao_regulacaoconsulta')
+
+    def plano(self, qs) -> str:
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return qs.explain()
+
+    PREFIXOS = {RegulacaoExame: 'regexame', RegulacaoConsulta: 'regcons'}
+
+    def assertUsaIndice(self, qs, *indices):
+        """O plano usa um dos ``indices`` (nome sem o prefixo da tabela, ex.: ``fila_prio_idx``).
+
+        Mais de um nome só onde dois índices servem igualmente ao filtro e a escolha
+        depende das estatísticas.
+        """
+        plano = self.plano(qs)
+        self.assertNotIn(f'Seq Scan on {qs.model._meta.db_table}', plano, plano)
+        nomes = [f'{self.PREFIXOS[qs.model]}_{indice}' for indice in indices]
+        self.assertTrue(any(nome in plano for nome in nomes), f'{nomes} fora do plano:\n{plano}')
+
+    def test_fila_espera_por_ubs(self):
+        for model in (RegulacaoExame, RegulacaoConsulta):
+            qs = model.objects.filter(status='fila', ubs_solicitante=self.ubs[0]).order_by('data_solicitacao')
+            self.assertUsaIndice(qs, 'fila_idx', 'st_ubs_dt_idx')
+
+    def test_fila_espera_geral(self):
+        for model in (RegulacaoExame, RegulacaoConsulta):
+            qs = model.objects.filter(status='fila').values_list('paciente_id', flat=True).distinct()
+            self.assertUsaIndice(qs, 'fila_idx', 'fila_prio_idx', 'st_ubs_dt_idx')
+
+    def test_pendencias_da_ubs(self):
+        for model in (RegulacaoExame, RegulacaoConsulta):
+            qs = model.objects.filter(
+                ubs_solicitante=self.ubs[1], status__in=['fila', 'pendente']
+            ).order_by('-data_solicitacao')
+            self.assertUsaIndice(qs, 'st_ubs_dt_idx')
+
+    def test_capacidade_medico_dia(self):
+        dia = timezone.localdate()
+        for model in (RegulacaoExame, RegulacaoConsulta):
+            qs = model.objects.filter(medico_atendente=self.medico_amb, data_agendada=dia, status='autorizado')
+            self.assertUsaIndice(qs, 'med_dt_st_idx')
+
+    def test_alertas_do_paciente(self):
+        for model in (RegulacaoExame, RegulacaoConsulta):
+            qs = model.objects.filter(paciente=self.pacientes[0], status__in=['fila', 'autorizado'])
+            self.assertUsaIndice(qs, 'pac_st_idx')
+
+    def test_agenda_por_periodo(self):
+        hoje = timezone.localdate()
+        for model in (RegulacaoExame, RegulacaoConsulta):
+            qs = model.objects.filter(
+                status='autorizado', data_agendada__isnull=False,
+                data_agendada__gte=hoje, data_agendada__lte=hoje + timedelta(days=7),
+            ).order_by('data_agendada')
+            self.assertUsaIndice(qs, 'agenda_idx')
+
+    def test_periodo_de_solicitacao_na_fila(self):
+        hoje = timezone.localdate()
+        for model in (RegulacaoExame, RegulacaoConsulta):
+            qs = model.objects.filter(
+                filtro_periodo('data_solicitacao', hoje - timedelta(days=30), hoje),
+                status='fila', ubs_solicitante=self.ubs[2],
+            )
+            self.assertUsaIndice(qs, 'fila_idx', 'st_ubs_dt_idx')
+
+    def test_decisoes_do_dia(self):
+        for model in (RegulacaoExame, RegulacaoConsulta):
+            qs = model.objects.filter(filtro_dia('data_regulacao', timezone.localdate()), regulador_id=1)
+            self.assertUsaIndice(qs, 'reg_dt_idx')
+
+    def test_regulados_por_periodo(self):
+        for model in (RegulacaoExame, RegulacaoConsulta):
+            qs = model.objects.filter(filtro_periodo('data_regulacao', timezone.localdate() - timedelta(days=3),
+                                                     timezone.localdate()))
+            self.assertUsaIndice(qs, 'dt_reg_idx')
+
+    def test_feed_de_mudancas_por_ubs(self):
+        desde = timezone.now() - timedelta(days=1)
+        for model in (RegulacaoExame, RegulacaoConsulta):
+            qs = model.objects.filter(ubs_solicitante=self.ubs[0], atualizado_em__gt=desde).order_by('atualizado_em', 'id')
+            self.assertUsaIndice(qs, 'ubs_upd_idx')
+
+    def test_proximos_da_fila_por_prioridade(self):
+        for model in (RegulacaoExame, RegulacaoConsulta):
+            geral = model.objects.filter(status='fila').order_by(ordem_prioridade(), 'data_solicitacao')[:10]
+            self.assertUsaIndice(geral, 'fila_prio_idx')
+            por_ubs = model.objects.filter(status='fila', ubs_solicitante=self.ubs[0]).order_by(
+                ordem_prioridade(), 'data_solicitacao')[:10]
+            self.assertUsaIndice(por_ubs, 'fila_ubs_prio_idx')
+
+    def test_indices_declarados_existem(self):
+        for model in (RegulacaoExame, RegulacaoConsulta):
+            with connection.cursor() as cursor:
+                existentes = connection.introspection.get_constraints(cursor, model._meta.db_table)
+            for indice in model._meta.indexes:
+                self.assertIn(indice.name, existentes)
+
+
+class SimulacaoFilaTests(SimpleTestCase):
+    """Núcleo da simulação (sem banco): atendimento por ordem de chegada e contagem das esperas."""
+
+    def test_fila_sem_chegadas_atendida_em_ordem(self):
+        # 3 itens com 2 dias de espera hoje, 1 vaga por dia a partir de amanhã: esperas de 3, 4 e 5 dias
+        esperas, fila_final, atendidos = executar([0, 0, 3], [0, 0, 0, 0], [1, 1, 1, 1], 0.0, 0.0, 5,
+                                                  np.random.default_rng(0))
+        self.assertEqual(list(esperas[:6]), [0, 0, 0, 5, 5, 5])
+        self.assertEqual(list(fila_final), [0] * 5)
+        self.assertEqual(list(atendidos), [3] * 5)
+
+    def test_faltosos_voltam_a_fila(self):
+        esperas, fila_final, atendidos = executar([4], [0], [4], 1.0, 1.0, 3, np.random.default_rng(0))
+        self.assertEqual(int(esperas.sum()), 0)
+        self.assertEqual(list(fila_final), [4] * 3)
+        self.assertEqual(list(atendidos), [0] * 3)
+
+
+@override_settings(REGULACAO_OVERBOOKING=True, REGULACAO_OVERBOOKING_MIN_AMOSTRA=30,
+                   REGULACAO_OVERBOOKING_MARGEM=0.8, REGULACAO_OVERBOOKING_FATOR_MAX=1.2)
+class FatoresOverbookingTests(SimpleTestCase):
+    """Fator do médico (inclusive 1.0) prevalece sobre o da especialidade."""
+
+    # (medico, especialidade): (faltas, resultados)
+    TAXAS = {
+        (1, 10): (0, 40),   # médico sem faltas: 1.0
+        (2, 10): (20, 40),  # especialidade 10 com 25% de faltas: 1.2
+        (3, 10): (5, 10),   # amostra pequena: usa a especialidade
+        (4, 20): (0, 40),   # especialidade 20 também sem faltas
+    }
+
+    def setUp(self):
+        cache.delete(vagas.CACHE_KEY_FATORES)
+        self.addCleanup(cache.delete, vagas.CACHE_KEY_FATORES)
+        patcher = mock.patch.object(vagas, 'taxas_falta', return_value=self.TAXAS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fator_do_medico_prevalece(self):
+        self.assertEqual(vagas.fator_overbooking(1, 10), 1.0)
+        self.assertEqual(vagas.fator_overbooking(2, 10), 1.2)
+        self.assertEqual(vagas.fator_overbooking(3, 10), 1.2)
+        self.assertEqual(vagas.fator_overbooking(4, 20), 1.0)
+
+    def test_fatores_iguais_a_reserva_sao_descartados(self):
+        por_medico, por_especialidade = vagas.fatores_overbooking()
+        self.assertEqual(por_medico, {(1, 10): 1.0})
+        self.assertEqual(por_especialidade, {10: 1.2})
+
+    def test_capacidade_efetiva(self):
+        self.assertEqual(vagas.capacidade_efetiva(AgendaMedicaDia(medico_id=1, especialidade_id=10, capacidade=10)), 10)
+        self.assertEqual(vagas.capacidade_efetiva(AgendaMedicaDia(medico_id=3, especialidade_id=10, capacidade=10)), 12)
+        # No CASE do SQL o médico 1 (fator 1.0) vem antes da especialidade 10
+        fator = next(e for e in vagas.capacidade_efetiva_expr().flatten() if isinstance(e, Case))
+        self.assertEqual([w.result.value for w in fator.cases], [1.0, 1.2])
+
+
+class CodigoBarrasTests(SimpleTestCase):
+    """Code 128 B dos comprovantes: símbolos com verificador e larguras das barras."""
+
+    def test_simbolos_com_verificador(self):
+        # "Wikipedia": início B (104), caracteres, verificador 88 e parada (106)
+        self.assertEqual(simbolos('Wikipedia'), [104, 55, 73, 75, 73, 80, 69, 68, 73, 65, 88, 106])
+
+    def test_protocolo_ocupa_11_modulos_por_simbolo(self):
+        protocolo = 'exa19102025-0001'
+        lista = barras(protocolo)
+        # início + caracteres + verificador (11 módulos cada) + parada (13)
+        self.assertEqual(lista[-1][0] + lista[-1][1] - lista[0][0], 11 * (len(protocolo) + 2) + 13)
+        self.assertEqual(len(lista), 3 * (len(protocolo) + 2) + 4)
+
+    def test_caractere_invalido(self):
+        with self.assertRaises(ValueError):
+            simbolos('protocolo\n')
+
+
+class DadosRegulacao:
+    """Cadastros mínimos e atalhos para os testes dos serviços em lote."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ubs = UBS.objects.create(nome='UBS Centro')
+        cls.outra_ubs = UBS.objects.create(nome='UBS Norte')
+        cls.medico_sol = MedicoSolicitante.objects.create(nome='Solicitante', crm='CRM-SOL', ubs_padrao=cls.ubs)
+        cls.especialidade = Especialidade.objects.create(nome='Cardiologia')
+        cls.tipo = TipoExame.objects.create(nome='Eletrocardiograma', ativo=True, especialidade=cls.especialidade)
+        cls.medico_amb = MedicoAmbulatorio.objects.create(nome='Atendente', crm='CRM-AMB')
+        cls.regulador = User.objects.create_user('regulador')
+        cls.pacientes = [Paciente.objects.create(nome=f'Paciente {i}') for i in range(4)]
+
+    def exame(self, paciente=0, **campos):
+        campos.setdefault('ubs_solicitante', self.ubs)
+        return RegulacaoExame.objects.create(paciente=self.pacientes[paciente], medico_solicitante=self.medico_sol,
+                                             tipo_exame=self.tipo, justificativa='Teste', **campos)
+
+    def consulta(self, paciente=0, **campos):
+        campos.setdefault('ubs_solicitante', self.ubs)
+        return RegulacaoConsulta.objects.create(paciente=self.pacientes[paciente], medico_solicitante=self.medico_sol,
+                                                especialidade=self.especialidade, justificativa='Teste', **campos)
+
+    def assertPublicado(self, objs, antes):
+        """Cada um de ``objs`` teve ``atualizado_em`` avançado após ``antes`` e aparece no feed de mudanças da UBS."""
+        for obj in objs:
+            obj.refresh_from_db()
+            self.assertGreater(obj.atualizado_em, antes)
+            with mock.patch.object(mudancas, 'MARGEM_SEGUNDOS', 0):
+                itens = mudancas.mudancas(obj.ubs_solicitante_id, mudancas.cursor_desde(antes))['itens']
+            origem = 'exame' if isinstance(obj, RegulacaoExame) else 'consulta'
+            self.assertIn((origem, obj.pk), [(i['origem'], i['id']) for i in itens])
+
+
+@contextmanager
+def linha_travada(model, pk):
+    """Mantém a linha ``pk`` travada (``SELECT ... FOR UPDATE``) por outra conexão durante o bloco."""
+    travada, liberar = threading.Event(), threading.Event()
+
+    def _segurar():
+        try:
+            with transaction.atomic():
+                model.objects.select_for_update().get(pk=pk)
+                travada.set()
+                liberar.wait(10)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=_segurar)
+    thread.start()
+    travada.wait(10)
+    try:
+        yield
+    finally:
+        liberar.set()
+        thread.join()
+
+
+class AcoesLoteTests(DadosRegulacao, TestCase):
+    """``acoes.aplicar_acoes``: um resultado por item, na ordem, sem que erros bloqueiem os demais."""
+
+    def test_itens_invalidos_nao_bloqueiam_os_demais(self):
+        exame = self.exame()
+        consulta = self.consulta(paciente=1)
+        resultados = acoes.aplicar_acoes(self.regulador, [
+            {'item_type': 'exame', 'id': exame.pk, 'action': 'negar', 'motivo': 'Sem indicação'},
+            {'item_type': 'exame', 'id': exame.pk, 'action': 'negar', 'motivo': 'De novo'},
+            {'item_type': 'consulta', 'id': consulta.pk, 'action': 'apagar', 'motivo': 'x'},
+            {'item_type': 'consulta', 'id': consulta.pk, 'action': 'pendenciar', 'motivo': ''},
+            {'item_type': 'exame', 'id': 999999, 'action': 'negar', 'motivo': 'Inexistente'},
+            {'item_type': 'consulta', 'id': consulta.pk, 'action': 'pendenciar', 'motivo': 'Falta exame prévio'},
+        ])
+        self.assertEqual([r['ok'] for r in resultados], [True, False, False, False, False, True])
+        self.assertEqual(
+            [r.get('error') for r in resultados],
+            [None, 'Item repetido no lote.', 'Ação inválida.', 'Dados incompletos.', 'Item não encontrado.', None],
+        )
+
+        exame.refresh_from_db()
+        self.assertEqual((exame.status, exame.motivo_decisao, exame.regulador), ('negado', 'Sem indicação',
+                                                                                 self.regulador))
+        consulta.refresh_from_db()
+        self.assertEqual((consulta.status, consulta.pendencia_motivo), ('pendente', 'Falta exame prévio'))
+        self.assertEqual(PendenciaMensagemConsulta.objects.filter(consulta=consulta, tipo='abertura').count(), 1)
+
+    def test_alteracoes_aparecem_no_feed_de_mudancas(self):
+        exame = self.exame()
+        consulta = self.consulta(paciente=1)
+        antes = timezone.now()
+        acoes.aplicar_acoes(self.regulador, [
+            {'item_type': 'exame', 'id': exame.pk, 'action': 'negar', 'motivo': 'Sem indicação'},
+            {'item_type': 'consulta', 'id': consulta.pk, 'action': 'pendenciar', 'motivo': 'Falta exame prévio'},
+        ])
+        self.assertPublicado([exame, consulta], antes)
+
+
+class AlertasPacienteTests(DadosRegulacao, TestCase):
+    """``alertas.resumos_pacientes``: itens em aberto por paciente, com o cache descartado a cada mudança."""
+
+    def setUp(self):
+        cache.clear()
+
+    def ids(self, resumo):
+        return {chave: [i['id'] for i in itens] for chave, itens in resumo.items()}
+
+    def test_somente_itens_em_aberto(self):
+        hoje = timezone.localdate()
+        fila = self.exame()
+        futuro = self.consulta(status='autorizado', data_agendada=hoje + timedelta(days=3))
+        self.exame(status='autorizado', data_agendada=hoje - timedelta(days=1))
+        self.exame(status='negado')
+        outro = self.exame(paciente=1)
+        resumos = alertas.resumos_pacientes([self.pacientes[0].pk, self.pacientes[1].pk])
+        self.assertEqual(self.ids(resumos[self.pacientes[0].pk]), {'exames': [fila.pk], 'consultas': [futuro.pk]})
+        self.assertEqual(self.ids(resumos[self.pacientes[1].pk]), {'exames': [outro.pk], 'consultas': []})
+
+    def test_cache_descartado_ao_salvar(self):
+        exame = self.exame()
+        self.assertEqual(self.ids(alertas.resumo_paciente(self.pacientes[0].pk))['exames'], [exame.pk])
+        exame.status = 'negado'
+        exame.save()
+        self.assertEqual(self.ids(alertas.resumo_paciente(self.pacientes[0].pk))['exames'], [])
+
+    def test_cache_descartado_em_lote(self):
+        exames = [self.exame(paciente=p) for p in range(3)]
+        pids = [e.paciente_id for e in exames]
+        alertas.resumos_pacientes(pids)
+        # ``update`` não dispara sinais: quem grava em lote chama ``invalidar_varios``
+        RegulacaoExame.objects.filter(pk__in=[e.pk for e in exames]).update(status='cancelado')
+        alertas.invalidar_varios(pids)
+        resumos = alertas.resumos_pacientes(pids)
+        self.assertTrue(all(not r['exames'] for r in resumos.values()))
+
+
+class RecebimentoSolicitacoesTests(DadosRegulacao, TestCase):
+    """``intake.receber_solicitacoes``: validação por item e regra do médico vinculado à UBS."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Paciente.objects.filter(pk=cls.pacientes[0].pk).update(cpf='529.982.247-25')
+        Paciente.objects.filter(pk=cls.pacientes[1].pk).update(cns='898001160660003')
+        MedicoSolicitante.objects.create(nome='De outra UBS', crm='CRM-NORTE', ubs_padrao=cls.outra_ubs)
+
+    def item(self, **campos):
+        return {'tipo': 'exame', 'cpf': '52998224725', 'tipo_exame_id': self.tipo.pk, 'medico_crm': 'CRM-SOL',
+                'justificativa': 'Teste', **campos}
+
+    def test_itens_invalidos_nao_bloqueiam_os_demais(self):
+        antes = timezone.now()
+        resultados = intake.receber_solicitacoes(self.ubs, [
+            self.item(referencia='a'),
+            self.item(referencia='b', medico_crm='CRM-NORTE'),
+            self.item(referencia='c', cpf='11144477735'),
+            self.item(referencia='d'),
+            self.item(referencia='e', tipo='consulta', cpf='', cns='898001160660003',
+                      especialidade_id=self.especialidade.pk),
+        ])
+        self.assertEqual([r['referencia'] for r in resultados], ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual([r['ok'] for r in resultados], [True, False, False, False, True])
+        self.assertEqual(resultados[1]['erro'], 'Escolha um médico vinculado à sua UBS.')
+        self.assertEqual(resultados[2]['erro'], 'Paciente não encontrado pelo CPF/CNS informado.')
+        self.assertEqual(resultados[3]['erro'], 'Paciente já possui solicitação em fila ou com agendamento futuro.')
+
+        exame = RegulacaoExame.objects.get(pk=resultados[0]['id'])
+        consulta = RegulacaoConsulta.objects.get(pk=resultados[4]['id'])
+        self.assertEqual((exame.paciente_id, exame.status, exame.numero_protocolo),
+                         (self.pacientes[0].pk, 'fila', resultados[0]['numero_protocolo']))
+        self.assertEqual(consulta.paciente_id, self.pacientes[1].pk)
+        self.assertEqual(RegulacaoExame.objects.count() + RegulacaoConsulta.objects.count(), 2)
+        self.assertPublicado([exame, consulta], antes)
+
+    def test_medico_de_outra_ubs_rejeitado(self):
+        resultados = intake.receber_solicitacoes(self.outra_ubs, [self.item()])
+        self.assertEqual(resultados[0]['erro'], 'Escolha um médico vinculado à sua UBS.')
+        self.assertFalse(RegulacaoExame.objects.exists())
+
+    def test_duplicidade_com_item_em_fila(self):
+        self.exame()
+        resultados = intake.receber_solicitacoes(self.ubs, [self.item()])
+        self.assertFalse(resultados[0]['ok'])
+        self.assertEqual(RegulacaoExame.objects.count(), 1)
+
+
+class AlocacaoFilaTests(DadosRegulacao, TestCase):
+    """``alocacao.alocar_fila``: prioridade, capacidade das agendas e um compromisso por paciente/dia."""
+
+    def setUp(self):
+        self.amanha = timezone.localdate() + timedelta(days=1)
+        for dias in (0, 1):
+            AgendaMedicaDia.objects.create(medico=self.medico_amb, especialidade=self.especialidade,
+                                           data=self.amanha + timedelta(days=dias), capacidade=2)
+        self.normal = self.consulta(paciente=0)
+        self.repetida = self.consulta(paciente=0)
+        self.alta = self.consulta(paciente=1, prioridade='alta')
+        self.media = self.consulta(paciente=2, prioridade='media')
+        self.alvo = alocacao.Alvo(especialidade=self.especialidade)
+
+    def datas(self, res):
+        return {a['id']: date.fromisoformat(a['data']) for a in res['alocados']}
+
+    def test_plano_respeita_prioridade_capacidade_e_paciente(self):
+        res = alocacao.alocar_fila(self.alvo)
+        # Alta e média lotam o primeiro dia; o paciente 0 não pode ter duas consultas no segundo
+        self.assertEqual(self.datas(res), {
+            self.alta.pk: self.amanha,
+            self.media.pk: self.amanha,
+            self.normal.pk: self.amanha + timedelta(days=1),
+        })
+        self.assertEqual((res['na_fila'], res['sem_vaga'], res['confirmado']), (4, 1, False))
+        self.assertEqual(RegulacaoConsulta.objects.filter(status='fila').count(), 4)
+
+    def test_confirmacao_grava_e_nao_repete_vagas(self):
+        antes = timezone.now()
+        res = alocacao.alocar_fila(self.alvo, usuario=self.regulador, confirmar=True)
+        for pk, dia in self.datas(res).items():
+            consulta = RegulacaoConsulta.objects.get(pk=pk)
+            self.assertEqual((consulta.status, consulta.data_agendada, consulta.medico_atendente_id),
+                             ('autorizado', dia, self.medico_amb.pk))
+            self.assertPublicado([consulta], antes)
+
+        # Nova rodada: só sobrou o item sem vaga, e as agendas seguem dentro da capacidade
+        segunda = alocacao.alocar_fila(self.alvo, usuario=self.regulador, confirmar=True)
+        self.assertEqual((segunda['na_fila'], segunda['alocados']), (1, []))
+        for agenda in vagas.com_ocupacao(AgendaMedicaDia.objects.all()):
+            self.assertLessEqual(agenda.usados, agenda.capacidade)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SKIP LOCKED exige PostgreSQL')
+class AlocacaoConcorrenteTests(DadosRegulacao, TransactionTestCase):
+    """Itens travados por outra transação (alocação ou edição em curso) ficam fora do plano confirmado."""
+
+    def setUp(self):
+        self.setUpTestData()
+        AgendaMedicaDia.objects.create(medico=self.medico_amb, especialidade=self.especialidade,
+                                       data=timezone.localdate() + timedelta(days=1), capacidade=10)
+        self.consultas = [self.consulta(paciente=p) for p in range(3)]
+
+    def test_item_travado_nao_e_alocado(self):
+        alvo = alocacao.Alvo(especialidade=self.especialidade)
+        with linha_travada(RegulacaoConsulta, self.consultas[1].pk):
+            res = alocacao.alocar_fila(alvo, usuario=self.regulador, confirmar=True)
+        self.assertEqual({a['id'] for a in res['alocados']}, {self.consultas[0].pk, self.consultas[2].pk})
+        self.assertEqual(RegulacaoConsulta.objects.get(pk=self.consultas[1].pk).status, 'fila')
+
+
+class FilaTrabalhoTests(DadosRegulacao, TestCase):
+    """``fila.puxar``: próximos por prioridade, reservados ao regulador que os puxou."""
+
+    def setUp(self):
+        self.outro = User.objects.create_user('outro_regulador')
+        prioridades = ['normal', 'alta', 'media', 'normal']
+        self.exames = [self.exame(paciente=p, prioridade=pr) for p, pr in enumerate(prioridades)]
+
+    def ids(self, itens):
+        return [i['id'] for i in itens]
+
+    def test_reguladores_recebem_itens_disjuntos(self):
+        e = self.exames
+        primeiro = fila.puxar(self.regulador, 'exame', 2)
+        segundo = fila.puxar(self.outro, 'exame', 2)
+        self.assertEqual(self.ids(primeiro), [e[1].pk, e[2].pk])
+        self.assertEqual(self.ids(segundo), [e[0].pk, e[3].pk])
+        self.assertEqual(fila.puxar(User.objects.create_user('terceiro'), 'exame', 10), [])
+        # O próprio regulador volta a ver suas reservas
+        self.assertEqual(self.ids(fila.puxar(self.regulador, 'exame', 2)), self.ids(primeiro))
+
+    def test_reserva_expirada_ou_liberada_volta_para_a_fila(self):
+        e = self.exames
+        fila.puxar(self.regulador, 'exame', 2)
+        self.assertEqual(fila.liberar(self.regulador, 'exame', [e[1].pk]), 1)
+        RegulacaoExame.objects.filter(pk=e[2].pk).update(reservado_ate=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.ids(fila.puxar(self.outro, 'exame', 2)), [e[1].pk, e[2].pk])
+
+    def test_escopo_por_ubs(self):
+        outro = self.exame(paciente=0, ubs_solicitante=self.outra_ubs, prioridade='alta')
+        self.assertEqual(self.ids(fila.puxar(self.regulador, 'exame', 10, ubs_id=self.outra_ubs.pk)), [outro.pk])
+
+
+@skipUnless(connection.vendor == 'postgresql', 'SKIP LOCKED exige PostgreSQL')
+class FilaTrabalhoConcorrenteTests(DadosRegulacao, TransactionTestCase):
+    """Com ``SKIP LOCKED``, um item travado por outra transação é pulado sem esperar."""
+
+    def setUp(self):
+        self.setUpTestData()
+        self.exames = [self.exame(paciente=p) for p in range(3)]
+
+    def test_item_travado_e_pulado(self):
+        with linha_travada(RegulacaoExame, self.exames[0].pk):
+            itens = fila.puxar(self.regulador, 'exame', 2)
+        self.assertEqual([i['id'] for i in itens], [self.exames[1].pk, self.exames[2].pk])
+
+
+class ResultadoAtendimentoTests(DadosRegulacao, TestCase):
+    """``resultados.registrar`` em lote e ``resultados.check_in`` da recepção."""
+
+    def setUp(self):
+        self.hoje = timezone.localdate()
+
+    def agendado(self, criar, dias=0, paciente=0):
+        return criar(paciente=paciente, status='autorizado', data_agendada=self.hoje + timedelta(days=dias),
+                     medico_atendente=self.medico_amb)
+
+    def test_itens_invalidos_nao_bloqueiam_os_demais(self):
+        ontem = self.agendado(self.exame, -1)
+        futuro = self.agendado(self.exame, 2, paciente=1)
+        em_fila = self.consulta()
+        consulta = self.agendado(self.consulta, 0, paciente=2)
+        antes = timezone.now()
+        res = resultados.registrar(self.regulador, [
+            ('ex', ontem.pk, 'compareceu', ''),
+            ('ex', futuro.pk, 'faltou', ''),
+            ('co', em_fila.pk, 'faltou', ''),
+            ('ex', 999999, 'faltou', ''),
+            ('co', consulta.pk, 'talvez', ''),
+            ('co', consulta.pk, 'faltou', 'Sem aviso'),
+        ])
+        self.assertEqual([r.get('codigo') for r in res],
+                         [None, 'data_futura', 'nao_autorizado', 'nao_encontrado', None, None])
+        # Repetido: vale a última ocorrência, para as duas posições
+        self.assertEqual([r['ok'] for r in res], [True, False, False, False, True, True])
+
+        ontem.refresh_from_db()
+        consulta.refresh_from_db()
+        self.assertEqual((ontem.resultado_atendimento, ontem.resultado_por), ('compareceu', self.regulador))
+        self.assertEqual((consulta.resultado_atendimento, consulta.resultado_observacao), ('faltou', 'Sem aviso'))
+        self.assertPublicado([ontem, consulta], antes)
+        futuro.refresh_from_db()
+        self.assertEqual(futuro.resultado_atendimento, 'pendente')
+
+    def test_resultado_igual_nao_regrava(self):
+        exame = self.agendado(self.exame, -1)
+        resultados.registrar(self.regulador, [('ex', exame.pk, 'faltou', '')])
+        exame.refresh_from_db()
+        res = resultados.registrar(self.regulador, [('ex', exame.pk, 'faltou', '')])
+        self.assertEqual((res[0]['ok'], res[0]['alterado']), (True, False))
+        self.assertEqual(RegulacaoExame.objects.get(pk=exame.pk).atualizado_em, exame.atualizado_em)
+
+    def test_check_in(self):
+        hoje = self.agendado(self.exame)
+        amanha = self.agendado(self.consulta, 1, paciente=1)
+        antes = timezone.now()
+
+        res = resultados.check_in(self.regulador, hoje.numero_protocolo)
+        self.assertEqual((res['ok'], res['ja_registrado'], res['tipo']), (True, False, 'ex'))
+        self.assertPublicado([hoje], antes)
+        self.assertEqual(hoje.resultado_atendimento, 'compareceu')
+
+        res = resultados.check_in(self.regulador, hoje.numero_protocolo)
+        self.assertEqual((res['ok'], res['ja_registrado']), (True, True))
+        res = resultados.check_in(self.regulador, amanha.numero_protocolo)
+        self.assertFalse(res['ok'])
+        self.assertTrue(res['erro'].startswith('Agendado para'))
+        self.assertEqual(resultados.check_in(self.regulador, 'exa01012000-9999')['erro'], 'Protocolo não encontrado.')
+
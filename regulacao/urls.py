@@ -1,5 +1,6 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
 from .views import minhas_notificacoes, notificacao_marcar_lida
 
 urlpatterns = [
@@ -8,7 +9,15 @@ urlpatterns = [
     path('o-que-fiz-hoje/', views.o_que_fiz_hoje, name='o-que-fiz-hoje'),
     path('malote/', views.selecionar_malote, name='regulacao-selecionar-malote'),
     path('fila/', views.fila_espera, name='regulacao-fila'),
+    path('fila/exportar/', views.fila_espera_exportar, name='regulacao-fila-exportar'),
+    path('fila/alocar/', views.alocar_fila_view, name='regulacao-fila-alocar'),
+    path('fila/proximos/', views.fila_proximos, name='regulacao-fila-proximos'),
+    path('fila/liberar/', views.fila_liberar, name='regulacao-fila-liberar'),
+    path('fila/simulacao/', views.fila_simulacao, name='regulacao-fila-simulacao'),
     path('agenda/', views.agenda_regulacao, name='regulacao-agenda'),
+    path('agenda/dia/', views.agenda_regulacao_dia, name='regulacao-agenda-dia'),
+    path('agenda/exportar/', views.agenda_exportar, name='regulacao-agenda-exportar'),
+    path('esperas/', views.esperas_relatorio, name='regulacao-esperas'),
     path('ubs/<int:ubs_id>/status/', views.status_ubs, name='regulacao-status-ubs'),
     
     # UBS
@@ -40,6 +49,8 @@ urlpatterns = [
     path('ambulatorio/agenda/excluir/<int:pk>/', views.AgendaMedicaDiaDeleteView.as_view(), name='agendamedica-delete'),
     # Ajax info
     path('ambulatorio/agenda/info/', views.agenda_info, name='agendamedica-info'),
+    path('ambulatorio/agenda/proximas-vagas/', views.agenda_proximas_vagas, name='agendamedica-proximas-vagas'),
+    path('ambulatorio/agenda/ocupacao/', views.agenda_ocupacao, name='agendamedica-ocupacao'),
 
     # Agenda Médica por Dia (CRUD + Gerador)
     path('ambulatorio/agenda-dia/', views.AgendaMedicaDiaListView.as_view(), name='agendadia-list'),
@@ -55,6 +66,7 @@ urlpatterns = [
     path('tipos-exame/editar/<int:pk>/', views.TipoExameUpdateView.as_view(), name='tipo-exame-update'),
     path('tipos-exame/excluir/<int:pk>/', views.TipoExameDeleteView.as_view(), name='tipo-exame-delete'),
     path('tipos-exame/<int:pk>/toggle-ativo/', views.tipo_exame_toggle_ativo, name='tipo-exame-toggle-ativo'),
+    path('tipos-exame/busca/', views.tipo_exame_busca, name='tipo-exame-busca'),
     
     # Especialidades (Consultas)
     path('especialidades/', views.EspecialidadeListView.as_view(), name='especialidade-list'),
@@ -72,9 +84,12 @@ urlpatterns = [
     # Comprovantes removidos (consultas)
     # Auxiliar (AJAX) - alertas de consultas por paciente
     path('consultas/alertas/', views.consulta_paciente_alertas, name='consulta-alertas'),
+    # Auxiliar (AJAX) - itens em aberto de um ou vários pacientes (exames e consultas)
+    path('pacientes/alertas/', views.pacientes_alertas, name='pacientes-alertas'),
 
     # Regulação de Exames
     path('regulacao/', views.RegulacaoListView.as_view(), name='regulacao-list'),
+    path('regulacao/exportar/', views.RegulacaoExportView.as_view(), name='regulacao-list-exportar'),
     path('regulacao/nova/', views.RegulacaoCreateView.as_view(), name='regulacao-create'),
     path('regulacao/<int:pk>/', views.RegulacaoDetailView.as_view(), name='regulacao-detail'),
     path('regulacao/<int:pk>/editar/', views.RegulacaoUpdateView.as_view(), name='regulacao-update'),
@@ -87,6 +102,7 @@ urlpatterns = [
     path('regulacao/<int:pk>/resultado/', views.registrar_resultado_exame, name='resultado-exame'),
     path('consultas/<int:pk>/resultado/', views.registrar_resultado_consulta, name='resultado-consulta'),
     path('agenda/resultado/batch/', views.registrar_resultados_agenda, name='agenda-resultado-batch'),
+    path('recepcao/checkin/', views.recepcao_checkin, name='regulacao-checkin'),
     # Impressão (novo fluxo)
     # path('consultas/<int:pk>/impressao/', views.impressao_consulta, name='impressao-consulta'),
     path('consultas/paciente/<int:paciente_id>/dia/<slug:dia>/impressao/', views.impressao_consultas_dia, name='impressao-consultas-dia'),
@@ -102,5 +118,15 @@ urlpatterns = [
     # Notificações
     path('notificacoes/', minhas_notificacoes, name='notificacoes-list'),
     path('notificacoes/<int:pk>/lida/', notificacao_marcar_lida, name='notificacao-lida'),
+    path('notificacoes/lidas/', views.notificacoes_marcar_todas_lidas, name='notificacoes-marcar-todas-lidas'),
+    path('eventos/contadores/', views.eventos_contadores, name='regulacao-eventos-contadores'),
     path('salvar-acao-ajax/', views.salvar_acao_ajax, name='salvar-acao-ajax'),
-]
\ No newline at end of file
+    path('acoes/lote/', views.acoes_em_lote, name='regulacao-acoes-lote'),
+    # API de integração das UBS (token)
+    path('api/solicitacoes/lote/', api.SolicitacoesLoteAPIView.as_view(), name='api-solicitacoes-lote'),
+    path('api/mudancas/', api.MudancasUBSAPIView.as_view(), name='api-mudancas-ubs'),
+]
+
+# Eventos em tempo real (SSE): só com servidor ASGI; sob WSGI a conexão aberta prenderia um worker
+if getattr(settings, 'REGULACAO_SSE_ASGI', False):
+    urlpatterns.append(path('eventos/', views.eventos_stream, name='regulacao-eventos'))
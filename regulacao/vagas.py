@@ -0,0 +1,223 @@
+"""Capacidade e ocupação das agendas do ambulatório (``AgendaMedicaDia``).
+
+A vaga é do médico no dia: exames e consultas autorizados para o médico na data
+ocupam a mesma capacidade (mesma regra de ``RegulacaoExameBatchForm``). A
+ocupação é calculada por subconsultas correlacionadas, servidas pelos índices
+``(medico_atendente, data_agendada, status)`` das duas tabelas, de modo que a
+lista de agendas com vagas restantes sai em uma única consulta.
+
+Overbooking (``REGULACAO_OVERBOOKING``): a capacidade efetiva de uma agenda é a
+cadastrada multiplicada por um fator derivado da taxa de faltas recente do médico
+naquela especialidade (ou da especialidade, se o médico tiver poucos resultados),
+limitado por ``REGULACAO_OVERBOOKING_FATOR_MAX``. As taxas vêm de um ``GROUP BY``
+por tabela sobre os resultados registrados na janela e ficam em cache.
+"""
+import math
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, F, FloatField, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce, Floor
+from django.utils import timezone
+
+from .models import AgendaMedicaDia, Especialidade, RegulacaoConsulta, RegulacaoExame
+
+
+def _usados(model):
+    return Coalesce(
+        Subquery(
+            model.objects
+            .filter(medico_atendente_id=OuterRef('medico_id'), data_agendada=OuterRef('data'), status='autorizado')
+            .order_by()
+            .values('medico_atendente_id')
+            .annotate(n=Count('id'))
+            .values('n')[:1],
+            output_field=IntegerField(),
+        ),
+        Value(0),
+    )
+
+
+CACHE_KEY_FATORES = 'regulacao:vagas:fatores_overbooking'
+CACHE_TIMEOUT_FATORES = 60 * 60
+
+
+def _config() -> dict:
+    return {
+        'ativo': getattr(settings, 'REGULACAO_OVERBOOKING', False),
+        'janela_dias': getattr(settings, 'REGULACAO_OVERBOOKING_JANELA_DIAS', 180),
+        'min_amostra': getattr(settings, 'REGULACAO_OVERBOOKING_MIN_AMOSTRA', 30),
+        'margem': getattr(settings, 'REGULACAO_OVERBOOKING_MARGEM', 0.8),
+        'fator_max': getattr(settings, 'REGULACAO_OVERBOOKING_FATOR_MAX', 1.2),
+    }
+
+
+def taxas_falta(janela_dias: int) -> Dict[Tuple[int, int], Tuple[int, int]]:
+    """``{(medico_id, especialidade_id): (faltas, resultados)}`` dos atendimentos na janela."""
+    hoje = timezone.localdate()
+    contagem: Dict[Tuple[int, int], list] = defaultdict(lambda: [0, 0])
+    for model, ref in ((RegulacaoExame, 'tipo_exame__especialidade_id'), (RegulacaoConsulta, 'especialidade_id')):
+        linhas = (
+            model.objects
+            .filter(status='autorizado', medico_atendente__isnull=False,
+                    resultado_atendimento__in=('compareceu', 'faltou'),
+                    data_agendada__gte=hoje - timedelta(days=janela_dias), data_agendada__lt=hoje)
+            .order_by()
+            .annotate(esp=F(ref))
+            .values_list('medico_atendente_id', 'esp')
+            .annotate(faltas=Count('id', filter=Q(resultado_atendimento='faltou')), total=Count('id'))
+        )
+        for medico_id, esp_id, faltas, total in linhas:
+            if esp_id is None:
+                continue
+            contagem[(medico_id, esp_id)][0] += faltas
+            contagem[(medico_id, esp_id)][1] += total
+    return {k: (v[0], v[1]) for k, v in contagem.items()}
+
+
+def _fator(faltas: int, total: int, config: dict) -> float:
+    taxa = (faltas / total) * config['margem'] if total else 0.0
+    if taxa >= 1:
+        return config['fator_max']
+    return max(1.0, min(config['fator_max'], 1 / (1 - taxa)))
+
+
+def fatores_overbooking() -> Tuple[Dict[Tuple[int, int], float], Dict[int, float]]:
+    """Fatores por ``(medico, especialidade)`` e, como reserva, por especialidade (cache de 1h).
+
+    Sem overbooking ativo, ambos vazios (capacidade efetiva = cadastrada).
+    """
+    config = _config()
+    if not config['ativo']:
+        return {}, {}
+    fatores = cache.get(CACHE_KEY_FATORES)
+    if fatores is None:
+        taxas = taxas_falta(config['janela_dias'])
+        por_esp: Dict[int, list] = defaultdict(lambda: [0, 0])
+        for (_, esp_id), (faltas, total) in taxas.items():
+            por_esp[esp_id][0] += faltas
+            por_esp[esp_id][1] += total
+        por_medico = {
+            chave: _fator(faltas, total, config)
+            for chave, (faltas, total) in taxas.items() if total >= config['min_amostra']
+        }
+        por_especialidade = {
+            esp_id: _fator(faltas, total, config)
+            for esp_id, (faltas, total) in por_esp.items() if total >= config['min_amostra']
+        }
+        por_especialidade = {k: f for k, f in por_especialidade.items() if f > 1}
+        # O fator do médico (mesmo 1.0) prevalece sobre o da especialidade; só é dispensável
+        # quando coincide com o que a reserva daria
+        fatores = (
+            {(m, e): f for (m, e), f in por_medico.items() if f != por_especialidade.get(e, 1.0)},
+            por_especialidade,
+        )
+        cache.set(CACHE_KEY_FATORES, fatores, CACHE_TIMEOUT_FATORES)
+    return fatores
+
+
+def fator_overbooking(medico_id: int, especialidade_id: int) -> float:
+    por_medico, por_especialidade = fatores_overbooking()
+    if (medico_id, especialidade_id) in por_medico:
+        return por_medico[(medico_id, especialidade_id)]
+    return por_especialidade.get(especialidade_id, 1.0)
+
+
+def capacidade_efetiva(agenda: AgendaMedicaDia) -> int:
+    """Capacidade da agenda do dia considerando o overbooking (igual a ``capacidade`` se desligado)."""
+    capacidade = agenda.capacidade or 0
+    return int(math.floor(capacidade * fator_overbooking(agenda.medico_id, agenda.especialidade_id) + 1e-9))
+
+
+def capacidade_efetiva_expr():
+    """Mesma regra de ``capacidade_efetiva`` em SQL (``CASE``: médico antes da especialidade)."""
+    por_medico, por_especialidade = fatores_overbooking()
+    if not (por_medico or por_especialidade):
+        return F('capacidade')
+    fator = Case(
+        *(When(medico_id=m, especialidade_id=e, then=Value(f)) for (m, e), f in por_medico.items()),
+        *(When(especialidade_id=e, then=Value(f)) for e, f in por_especialidade.items()),
+        default=Value(1.0),
+        output_field=FloatField(),
+    )
+    return Cast(Floor(Cast('capacidade', FloatField()) * fator + Value(1e-9)), IntegerField())
+
+
+def com_ocupacao(qs):
+    """Anota ``usados``, ``capacidade_efetiva`` e ``restantes`` em um queryset de ``AgendaMedicaDia``."""
+    return qs.annotate(
+        usados=_usados(RegulacaoExame) + _usados(RegulacaoConsulta),
+        capacidade_efetiva=capacidade_efetiva_expr(),
+    ).annotate(restantes=F('capacidade_efetiva') - F('usados'))
+
+
+def agendas_com_vagas(especialidade_ids: Iterable[int], inicio: date, fim: Optional[date] = None,
+                      medico_ids: Iterable[int] = ()):
+    """Agendas ativas das especialidades no período com vagas restantes, em ordem de data."""
+    qs = AgendaMedicaDia.objects.filter(
+        especialidade_id__in=list(especialidade_ids), ativo=True, medico__ativo=True, data__gte=inicio,
+    )
+    if fim:
+        qs = qs.filter(data__lte=fim)
+    medico_ids = list(medico_ids)
+    if medico_ids:
+        qs = qs.filter(medico_id__in=medico_ids)
+    return com_ocupacao(qs).filter(restantes__gt=0).order_by('data', 'medico__nome', 'pk')
+
+
+def ocupacao(medico_ids: Iterable[int], inicio: date, fim: date) -> Dict[Tuple[int, date], int]:
+    """``{(medico_id, data): autorizados}`` no período (dois ``GROUP BY``)."""
+    medico_ids = list(medico_ids)
+    usados: Dict[Tuple[int, date], int] = defaultdict(int)
+    if not medico_ids:
+        return usados
+    for model in (RegulacaoExame, RegulacaoConsulta):
+        linhas = (
+            model.objects
+            .filter(medico_atendente_id__in=medico_ids, status='autorizado',
+                    data_agendada__gte=inicio, data_agendada__lte=fim)
+            .order_by()
+            .values_list('medico_atendente_id', 'data_agendada')
+            .annotate(n=Count('id'))
+        )
+        for medico_id, dia, n in linhas:
+            usados[(medico_id, dia)] += n
+    return usados
+
+
+def especialidades_equivalentes(especialidade_id: int) -> list:
+    """A especialidade e as homônimas (nome igual, ignorando caixa), como em ``agenda_info``."""
+    nome = Especialidade.objects.filter(pk=especialidade_id).values_list('nome', flat=True).first()
+    if nome is None:
+        return []
+    ids = set(Especialidade.objects.filter(nome__iexact=nome.strip()).values_list('pk', flat=True))
+    return sorted(ids | {especialidade_id})
+
+
+def proximas_vagas(especialidade_id: int, quantidade: int = 5, inicio: Optional[date] = None,
+                   fim: Optional[date] = None) -> list:
+    """As ``quantidade`` agendas com vaga mais próximas da especialidade, entre todos os médicos.
+
+    Uma consulta (agendas + ocupação). Cada opção: ``medico_id``, ``medico_nome``,
+    ``especialidade_id``, ``data``, ``capacidade`` e ``restantes``.
+    """
+    ids = especialidades_equivalentes(especialidade_id)
+    if not ids:
+        return []
+    qs = agendas_com_vagas(ids, inicio or timezone.localdate(), fim).values(
+        'medico_id', 'medico__nome', 'especialidade_id', 'data', 'capacidade_efetiva', 'restantes',
+    )[:max(1, min(int(quantidade), 50))]
+    return [
+        {
+            'medico_id': linha['medico_id'],
+            'medico_nome': linha['medico__nome'],
+            'especialidade_id': linha['especialidade_id'],
+            'data': linha['data'].isoformat(),
+            'capacidade': linha['capacidade_efetiva'],
+            'restantes': linha['restantes'],
+        }
+        for linha in qs
+    ]
@@ -4,19 +4,24 @@ from secretaria_it.access import AccessRequiredMixin
 from django.contrib.auth.decorators import login_required, user_passes_test
 from secretaria_it.access import require_access
 from secretaria_it.access import is_ubs_user
+from secretaria_it import exportacao
+from secretaria_it.datas import filtro_dia, filtro_periodo
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.forms import modelformset_factory
 from django.db import transaction
-from django.db.models import Q, Prefetch
+from django.db.models import Count, Q, Prefetch, Value
 from django.core.paginator import Paginator
-from .models import UBS, MedicoSolicitante, TipoExame, RegulacaoExame, Especialidade, RegulacaoConsulta, Notificacao, PendenciaMensagemExame, PendenciaMensagemConsulta, LocalAtendimento, MedicoAmbulatorio, AgendaMedica, AgendaMedicaDia, AcaoUsuario
+from .models import UBS, MedicoSolicitante, TipoExame, RegulacaoExame, Especialidade, RegulacaoConsulta, Notificacao, PendenciaMensagemExame, PendenciaMensagemConsulta, LocalAtendimento, MedicoAmbulatorio, AgendaMedica, AgendaMedicaDia, SequenciaProtocolo, PRIORIDADE_ORDEM
 from pacientes.models import Paciente
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.utils import timezone
 from django.views.decorators.http import require_POST
-from django.views.decorators.csrf import csrf_exempt
+from . import (
+    acoes, agendas, alertas, alocacao, arquivo, auditoria, catalogo, esperas, fila, notificacoes, ocupacao, resultados,
+    simulacao, vagas,
+)
 from .forms import (
     UBSForm, MedicoSolicitanteForm, TipoExameForm, RegulacaoExameForm,
     RegulacaoExameCreateForm, EspecialidadeForm, RegulacaoConsultaForm,
@@ -24,11 +29,16 @@ from .forms import (
     LocalAtendimentoForm, MedicoAmbulatorioForm, AgendaMedicaForm, AgendaMedicaDiaForm, AgendaMensalGerarForm,
     RegulacaoExameTextosForm, RegulacaoConsultaTextosForm,
 )
+from .signals import apos_gravacao_em_lote
+import json
+import logging
 import os
 import shutil
 import tempfile
 from functools import wraps
 
+logger = logging.getLogger(__name__)
+
 
 @login_required
 @require_access('regulacao')
@@ -38,39 +48,39 @@ def o_que_fiz_hoje(request):
     
     # EXAMES - Listas com pacientes
     exames_autorizados_list = RegulacaoExame.objects.filter(
+        filtro_dia('data_regulacao', hoje),
         regulador=request.user,
-        data_regulacao__date=hoje,
         status='autorizado'
     ).select_related('paciente', 'tipo_exame')
     
     exames_negados_list = RegulacaoExame.objects.filter(
+        filtro_dia('data_regulacao', hoje),
         regulador=request.user,
-        data_regulacao__date=hoje,
         status='negado'
     ).select_related('paciente', 'tipo_exame')
     
     exames_pendenciados_list = RegulacaoExame.objects.filter(
+        filtro_dia('data_regulacao', hoje),
         regulador=request.user,
-        data_regulacao__date=hoje,
         status='pendente'
     ).select_related('paciente', 'tipo_exame')
     
     # CONSULTAS - Listas com pacientes
     consultas_autorizadas_list = RegulacaoConsulta.objects.filter(
+        filtro_dia('data_regulacao', hoje),
         regulador=request.user,
-        data_regulacao__date=hoje,
         status='autorizado'
     ).select_related('paciente', 'especialidade', 'medico_atendente')
     
     consultas_negadas_list = RegulacaoConsulta.objects.filter(
+        filtro_dia('data_regulacao', hoje),
         regulador=request.user,
-        data_regulacao__date=hoje,
         status='negado'
     ).select_related('paciente', 'especialidade', 'medico_atendente')
     
     consultas_pendenciadas_list = RegulacaoConsulta.objects.filter(
+        filtro_dia('data_regulacao', hoje),
         regulador=request.user,
-        data_regulacao__date=hoje,
         status='pendente'
     ).select_related('paciente', 'especialidade', 'medico_atendente')
     
@@ -304,27 +314,18 @@ def responder_pendencia_exame(request, pk: int):
             # Notificar lado oposto (se quem respondeu foi UBS, notificar reguladores; se foi regulador, notificar UBS)
             try:
                 ubs_do_item = obj.ubs_solicitante
+                url = str(reverse_lazy('pendencia-exame-responder', kwargs={'pk': obj.pk}))
                 # Heurística: se usuário tiver perfil_ubs, é UBS; senão, é regulador
                 if is_ubs:
                     # Notificar reguladores: opção simples - todos usuários do grupo 'regulacao'
-                    from django.contrib.auth.models import User
-                    regs = User.objects.filter(groups__name='regulacao').distinct()
-                    for u in regs:
-                        Notificacao.objects.create(
-                            user=u,
-                            texto=f"UBS {ubs_do_item.nome} respondeu pendência do exame de {obj.paciente.nome}.",
-                            url=str(reverse_lazy('pendencia-exame-responder', kwargs={'pk': obj.pk})),
-                        )
+                    notificacoes.notificar_reguladores(
+                        f"UBS {ubs_do_item.nome} respondeu pendência do exame de {obj.paciente.nome}.", url,
+                    )
                 else:
                     # Notificar usuários da UBS solicitante
-                    usuarios = getattr(ubs_do_item, 'usuarios', None)
-                    if usuarios is not None:
-                        for vinc in usuarios.select_related('user').all():
-                            Notificacao.objects.create(
-                                user=vinc.user,
-                                texto=f"Regulação respondeu pendência do exame de {obj.paciente.nome}.",
-                                url=str(reverse_lazy('pendencia-exame-responder', kwargs={'pk': obj.pk})),
-                            )
+                    notificacoes.notificar_ubs(
+                        ubs_do_item, f"Regulação respondeu pendência do exame de {obj.paciente.nome}.", url,
+                    )
             except Exception:
                 pass
             if is_ubs:
@@ -400,24 +401,15 @@ def responder_pendencia_consulta(request, pk: int):
             # Notificações cruzadas
             try:
                 ubs_do_item = obj.ubs_solicitante
+                url = str(reverse_lazy('pendencia-consulta-responder', kwargs={'pk': obj.pk}))
                 if is_ubs:
-                    from django.contrib.auth.models import User
-                    regs = User.objects.filter(groups__name='regulacao').distinct()
-                    for u in regs:
-                        Notificacao.objects.create(
-                            user=u,
-                            texto=f"UBS {ubs_do_item.nome} respondeu pendência da consulta de {obj.paciente.nome}.",
-                            url=str(reverse_lazy('pendencia-consulta-responder', kwargs={'pk': obj.pk})),
-                        )
+                    notificacoes.notificar_reguladores(
+                        f"UBS {ubs_do_item.nome} respondeu pendência da consulta de {obj.paciente.nome}.", url,
+                    )
                 else:
-                    usuarios = getattr(ubs_do_item, 'usuarios', None)
-                    if usuarios is not None:
-                        for vinc in usuarios.select_related('user').all():
-                            Notificacao.objects.create(
-                                user=vinc.user,
-                                texto=f"Regulação respondeu pendência da consulta de {obj.paciente.nome}.",
-                                url=str(reverse_lazy('pendencia-consulta-responder', kwargs={'pk': obj.pk})),
-                            )
+                    notificacoes.notificar_ubs(
+                        ubs_do_item, f"Regulação respondeu pendência da consulta de {obj.paciente.nome}.", url,
+                    )
             except Exception:
                 pass
             if is_ubs:
@@ -786,13 +778,11 @@ def agenda_info(request):
                     per_dia = [x for x in cand if (getattr(x.especialidade, 'nome', '') or '').strip().casefold() == name_norm]
         except Exception:
             pass
-    # Dicionário: data ISO -> capacidade total do dia
-    cap_por_data = {x.data.isoformat(): int(x.capacidade or 0) for x in per_dia}
-    # Usados por data
-    usados_por_data = {
-        d_iso: RegulacaoConsulta.objects.filter(medico_atendente_id=med_id, data_agendada=d_iso, status='autorizado').count()
-        for d_iso in cap_por_data.keys()
-    }
+    # Dicionário: data ISO -> capacidade total do dia (efetiva, com overbooking se ativo)
+    cap_por_data = {x.data.isoformat(): vagas.capacidade_efetiva(x) for x in per_dia}
+    # Usados por data (exames e consultas do médico no dia, dois GROUP BY no período)
+    usados = vagas.ocupacao([med_id], hoje, ate)
+    usados_por_data = {d.isoformat(): n for (_, d), n in usados.items()}
     restantes_por_data = {d_iso: max(0, cap_por_data[d_iso] - usados_por_data.get(d_iso, 0)) for d_iso in cap_por_data.keys()}
     # datas_agenda: todas as datas com agenda cadastrada (independente de vagas)
     datas_agenda = sorted(cap_por_data.keys())
@@ -808,10 +798,9 @@ def agenda_info(request):
     if data_str:
         d = parse_date(data_str)
         if d:
-            usados = RegulacaoConsulta.objects.filter(medico_atendente_id=med_id, data_agendada=d, status='autorizado').count()
             cap = cap_por_data.get(d.isoformat())
             if cap is not None:
-                restantes = max(0, int(cap) - int(usados))
+                restantes = max(0, int(cap) - int(usados_por_data.get(d.isoformat(), 0)))
                 fonte = 'dia'
     return JsonResponse({
         'ok': True,
@@ -825,6 +814,90 @@ def agenda_info(request):
     })
 
 
+@login_required
+@require_access('regulacao')
+def agenda_proximas_vagas(request):
+    """Endpoint JSON: vagas mais próximas de uma especialidade entre todos os médicos.
+    GET ?especialidade=ID (ou ?tipo_exame=ID, usando a especialidade do tipo), &n=5, &a_partir=YYYY-MM-DD.
+    """
+    from django.utils.dateparse import parse_date
+    try:
+        esp_id = int(request.GET.get('especialidade') or 0)
+        tipo_id = int(request.GET.get('tipo_exame') or 0)
+        n = int(request.GET.get('n') or 5)
+        inicio = parse_date(request.GET.get('a_partir') or '') or timezone.localdate()
+    except (TypeError, ValueError):
+        return JsonResponse({'ok': False, 'error': 'Parâmetros inválidos.'}, status=400)
+    if not esp_id and tipo_id:
+        esp_id = TipoExame.objects.filter(pk=tipo_id).values_list('especialidade_id', flat=True).first() or 0
+    if not esp_id:
+        return JsonResponse({'ok': False, 'error': 'Informe a especialidade ou um tipo de exame com especialidade.'},
+                            status=400)
+    inicio = max(inicio, timezone.localdate())
+    opcoes = vagas.proximas_vagas(esp_id, n, inicio)
+    return JsonResponse({'ok': True, 'especialidade_id': esp_id, 'opcoes': opcoes})
+
+
+@login_required
+@require_access('regulacao')
+def agenda_ocupacao(request):
+    """Endpoint JSON: mapa de ocupação (capacidade, agendados, compareceu, faltou).
+    GET ?modo=medico (médico × dia) | especialidade (especialidade × semana), &inicio=&fim= (YYYY-MM-DD),
+    filtros opcionais &especialidade=ID e &medico=ID. Padrão: mês corrente.
+    """
+    from datetime import timedelta
+    from django.utils.dateparse import parse_date
+    hoje = timezone.localdate()
+    try:
+        # parse_date levanta ValueError para datas bem formadas mas inexistentes (2025-02-30)
+        inicio = parse_date(request.GET.get('inicio') or '') or hoje.replace(day=1)
+        fim = parse_date(request.GET.get('fim') or '') or (inicio.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        esp_id = int(request.GET.get('especialidade') or 0) or None
+        med_id = int(request.GET.get('medico') or 0) or None
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'Parâmetros inválidos.'}, status=400)
+    try:
+        dados = ocupacao.mapa(request.GET.get('modo') or 'medico', inicio, fim, esp_id, med_id)
+    except ValueError as exc:
+        return JsonResponse({'ok': False, 'error': str(exc) or 'Parâmetros inválidos.'}, status=400)
+    response = JsonResponse({'ok': True, **dados})
+    response['Cache-Control'] = 'private, max-age=60'
+    return response
+
+
+@login_required
+@require_access('regulacao')
+def esperas_relatorio(request):
+    """Endpoint JSON: tempos de espera (p50/p90/média em dias) a partir dos agregados diários.
+    GET ?tipo=consulta|exame, &dimensao=geral|especialidade|ubs|tipo_exame, &inicio=&fim= (YYYY-MM-DD).
+    Com &chave=ID (ou dimensao=geral): série por &agrupar=dia|semana|mes; sem chave: comparativo entre as chaves.
+    Padrão: últimos 90 dias.
+    """
+    from datetime import timedelta
+    from django.utils.dateparse import parse_date
+    hoje = timezone.localdate()
+    tipo = request.GET.get('tipo') or 'consulta'
+    dimensao = request.GET.get('dimensao') or 'geral'
+    try:
+        # parse_date levanta ValueError para datas bem formadas mas inexistentes (2025-02-30)
+        fim = parse_date(request.GET.get('fim') or '') or hoje
+        inicio = parse_date(request.GET.get('inicio') or '') or fim - timedelta(days=90)
+        chave = int(request.GET.get('chave') or 0)
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'Parâmetros inválidos.'}, status=400)
+    try:
+        if chave or dimensao == 'geral':
+            dados = {'serie': esperas.serie(tipo, dimensao, chave, inicio, fim, request.GET.get('agrupar') or 'dia')}
+        else:
+            dados = {'comparativo': esperas.comparativo(tipo, dimensao, inicio, fim)}
+    except ValueError as exc:
+        return JsonResponse({'ok': False, 'error': str(exc) or 'Parâmetros inválidos.'}, status=400)
+    response = JsonResponse({'ok': True, 'tipo': tipo, 'dimensao': dimensao, 'chave': chave,
+                             'inicio': inicio.isoformat(), 'fim': fim.isoformat(), **dados})
+    response['Cache-Control'] = 'private, max-age=300'
+    return response
+
+
 # ============ Agenda por Data (CRUD + Gerador Mensal) ============
 
 class AgendaMedicaDiaListView(AccessRequiredMixin, LoginRequiredMixin, ListView):
@@ -928,36 +1001,10 @@ def agenda_mensal_gerar(request):
         capacidade = form.cleaned_data['capacidade']
         sobrescrever = form.cleaned_data['sobrescrever']
 
-        from datetime import timedelta
-        try:
-            from dateutil.relativedelta import relativedelta
-        except Exception:
-            # Fallback simples caso python-dateutil não esteja disponível: aproximar por 30 dias/mes
-            class relativedelta:
-                def __init__(self, months=0):
-                    self.days = months * 30
-                def __radd__(self, other):
-                    from datetime import timedelta as _td
-                    return other + _td(days=self.days)
-        created = 0
-        updated = 0
-        fim = inicio + relativedelta(months=meses)
-        d = inicio
-        while d < fim:
-            if d.weekday() in dias_semana:
-                obj, is_created = AgendaMedicaDia.objects.get_or_create(
-                    medico=med, especialidade=esp, data=d,
-                    defaults={'capacidade': capacidade, 'ativo': True}
-                )
-                if is_created:
-                    created += 1
-                elif sobrescrever:
-                    if obj.capacidade != capacidade or not obj.ativo:
-                        obj.capacidade = capacidade
-                        obj.ativo = True
-                        obj.save(update_fields=['capacidade','ativo','atualizado_em'])
-                        updated += 1
-            d += timedelta(days=1)
+        fim = agendas.somar_meses(inicio, meses)
+        created, updated = agendas.gerar_agendas_dia(
+            [(med.pk, esp.pk)], agendas.datas_do_periodo(inicio, fim, dias_semana), capacidade, sobrescrever,
+        )
         messages.success(request, f'Agenda gerada. Criados: {created}, Atualizados: {updated}.')
         return redirect('agendadia-list')
     return render(request, 'regulacao/agendames_gerar.html', { 'form': form })
@@ -1138,6 +1185,29 @@ def tipo_exame_toggle_ativo(request, pk: int):
     return redirect('tipo-exame-list')
 
 
+
+@login_required
+@require_access('regulacao')
+def tipo_exame_busca(request):
+    """Busca paginada de tipos de exame ativos para o seletor da solicitação (JSON).
+    GET params:
+      - q: termo (prefixo de nome/código/código SUS ou parte do nome); vazio = mais usados
+      - page (int, padrão 1) e page_size (int, até 50)
+    """
+    try:
+        page = int(request.GET.get('page') or 1)
+    except (TypeError, ValueError):
+        page = 1
+    try:
+        page_size = int(request.GET.get('page_size') or catalogo.TAMANHO_PAGINA)
+    except (TypeError, ValueError):
+        page_size = catalogo.TAMANHO_PAGINA
+    data = catalogo.buscar_tipos_exame(request.GET.get('q') or '', page, page_size)
+    response = JsonResponse({'ok': True, **data})
+    # Resultados mudam pouco: permitir cache curto no navegador
+    response['Cache-Control'] = 'private, max-age=300'
+    return response
+
 # ============ VIEWS PARA REGULAÇÃO DE EXAMES ============
 
 class RegulacaoListView(AccessRequiredMixin, LoginRequiredMixin, ListView):
@@ -1184,10 +1254,8 @@ class RegulacaoListView(AccessRequiredMixin, LoginRequiredMixin, ListView):
                 Q(paciente__cpf__icontains=q) |
                 Q(paciente__cns__icontains=q)
             )
-        if data_inicio:
-            qs = qs.filter(data_solicitacao__date__gte=data_inicio)
-        if data_fim:
-            qs = qs.filter(data_solicitacao__date__lte=data_fim)
+        if data_inicio or data_fim:
+            qs = qs.filter(filtro_periodo('data_solicitacao', data_inicio, data_fim))
 
         return qs.order_by('-data_solicitacao')
     
@@ -1258,6 +1326,36 @@ class RegulacaoListView(AccessRequiredMixin, LoginRequiredMixin, ListView):
         return super().dispatch(request, *args, **kwargs)
 
 
+
+def _nome_item(item):
+    ref = item.tipo_exame if isinstance(item, RegulacaoExame) else item.especialidade
+    return getattr(ref, 'nome', '')
+
+
+# Colunas das exportações (exames e consultas na mesma planilha)
+COLUNAS_REGULACAO = [
+    ('Tipo', lambda o: 'Exame' if isinstance(o, RegulacaoExame) else 'Consulta'),
+    ('Protocolo', 'numero_protocolo'),
+    ('Paciente', 'paciente.nome'),
+    ('CPF', 'paciente.cpf'),
+    ('CNS', 'paciente.cns'),
+    ('UBS', 'ubs_solicitante.nome'),
+    ('Exame/Especialidade', _nome_item),
+    ('Prioridade', lambda o: o.get_prioridade_display()),
+    ('Status', lambda o: o.get_status_display()),
+    ('Solicitado em', 'data_solicitacao'),
+    ('Data agendada', 'data_agendada'),
+    ('Hora', 'hora_agendada'),
+    ('Local', lambda o: getattr(o, 'local_realizacao', None) or getattr(o, 'local_atendimento', '')),
+]
+
+
+class RegulacaoExportView(RegulacaoListView):
+    """Exportação (CSV/XLSX) dos exames com os filtros de ``RegulacaoListView``."""
+
+    def get(self, request, *args, **kwargs):
+        return exportacao.exportar(request, 'regulacao_exames', COLUNAS_REGULACAO, self.get_queryset())
+
 class RegulacaoCreateView(AccessRequiredMixin, LoginRequiredMixin, CreateView):
     login_url = '/accounts/login/'
     access_key = 'regulacao'
@@ -1293,11 +1391,12 @@ class RegulacaoCreateView(AccessRequiredMixin, LoginRequiredMixin, CreateView):
                 Q(status='fila') |
                 (Q(status='autorizado') & (Q(data_agendada__isnull=True) | Q(data_agendada__gte=hoje)))
             )
-            .values('tipo_exame_id', 'tipo_exame__nome', 'status')
+            .values_list('tipo_exame_id', 'tipo_exame__nome')
             .distinct()
         )
-        bloqueados_ids = {c['tipo_exame_id'] for c in conflitos_qs}
-        bloqueados_nomes = sorted({c['tipo_exame__nome'] for c in conflitos_qs if c['tipo_exame__nome']})
+        conflitos = list(conflitos_qs)
+        bloqueados_ids = {tid for tid, _ in conflitos}
+        bloqueados_nomes = sorted({nome for _, nome in conflitos if nome})
         tipos_permitidos = [t for t in tipos if t.id not in bloqueados_ids]
 
         if not tipos_permitidos:
@@ -1307,10 +1406,11 @@ class RegulacaoCreateView(AccessRequiredMixin, LoginRequiredMixin, CreateView):
                                f"Paciente já possui em fila/autorizado: {', '.join(bloqueados_nomes)}.")
             return self.form_invalid(form)
 
-        created = []
+        # Um INSERT para o pedido inteiro, com os protocolos reservados em bloco
         with transaction.atomic():
-            for tipo in tipos_permitidos:
-                obj = RegulacaoExame(
+            protocolos = SequenciaProtocolo.reservar(RegulacaoExame, 'exa', len(tipos_permitidos))
+            created = RegulacaoExame.objects.bulk_create([
+                RegulacaoExame(
                     paciente=cleaned['paciente'],
                     ubs_solicitante=cleaned['ubs_solicitante'],
                     medico_solicitante=cleaned['medico_solicitante'],
@@ -1320,9 +1420,11 @@ class RegulacaoCreateView(AccessRequiredMixin, LoginRequiredMixin, CreateView):
                     observacoes_solicitacao=cleaned.get('observacoes_solicitacao', ''),
                     status='fila',
                     numero_pedido=numero_pedido,
+                    numero_protocolo=protocolo,
                 )
-                obj.save()
-                created.append(obj)
+                for tipo, protocolo in zip(tipos_permitidos, protocolos)
+            ])
+            apos_gravacao_em_lote(created, ocupacao=False)
         # Mensagens de retorno
         if created:
             messages.success(self.request, f"Solicitação criada com {len(created)} exame(s) no pedido {numero_pedido}.")
@@ -1411,10 +1513,11 @@ def dashboard_regulacao(request):
     # Superadmin: ver dashboard completo (sem restrições)
     if request.user.is_superuser:
         # Métricas principais
-        total_consultas_autorizadas = RegulacaoConsulta.objects.filter(status='autorizado').count()
-        total_autorizados = RegulacaoExame.objects.filter(status='autorizado').count()
+        # Totais históricos incluem o arquivo de itens encerrados
+        total_consultas_autorizadas = arquivo.contar(RegulacaoConsulta, status='autorizado')
+        total_autorizados = arquivo.contar(RegulacaoExame, status='autorizado')
         total_pendentes = RegulacaoExame.objects.filter(status='pendente').count()
-        total_negados = RegulacaoExame.objects.filter(status='negado').count()
+        total_negados = arquivo.contar(RegulacaoExame, status='negado')
 
         # Quantidade de pacientes distintos na fila (exames e consultas)
         exames_fila_pacientes = RegulacaoExame.objects.filter(status='fila').values_list('paciente_id', flat=True).distinct()
@@ -1461,7 +1564,10 @@ def dashboard_regulacao(request):
             )
             .order_by('-data_solicitacao')
         )
-        notif_nao_lidas = Notificacao.objects.filter(user=request.user, lida=False).order_by('-criado_em')[:10]
+        notif_nao_lidas = (
+            Notificacao.objects.filter(user=request.user, lida=False).order_by('-criado_em')[:10]
+            if notificacoes.contar_nao_lidas(request.user) else []
+        )
         return render(request, 'regulacao/portal_ubs.html', {
             'ubs_atual': ubs_user,
             'pend_ex_count': pend_ex_qs.count(),
@@ -1538,7 +1644,10 @@ def dashboard_regulacao(request):
         .order_by('-data_solicitacao')
     )
 
-    notif_nao_lidas = Notificacao.objects.filter(user=request.user, lida=False).order_by('-criado_em')[:10]
+    notif_nao_lidas = (
+        Notificacao.objects.filter(user=request.user, lida=False).order_by('-criado_em')[:10]
+        if notificacoes.contar_nao_lidas(request.user) else []
+    )
     return render(request, 'regulacao/dashboard.html', {
         'pacientes_fila_exames_count': pacientes_fila_exames_count,
         'pacientes_fila_consultas_count': pacientes_fila_consultas_count,
@@ -1767,8 +1876,8 @@ def minhas_notificacoes(request):
     page = request.GET.get('page') or 1
     paginator = Paginator(qs, 20)
     page_obj = paginator.get_page(page)
-    # Contagem de não lidas para badge
-    nao_lidas = Notificacao.objects.filter(user=request.user, lida=False).count()
+    # Contagem de não lidas para badge (cache por usuário)
+    nao_lidas = notificacoes.contar_nao_lidas(request.user)
     return render(request, 'regulacao/notificacoes.html', {
         'page_obj': page_obj,
         'paginator': paginator,
@@ -1779,17 +1888,157 @@ def minhas_notificacoes(request):
 @login_required
 @require_access('regulacao')
 def notificacao_marcar_lida(request, pk: int):
-    notif = get_object_or_404(Notificacao, pk=pk, user=request.user)
-    if not notif.lida:
-        notif.lida = True
-        notif.save(update_fields=['lida'])
+    get_object_or_404(Notificacao, pk=pk, user=request.user)
+    if notificacoes.marcar_lida(request.user, pk):
         messages.success(request, 'Notificação marcada como lida.')
     next_url = request.GET.get('next') or reverse_lazy('notificacoes-list')
     return redirect(next_url)
 
+
+@login_required
+@require_access('regulacao')
+@require_POST
+def notificacoes_marcar_todas_lidas(request):
+    """Marca todas as notificações não lidas do usuário como lidas (um único UPDATE)."""
+    total = notificacoes.marcar_todas_lidas(request.user)
+    if total:
+        messages.success(request, f'{total} notificação(ões) marcada(s) como lida(s).')
+    else:
+        messages.info(request, 'Nenhuma notificação pendente de leitura.')
+    from django.utils.http import url_has_allowed_host_and_scheme
+    next_url = request.POST.get('next')
+    if not (next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()},
+                                                         require_https=request.is_secure())):
+        next_url = reverse_lazy('notificacoes-list')
+    return redirect(next_url)
+
     # Observação: Regulação também pode criar solicitações se necessário pelo fluxo
 
 
+def _ubs_eventos(user, malote_ubs_id):
+    """UBS cujos contadores o usuário acompanha: a do perfil ou, para o regulador, a do malote."""
+    ubs = getattr(getattr(user, 'perfil_ubs', None), 'ubs', None)
+    if ubs:
+        return ubs.pk
+    try:
+        return int(malote_ubs_id or 0) or None
+    except (TypeError, ValueError):
+        return None
+
+
+@login_required
+@require_access('regulacao')
+def eventos_contadores(request):
+    """Contadores de ``eventos_stream`` em JSON, consultados periodicamente quando o SSE está desligado (WSGI)."""
+    from . import eventos
+
+    ubs_id = _ubs_eventos(request.user, request.session.get('malote_ubs_id'))
+    return JsonResponse(eventos.contadores_usuario(request.user, ubs_id))
+
+
+async def eventos_stream(request):
+    """Stream SSE (ASGI) com eventos do usuário autenticado.
+
+    Só é roteado com ``REGULACAO_SSE_ASGI``: a conexão fica aberta indefinidamente.
+
+    Eventos enviados:
+      - ``contadores``: pacientes em fila e pendências da UBS (do usuário ou do malote) + não lidas
+      - ``notificacao``: nova notificação ({id, texto, url})
+    Substitui recarregamentos de ``dashboard_regulacao``/``minhas_notificacoes``.
+    """
+    import asyncio
+    import time
+    from asgiref.sync import sync_to_async
+    from django.http import HttpResponseForbidden, StreamingHttpResponse
+    from secretaria_it.access import user_has_access
+    from . import eventos
+
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponseForbidden('Autenticação necessária.')
+    if not await sync_to_async(user_has_access)(user, 'regulacao'):
+        return HttpResponseForbidden('Acesso negado para este módulo.')
+
+    malote_ubs_id = await request.session.aget('malote_ubs_id')
+    ubs_id = await sync_to_async(_ubs_eventos)(user, malote_ubs_id)
+
+    def _contadores():
+        return eventos.contadores_usuario(user, ubs_id)
+
+    canais = [f'user:{user.pk}'] + ([f'ubs:{ubs_id}'] if ubs_id else [])
+
+    async def _stream():
+        fila_eventos = eventos.broadcaster.assinar(canais)
+        try:
+            yield 'retry: 5000\n\n'
+            ultimo = await sync_to_async(_contadores)()
+            recalculado_em = time.monotonic()
+            yield eventos.formatar_sse('contadores', ultimo)
+            while True:
+                try:
+                    evento, dados = await asyncio.wait_for(fila_eventos.get(), timeout=eventos.INTERVALO_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    evento, dados = None, None
+                if evento == 'notificacao':
+                    yield eventos.formatar_sse('notificacao', dados)
+                recalcular = evento in ('notificacao', 'mudanca') or (
+                    time.monotonic() - recalculado_em >= eventos.INTERVALO_RECALCULO
+                )
+                if recalcular:
+                    atual = await sync_to_async(_contadores)()
+                    recalculado_em = time.monotonic()
+                    if atual != ultimo:
+                        ultimo = atual
+                        yield eventos.formatar_sse('contadores', atual)
+                elif evento is None:
+                    yield ': ping\n\n'
+        finally:
+            eventos.broadcaster.cancelar(fila_eventos)
+
+    response = StreamingHttpResponse(_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def _ids_csv(valor: str, limite: int = 200) -> list:
+    ids = []
+    for part in (valor or '').split(','):
+        try:
+            ids.append(int(part))
+        except (TypeError, ValueError):
+            continue
+    return ids[:limite]
+
+
+@login_required
+@require_access('regulacao')
+def pacientes_alertas(request):
+    """Itens em aberto (fila/agendados) de um ou vários pacientes, para avisos (JSON).
+    Parâmetros GET:
+      - paciente_id ou paciente_ids (csv, até 200)
+      - tipos (csv de ids de tipo_exame) e especialidade_id (opcionais) para conflitos
+    Resposta: {'ok': True, 'pacientes': {id: {'exames': {...}, 'consultas': {...}}}}
+    """
+    pids = _ids_csv(request.GET.get('paciente_ids') or request.GET.get('paciente_id') or '')
+    if not pids:
+        return JsonResponse({'ok': False, 'error': 'paciente_id ausente'}, status=400)
+    tipos_ids = _ids_csv(request.GET.get('tipos') or '')
+    espec_ids = _ids_csv(request.GET.get('especialidade_id') or '')
+
+    resumos = alertas.resumos_pacientes(pids)
+    return JsonResponse({
+        'ok': True,
+        'pacientes': {
+            str(pid): {
+                'exames': alertas.alertas(r['exames'], ref_ids=tipos_ids),
+                'consultas': alertas.alertas(r['consultas'], feminino=True, ref_ids=espec_ids),
+            }
+            for pid, r in resumos.items()
+        },
+    })
+
+
 @login_required
 @require_access('regulacao')
 def consulta_paciente_alertas(request):
@@ -1797,6 +2046,7 @@ def consulta_paciente_alertas(request):
     Parâmetros GET:
       - paciente_id (obrigatório)
       - especialidade_id (opcional) para informar se já há na mesma especialidade
+    Usa o resumo em cache de ``alertas`` (mesma fonte de ``pacientes_alertas``).
     """
     try:
         pid = int(request.GET.get('paciente_id') or 0)
@@ -1810,50 +2060,14 @@ def consulta_paciente_alertas(request):
     except (TypeError, ValueError):
         espec_id = None
 
-    hoje = timezone.localdate()
-    base_qs = (
-        RegulacaoConsulta.objects.select_related('especialidade', 'ubs_solicitante')
-        .filter(paciente_id=pid)
-        .filter(
-            Q(status='fila') |
-            (Q(status='autorizado') & (Q(data_agendada__isnull=True) | Q(data_agendada__gte=hoje)))
-        )
-    )
-    fila_count = base_qs.filter(status='fila').count()
-    agendadas_count = base_qs.filter(status='autorizado', data_agendada__isnull=False, data_agendada__gte=hoje).count()
-
-    same_espec = None
-    if espec_id:
-        same_espec = base_qs.filter(especialidade_id=espec_id).exists()
-
-    # Detalhes por item (especialidade, UBS, status e, quando aplicável, data/hora)
-    detalhes = []
-    for r in base_qs.order_by('data_solicitacao'):
-        espec_nome = r.especialidade.nome if r.especialidade else '-'
-        ubs_nome = r.ubs_solicitante.nome if r.ubs_solicitante else '-'
-        ag_txt = ''
-        # Adicionar data de solicitação quando estiver em fila de espera
-        if r.status == 'fila' and r.data_solicitacao:
-            try:
-                ag_txt = f" (solicitado em {r.data_solicitacao.strftime('%d/%m/%Y')})"
-            except Exception:
-                pass
-        if r.status == 'autorizado' and r.data_agendada:
-            try:
-                ag_txt = f" (agendada para {r.data_agendada.strftime('%d/%m/%Y')}"
-                if r.hora_agendada:
-                    ag_txt += f" {r.hora_agendada.strftime('%H:%M')}"
-                ag_txt += ")"
-            except Exception:
-                ag_txt = ''
-        detalhes.append(f"{espec_nome} (UBS {ubs_nome}) - {r.get_status_display()}{ag_txt}")
-
+    info = alertas.alertas(alertas.resumo_paciente(pid)['consultas'], feminino=True,
+                           ref_ids=[espec_id] if espec_id else [])
     return JsonResponse({
         'ok': True,
-        'fila_count': fila_count,
-        'agendadas_count': agendadas_count,
-        'same_especialidade': bool(same_espec) if same_espec is not None else None,
-        'detalhes': detalhes,
+        'fila_count': info['fila_count'],
+        'agendadas_count': info['agendadas_count'],
+        'same_especialidade': info['conflito'] if espec_id else None,
+        'detalhes': info['detalhes'],
     })
 
 
@@ -1864,6 +2078,7 @@ def exame_paciente_alertas(request):
     GET params:
       - paciente_id (int) obrigatório
       - tipos (csv de ids de tipo_exame) opcional
+    Usa o resumo em cache de ``alertas`` (mesma fonte de ``pacientes_alertas``).
     """
     try:
         pid = int(request.GET.get('paciente_id') or 0)
@@ -1872,66 +2087,15 @@ def exame_paciente_alertas(request):
     if not pid:
         return JsonResponse({'ok': False, 'error': 'paciente_id ausente'}, status=400)
 
-    tipos_param = (request.GET.get('tipos') or '').strip()
-    tipos_ids = set()
-    if tipos_param:
-        for part in tipos_param.split(','):
-            try:
-                tipos_ids.add(int(part))
-            except (TypeError, ValueError):
-                continue
-
-    hoje = timezone.localdate()
-    base_qs = (
-        RegulacaoExame.objects
-        .select_related('tipo_exame', 'ubs_solicitante')
-        .filter(paciente_id=pid)
-        .filter(
-            Q(status='fila') |
-            (Q(status='autorizado') & (Q(data_agendada__isnull=True) | Q(data_agendada__gte=hoje)))
-        )
-        .order_by('data_solicitacao')
-    )
-
-    fila_count = base_qs.filter(status='fila').count()
-    agendadas_count = base_qs.filter(status='autorizado', data_agendada__isnull=False, data_agendada__gte=hoje).count()
-
-    same_tipos = False
-    conflitos_tipos = []
-    if tipos_ids:
-        confl_qs = base_qs.filter(tipo_exame_id__in=tipos_ids)
-        same_tipos = confl_qs.exists()
-        if same_tipos:
-            conflitos_tipos = sorted({r.tipo_exame.nome for r in confl_qs if r.tipo_exame})
-
-    detalhes = []
-    for r in base_qs:
-        exame_nome = r.tipo_exame.nome if r.tipo_exame else '-'
-        ubs_nome = r.ubs_solicitante.nome if r.ubs_solicitante else '-'
-        ag_txt = ''
-        # Data de solicitação para itens em fila de espera
-        if r.status == 'fila' and r.data_solicitacao:
-            try:
-                ag_txt = f" (solicitado em {r.data_solicitacao.strftime('%d/%m/%Y')})"
-            except Exception:
-                pass
-        if r.status == 'autorizado' and r.data_agendada:
-            try:
-                ag_txt = f" (agendado para {r.data_agendada.strftime('%d/%m/%Y')}"
-                if r.hora_agendada:
-                    ag_txt += f" {r.hora_agendada.strftime('%H:%M')}"
-                ag_txt += ")"
-            except Exception:
-                ag_txt = ''
-        detalhes.append(f"{exame_nome} (UBS {ubs_nome}) - {r.get_status_display()}{ag_txt}")
-
+    info = alertas.alertas(alertas.resumo_paciente(pid)['exames'],
+                           ref_ids=_ids_csv(request.GET.get('tipos') or ''))
     return JsonResponse({
         'ok': True,
-        'fila_count': fila_count,
-        'agendadas_count': agendadas_count,
-        'same_tipos': same_tipos,
-        'conflitos_tipos': conflitos_tipos,
-        'detalhes': detalhes,
+        'fila_count': info['fila_count'],
+        'agendadas_count': info['agendadas_count'],
+        'same_tipos': info['conflito'],
+        'conflitos_tipos': info['conflitos_nomes'],
+        'detalhes': info['detalhes'],
     })
 
 
@@ -1972,16 +2136,10 @@ class RegulacaoConsultaDeleteView(LoginRequiredMixin, DeleteView):
 
 
 #### Adicionar filtro para consultas na fila de espera
-@login_required
-@require_access('regulacao')
-def fila_espera(request):
-    """Fila de espera unificada para exames e consultas (status = fila)."""
-    # UBS users não devem acessar a fila completa
-    if is_ubs_user(request.user):
-        return redirect('regulacao-dashboard')
+def _fila_querysets(request):
+    """Exames e consultas em fila com os filtros da tela (malote, período, busca), por paciente."""
     q_ex = (request.GET.get('q_ex') or '').strip()
     q_co = (request.GET.get('q_co') or '').strip()
-    only = (request.GET.get('only') or '').strip()
     di = (request.GET.get('di') or '').strip()  # data início
     df = (request.GET.get('df') or '').strip()  # data fim
     from django.utils.dateparse import parse_date
@@ -1996,10 +2154,8 @@ def fila_espera(request):
             exames_qs = exames_qs.filter(ubs_solicitante_id=int(malote_ubs_id))
         except Exception:
             pass
-    if di_d:
-        exames_qs = exames_qs.filter(data_solicitacao__date__gte=di_d)
-    if df_d:
-        exames_qs = exames_qs.filter(data_solicitacao__date__lte=df_d)
+    if di_d or df_d:
+        exames_qs = exames_qs.filter(filtro_periodo('data_solicitacao', di_d, df_d))
     if q_ex:
         exames_qs = exames_qs.filter(
             Q(paciente__nome__icontains=q_ex) |
@@ -2016,10 +2172,8 @@ def fila_espera(request):
             consultas_qs = consultas_qs.filter(ubs_solicitante_id=int(malote_ubs_id))
         except Exception:
             pass
-    if di_d:
-        consultas_qs = consultas_qs.filter(data_solicitacao__date__gte=di_d)
-    if df_d:
-        consultas_qs = consultas_qs.filter(data_solicitacao__date__lte=df_d)
+    if di_d or df_d:
+        consultas_qs = consultas_qs.filter(filtro_periodo('data_solicitacao', di_d, df_d))
     if q_co:
         consultas_qs = consultas_qs.filter(
             Q(paciente__nome__icontains=q_co) |
@@ -2029,6 +2183,22 @@ def fila_espera(request):
             Q(ubs_solicitante__nome__icontains=q_co)
         )
     consultas_qs = consultas_qs.order_by('paciente__nome', 'data_solicitacao')
+    return exames_qs, consultas_qs
+
+
+@login_required
+@require_access('regulacao')
+def fila_espera(request):
+    """Fila de espera unificada para exames e consultas (status = fila)."""
+    # UBS users não devem acessar a fila completa
+    if is_ubs_user(request.user):
+        return redirect('regulacao-dashboard')
+    q_ex = (request.GET.get('q_ex') or '').strip()
+    q_co = (request.GET.get('q_co') or '').strip()
+    only = (request.GET.get('only') or '').strip()
+    di = (request.GET.get('di') or '').strip()  # data início
+    df = (request.GET.get('df') or '').strip()  # data fim
+    exames_qs, consultas_qs = _fila_querysets(request)
 
     # Agrupar por paciente - Exames
     grupos_ex = {}
@@ -2042,6 +2212,7 @@ def fila_espera(request):
                 'nomes': [],  # nomes de exames únicos
                 'desde': r.data_solicitacao,
                 'ubs': [],   # nomes de UBS solicitantes únicos
+                'prioridade': r.prioridade,  # mais urgente do grupo
             }
         g = grupos_ex[pid]
         g['total'] += 1
@@ -2053,10 +2224,14 @@ def fila_espera(request):
             g['ubs'].append(ubs_nome)
         if r.data_solicitacao < g['desde']:
             g['desde'] = r.data_solicitacao
+        if PRIORIDADE_ORDEM.get(r.prioridade, 3) < PRIORIDADE_ORDEM.get(g['prioridade'], 3):
+            g['prioridade'] = r.prioridade
 
-    # Ordenar por mais antigos primeiro (campo 'desde'), com desempate por nome do paciente
+    # Ordenar por prioridade (alta, média, normal) e, dentro dela, mais antigos primeiro
+    # (campo 'desde'), com desempate por nome do paciente
     exames_grouped = sorted(
-        grupos_ex.values(), key=lambda x: (x['desde'], (x['paciente'].nome or '').lower())
+        grupos_ex.values(),
+        key=lambda x: (PRIORIDADE_ORDEM.get(x['prioridade'], 3), x['desde'], (x['paciente'].nome or '').lower())
     )
 
     # Agrupar por paciente - Consultas
@@ -2071,6 +2246,7 @@ def fila_espera(request):
                 'nomes': [],  # nomes de especialidades únicos
                 'desde': r.data_solicitacao,
                 'ubs': [],   # nomes de UBS solicitantes únicos
+                'prioridade': r.prioridade,  # mais urgente do grupo
             }
         g = grupos_co[pid]
         g['total'] += 1
@@ -2082,10 +2258,13 @@ def fila_espera(request):
             g['ubs'].append(ubs_nome)
         if r.data_solicitacao < g['desde']:
             g['desde'] = r.data_solicitacao
+        if PRIORIDADE_ORDEM.get(r.prioridade, 3) < PRIORIDADE_ORDEM.get(g['prioridade'], 3):
+            g['prioridade'] = r.prioridade
 
-    # Ordenar por mais antigos primeiro também para consultas
+    # Mesma ordem (prioridade, mais antigos) para consultas
     consultas_grouped = sorted(
-        grupos_co.values(), key=lambda x: (x['desde'], (x['paciente'].nome or '').lower())
+        grupos_co.values(),
+        key=lambda x: (PRIORIDADE_ORDEM.get(x['prioridade'], 3), x['desde'], (x['paciente'].nome or '').lower())
     )
 
     # Paginação independente
@@ -2133,11 +2312,23 @@ def fila_espera(request):
 
 @login_required
 @require_access('regulacao')
-def agenda_regulacao(request):
-    """Agenda da regulação: itens autorizados com data/hora agendadas."""
+def fila_espera_exportar(request):
+    """Exportação (CSV/XLSX) da fila com os filtros da tela; ``only=ex|co`` restringe a um tipo."""
+    if is_ubs_user(request.user):
+        return redirect('regulacao-dashboard')
+    exames_qs, consultas_qs = _fila_querysets(request)
+    only = (request.GET.get('only') or '').strip()
+    fontes = [qs for chave, qs in (('ex', exames_qs), ('co', consultas_qs)) if only in ('', chave)]
+    return exportacao.exportar(request, 'fila_espera', COLUNAS_REGULACAO, exportacao.encadear(*fontes))
+
+
+def _agenda_querysets(request, dia=None):
+    """Autorizados com data agendada no período ``di``/``df`` (padrão: hoje); UBS vê só a sua.
+
+    Com ``dia``, o período é só esse dia. Retorna ``(exames, consultas, di, df)``.
+    """
     # Utilitário local para parse de datas em filtros
     from django.utils.dateparse import parse_date
-    # timezone já importado no topo do arquivo
     # Se usuário for UBS, restringir agenda à sua própria UBS
     ubs_user = getattr(getattr(request.user, 'perfil_ubs', None), 'ubs', None)
     exames_qs = RegulacaoExame.objects.select_related('paciente', 'tipo_exame', 'ubs_solicitante').filter(
@@ -2153,6 +2344,9 @@ def agenda_regulacao(request):
     df = (request.GET.get('df') or '').strip()
     di_d = parse_date(di) if di else None
     df_d = parse_date(df) if df else None
+    if dia:
+        di_d = df_d = dia
+        di = df = dia.isoformat()
     # Se não houver data inicial, usar hoje como padrão
     if not di_d:
         di_d = hoje
@@ -2170,13 +2364,48 @@ def agenda_regulacao(request):
     if ubs_user:
         exames_qs = exames_qs.filter(ubs_solicitante=ubs_user)
         consultas_qs = consultas_qs.filter(ubs_solicitante=ubs_user)
-    exames = exames_qs.order_by('data_agendada', 'hora_agendada')
-    consultas = consultas_qs.order_by('data_agendada', 'hora_agendada')
+    exames = exames_qs.order_by('data_agendada', 'hora_agendada', 'pk')
+    consultas = consultas_qs.order_by('data_agendada', 'hora_agendada', 'pk')
+    return exames, consultas, di, df
+
+
+AGENDA_ITENS_POR_PAGINA = 50
+
+
+def _agenda_dias(exames, consultas):
+    """``[{'data', 'exames', 'consultas'}]`` por dia agendado, em uma consulta (``UNION`` de dois ``GROUP BY``)."""
+    contagens = {
+        tipo: qs.order_by().values('data_agendada').annotate(tipo=Value(tipo), n=Count('id'))
+        for tipo, qs in (('exames', exames), ('consultas', consultas))
+    }
+    dias = {}
+    for linha in contagens['exames'].union(contagens['consultas'], all=True):
+        dia = dias.setdefault(linha['data_agendada'], {'data': linha['data_agendada'], 'exames': 0, 'consultas': 0})
+        dia[linha['tipo']] += linha['n']
+    return [dias[d] for d in sorted(dias)]
+
+
+@login_required
+@require_access('regulacao')
+def agenda_regulacao(request):
+    """Agenda da regulação: itens autorizados com data/hora agendadas.
+
+    A página traz só a contagem por dia; os itens de cada dia e aba são carregados
+    sob demanda (``agenda_regulacao_dia``), paginados.
+    """
+    # Utilitário local para parse de datas em filtros
+    from django.utils.dateparse import parse_date
+    # Se usuário for UBS, restringir agenda à sua própria UBS
+    ubs_user = getattr(getattr(request.user, 'perfil_ubs', None), 'ubs', None)
+    hoje = timezone.localdate()
+    exames, consultas, di, df = _agenda_querysets(request)
     only = (request.GET.get('only') or '').strip()
-    
+    dias = _agenda_dias(exames, consultas)
+
     context = {
-        'exames': exames,
-        'consultas': consultas,
+        'dias': dias,
+        'total_exames': sum(d['exames'] for d in dias),
+        'total_consultas': sum(d['consultas'] for d in dias),
         'ubs_atual': ubs_user,
         # filtros agenda
         'di': di,
@@ -2204,10 +2433,8 @@ def agenda_regulacao(request):
                 Q(paciente__nome__icontains=q_pco) |
                 Q(especialidade__nome__icontains=q_pco)
             )
-        if s_pco:
-            pend_co = pend_co.filter(data_solicitacao__date__gte=s_pco)
-        if e_pco:
-            pend_co = pend_co.filter(data_solicitacao__date__lte=e_pco)
+        if s_pco or e_pco:
+            pend_co = pend_co.filter(filtro_periodo('data_solicitacao', s_pco, e_pco))
 
         # Filtros Exames pendentes (pex)
         q_pex = (request.GET.get('q_pex') or '').strip()
@@ -2220,10 +2447,8 @@ def agenda_regulacao(request):
                 Q(paciente__nome__icontains=q_pex) |
                 Q(tipo_exame__nome__icontains=q_pex)
             )
-        if s_pex:
-            pend_ex = pend_ex.filter(data_solicitacao__date__gte=s_pex)
-        if e_pex:
-            pend_ex = pend_ex.filter(data_solicitacao__date__lte=e_pex)
+        if s_pex or e_pex:
+            pend_ex = pend_ex.filter(filtro_periodo('data_solicitacao', s_pex, e_pex))
 
         # Paginação
         def _to_int(val, default, min_v=1, max_v=200):
@@ -2267,10 +2492,8 @@ def agenda_regulacao(request):
                 Q(tipo_exame__nome__icontains=q_nex) |
                 Q(motivo_decisao__icontains=q_nex)
             )
-        if s_nex:
-            neg_ex = neg_ex.filter(data_solicitacao__date__gte=s_nex)
-        if e_nex:
-            neg_ex = neg_ex.filter(data_solicitacao__date__lte=e_nex)
+        if s_nex or e_nex:
+            neg_ex = neg_ex.filter(filtro_periodo('data_solicitacao', s_nex, e_nex))
         per_nex = _to_int(request.GET.get('per_nex'), 10)
         page_nex = request.GET.get('page_nex') or 1
         p_nex = Paginator(neg_ex, per_nex)
@@ -2283,8 +2506,6 @@ def agenda_regulacao(request):
             'qs_pex': build_qs_without({'page_pex'}),
             'q_pco': q_pco, 'di_pco': di_pco, 'df_pco': df_pco, 'per_pco': per_pco,
             'q_pex': q_pex, 'di_pex': di_pex, 'df_pex': df_pex, 'per_pex': per_pex,
-            'pend_exames': pend_ex,  # ainda disponível se necessário
-            'pend_consultas': pend_co,
             # Negados
             'neg_ex_page': neg_ex_page,
             'q_nex': q_nex, 'di_nex': di_nex, 'df_nex': df_nex, 'per_nex': per_nex,
@@ -2293,6 +2514,39 @@ def agenda_regulacao(request):
     return render(request, 'regulacao/agenda.html', context)
 
 
+@login_required
+@require_access('regulacao')
+def agenda_regulacao_dia(request):
+    """Fragmento da agenda: itens de um dia (``data``) e de uma aba (``only=ex|co``), paginados."""
+    from django.http import HttpResponseBadRequest
+    from django.utils.dateparse import parse_date
+    try:
+        dia = parse_date((request.GET.get('data') or '').strip())
+    except ValueError:
+        dia = None
+    only = (request.GET.get('only') or '').strip()
+    if not dia or only not in ('ex', 'co'):
+        return HttpResponseBadRequest('Informe data (AAAA-MM-DD) e only (ex ou co).')
+    exames, consultas, _, _ = _agenda_querysets(request, dia=dia)
+    page_obj = Paginator(exames if only == 'ex' else consultas, AGENDA_ITENS_POR_PAGINA).get_page(
+        request.GET.get('page')
+    )
+    return render(request, 'regulacao/agenda_dia.html', {
+        'page_obj': page_obj,
+        'only': only,
+        'dia': dia,
+        'ubs_atual': getattr(getattr(request.user, 'perfil_ubs', None), 'ubs', None),
+    })
+
+
+@login_required
+@require_access('regulacao')
+def agenda_exportar(request):
+    """Exportação (CSV/XLSX) da agenda do período (``di``/``df``); UBS exporta só a sua."""
+    exames, consultas, _, _ = _agenda_querysets(request)
+    return exportacao.exportar(request, 'agenda', COLUNAS_REGULACAO, exportacao.encadear(exames, consultas))
+
+
 @login_required
 @require_access('regulacao')
 def status_ubs(request, ubs_id):
@@ -2320,25 +2574,14 @@ def registrar_resultado_exame(request, pk: int):
     if is_ubs_user(request.user):
         messages.error(request, 'Usuários das UBS não podem alterar o resultado do atendimento (aguardando/compareceu/faltou).')
         return redirect(_back_to_agenda(request, default_only='ex', default_hash='#exames-pane'))
-    reg = get_object_or_404(RegulacaoExame, pk=pk)
-    # somente para autorizados com data agendada
-    if reg.status != 'autorizado' or not reg.data_agendada:
-        messages.error(request, 'Somente itens autorizados e com data agendada podem receber resultado.')
-        return redirect(_back_to_agenda(request))
-    hoje = timezone.localdate()
-    if reg.data_agendada > hoje:
-        messages.error(request, 'Não é possível registrar resultado antes da data agendada.')
-        return redirect(_back_to_agenda(request))
-    val = (request.POST.get('resultado') or '').strip()
-    obs = (request.POST.get('observacao') or '').strip()
-    if val not in ('compareceu', 'faltou', 'pendente'):
-        messages.error(request, 'Resultado inválido.')
+    res = resultados.registrar(request.user, [
+        ('ex', pk, request.POST.get('resultado'), request.POST.get('observacao')),
+    ])[0]
+    if res.get('codigo') == 'nao_encontrado':
+        raise Http404
+    if not res['ok']:
+        messages.error(request, res['erro'])
         return redirect(_back_to_agenda(request))
-    reg.resultado_atendimento = val
-    reg.resultado_observacao = obs
-    reg.resultado_por = request.user
-    reg.resultado_em = timezone.now()
-    reg.save(update_fields=['resultado_atendimento','resultado_observacao','resultado_por','resultado_em','atualizado_em'])
     messages.success(request, 'Resultado do atendimento registrado.')
     return redirect(_back_to_agenda(request, default_only='ex', default_hash='#exames-pane'))
 
@@ -2352,24 +2595,14 @@ def registrar_resultado_consulta(request, pk: int):
     if is_ubs_user(request.user):
         messages.error(request, 'Usuários das UBS não podem alterar o resultado do atendimento (aguardando/compareceu/faltou).')
         return redirect(_back_to_agenda(request, default_only='co', default_hash='#consultas-pane'))
-    reg = get_object_or_404(RegulacaoConsulta, pk=pk)
-    if reg.status != 'autorizado' or not reg.data_agendada:
-        messages.error(request, 'Somente itens autorizados e com data agendada podem receber resultado.')
+    res = resultados.registrar(request.user, [
+        ('co', pk, request.POST.get('resultado'), request.POST.get('observacao')),
+    ])[0]
+    if res.get('codigo') == 'nao_encontrado':
+        raise Http404
+    if not res['ok']:
+        messages.error(request, res['erro'])
         return redirect(_back_to_agenda(request))
-    hoje = timezone.localdate()
-    if reg.data_agendada > hoje:
-        messages.error(request, 'Não é possível registrar resultado antes da data agendada.')
-        return redirect(_back_to_agenda(request))
-    val = (request.POST.get('resultado') or '').strip()
-    obs = (request.POST.get('observacao') or '').strip()
-    if val not in ('compareceu', 'faltou', 'pendente'):
-        messages.error(request, 'Resultado inválido.')
-        return redirect(_back_to_agenda(request))
-    reg.resultado_atendimento = val
-    reg.resultado_observacao = obs
-    reg.resultado_por = request.user
-    reg.resultado_em = timezone.now()
-    reg.save(update_fields=['resultado_atendimento','resultado_observacao','resultado_por','resultado_em','atualizado_em'])
     messages.success(request, 'Resultado do atendimento registrado.')
     return redirect(_back_to_agenda(request, default_only='co', default_hash='#consultas-pane'))
 
@@ -2426,71 +2659,29 @@ def registrar_resultados_agenda(request):
         default_hash = '#consultas-pane' if default_only == 'co' else ('#exames-pane' if default_only == 'ex' else '')
         return redirect(_back_to_agenda(request, default_only=default_only, default_hash=default_hash))
 
-    hoje = timezone.localdate()
-    updated_co = skipped_co = 0
-    updated_ex = skipped_ex = 0
-
-    # Coletar IDs informados no POST
+    # Coletar itens informados no POST (co-<id>-resultado / ex-<id>-resultado)
     co_ids = set()
     ex_ids = set()
+    itens = []
     for key in request.POST.keys():
-        if key.startswith('co-') and key.endswith('-resultado'):
-            try:
-                pk = int(key.split('-')[1])
-                co_ids.add(pk)
-            except (ValueError, IndexError):
-                continue
-        elif key.startswith('ex-') and key.endswith('-resultado'):
-            try:
-                pk = int(key.split('-')[1])
-                ex_ids.add(pk)
-            except (ValueError, IndexError):
-                continue
-
-    # Processar Consultas
-    if co_ids:
-        regs = {r.id: r for r in RegulacaoConsulta.objects.filter(id__in=co_ids)}
-        for pk in co_ids:
-            reg = regs.get(pk)
-            if not reg:
-                continue
-            # Apenas autorizadas e com data passada/hoje
-            if reg.status != 'autorizado' or not reg.data_agendada or reg.data_agendada > hoje:
-                skipped_co += 1
-                continue
-            val = (request.POST.get(f'co-{pk}-resultado') or '').strip()
-            if val not in ('compareceu', 'faltou', 'pendente'):
-                skipped_co += 1
-                continue
-            obs = (request.POST.get(f'co-{pk}-observacao') or '').strip()
-            reg.resultado_atendimento = val
-            reg.resultado_observacao = obs
-            reg.resultado_por = request.user
-            reg.resultado_em = timezone.now()
-            reg.save(update_fields=['resultado_atendimento','resultado_observacao','resultado_por','resultado_em','atualizado_em'])
-            updated_co += 1
-
-    # Processar Exames
-    if ex_ids:
-        regs = {r.id: r for r in RegulacaoExame.objects.filter(id__in=ex_ids)}
-        for pk in ex_ids:
-            reg = regs.get(pk)
-            if not reg:
-                continue
-            if reg.status != 'autorizado' or not reg.data_agendada or reg.data_agendada > hoje:
-                skipped_ex += 1
-                continue
-            val = (request.POST.get(f'ex-{pk}-resultado') or '').strip()
-            if val not in ('compareceu', 'faltou', 'pendente'):
-                skipped_ex += 1
-                continue
-            obs = (request.POST.get(f'ex-{pk}-observacao') or '').strip()
-            reg.resultado_atendimento = val
-            reg.resultado_observacao = obs
-            reg.resultado_por = request.user
-            reg.resultado_em = timezone.now()
-            reg.save(update_fields=['resultado_atendimento','resultado_observacao','resultado_por','resultado_em','atualizado_em'])
-            updated_ex += 1
+        tipo, _, resto = key.partition('-')
+        if tipo not in ('co', 'ex') or not resto.endswith('-resultado'):
+            continue
+        try:
+            pk = int(resto[:-len('-resultado')])
+        except ValueError:
+            continue
+        (co_ids if tipo == 'co' else ex_ids).add(pk)
+        itens.append((tipo, pk, request.POST.get(key), request.POST.get(f'{tipo}-{pk}-observacao')))
+
+    contagem = {(tipo, chave): 0 for tipo in ('co', 'ex') for chave in ('ok', 'ignorado')}
+    for res in resultados.registrar(request.user, itens):
+        if res['alterado']:
+            contagem[(res['tipo'], 'ok')] += 1
+        elif not res['ok'] and res['codigo'] != 'nao_encontrado':
+            contagem[(res['tipo'], 'ignorado')] += 1
+    updated_co, skipped_co = contagem[('co', 'ok')], contagem[('co', 'ignorado')]
+    updated_ex, skipped_ex = contagem[('ex', 'ok')], contagem[('ex', 'ignorado')]
 
     # Mensagens
     if updated_co or updated_ex:
@@ -2514,6 +2705,23 @@ def registrar_resultados_agenda(request):
     default_hash = '#consultas-pane' if default_only == 'co' else ('#exames-pane' if default_only == 'ex' else '')
     return redirect(_back_to_agenda(request, default_only=default_only, default_hash=default_hash))
 
+@login_required
+@require_access('regulacao')
+def recepcao_checkin(request):
+    """Recepção: registra ``compareceu`` pela leitura do código de barras do comprovante.
+
+    GET exibe a tela de leitura; POST (``protocolo``) responde JSON com o resultado.
+    """
+    if is_ubs_user(request.user):
+        if request.method == 'POST':
+            return JsonResponse({'ok': False, 'erro': 'Usuários das UBS não podem registrar o comparecimento.'},
+                                status=403)
+        return redirect('regulacao-agenda')
+    if request.method != 'POST':
+        return render(request, 'regulacao/recepcao_checkin.html', {'hoje': timezone.localdate()})
+    return JsonResponse(resultados.check_in(request.user, request.POST.get('protocolo')))
+
+
 @login_required
 @require_access('regulacao')
 def paciente_pedido(request, paciente_id):
@@ -2595,7 +2803,9 @@ def paciente_pedido(request, paciente_id):
                         total = ex_count + co_count
                         if total > 0:
                             conflitos_por_data[d] = (ex_count, co_count, total)
-                with transaction.atomic():
+                # Notificações às UBS acumuladas e gravadas de uma vez ao final
+                notifs_ubs = []
+                with transaction.atomic(), auditoria.lote() as audit:
                     for form in exame_fs.forms:
                         inst = form.instance
                         prev_status = inst.status
@@ -2613,34 +2823,23 @@ def paciente_pedido(request, paciente_id):
                             inst.save()
                             aprovados_exames += 1
                             aprovados_ids.append(inst.id)
-                            # Registrar ação do usuário
-                            AcaoUsuario.objects.create(
-                                usuario=request.user,
-                                tipo_acao='autorizar_exame',
-                                exame=inst,
-                                paciente_nome=inst.paciente.nome,
-                                motivo=inst.motivo_decisao or ''
+                            # Registrar ação do usuário (gravada em lote após o commit)
+                            audit.registrar(
+                                request.user, 'autorizar_exame', exame=inst,
+                                paciente_nome=paciente.nome, motivo=inst.motivo_decisao or '',
                             )
                             # Notificar UBS quando um item que estava pendente foi autorizado/agendado
                             if prev_status == 'pendente':
-                                try:
-                                    usuarios = getattr(inst.ubs_solicitante, 'usuarios', None)
-                                    if usuarios is not None:
-                                        data_txt = inst.data_agendada.strftime('%d/%m/%Y') if inst.data_agendada else None
-                                        hora_txt = inst.hora_agendada.strftime('%H:%M') if inst.hora_agendada else None
-                                        when_txt = (
-                                            f" para {data_txt}{(' às ' + hora_txt) if hora_txt else ''}" if data_txt else ''
-                                        )
-                                        for vinc in usuarios.select_related('user').all():
-                                            Notificacao.objects.create(
-                                                user=vinc.user,
-                                                texto=(
-                                                    f"Exame de {inst.paciente.nome} em pendência foi agendado{when_txt}."
-                                                ),
-                                                url=str(reverse_lazy('paciente-pedido', kwargs={'paciente_id': inst.paciente_id})) + "?only=ex",
-                                            )
-                                except Exception:
-                                    pass
+                                data_txt = inst.data_agendada.strftime('%d/%m/%Y') if inst.data_agendada else None
+                                hora_txt = inst.hora_agendada.strftime('%H:%M') if inst.hora_agendada else None
+                                when_txt = (
+                                    f" para {data_txt}{(' às ' + hora_txt) if hora_txt else ''}" if data_txt else ''
+                                )
+                                notifs_ubs.append((
+                                    inst.ubs_solicitante_id,
+                                    f"Exame de {paciente.nome} em pendência foi agendado{when_txt}.",
+                                    str(reverse_lazy('paciente-pedido', kwargs={'paciente_id': inst.paciente_id})) + "?only=ex",
+                                ))
                         elif form.cleaned_data.get('negar'):
                             inst.status = 'negado'
                             inst.regulador = request.user
@@ -2654,13 +2853,10 @@ def paciente_pedido(request, paciente_id):
                             inst.motivo_decisao = form.cleaned_data.get('motivo_decisao') or ''
                             inst.save()
                             negados_exames += 1
-                            # Registrar ação do usuário
-                            AcaoUsuario.objects.create(
-                                usuario=request.user,
-                                tipo_acao='negar_exame',
-                                exame=inst,
-                                paciente_nome=inst.paciente.nome,
-                                motivo=inst.motivo_decisao or ''
+                            # Registrar ação do usuário (gravada em lote após o commit)
+                            audit.registrar(
+                                request.user, 'negar_exame', exame=inst,
+                                paciente_nome=paciente.nome, motivo=inst.motivo_decisao or '',
                             )
                         elif form.cleaned_data.get('pendenciar'):
                             # Marcar como pendente e registrar motivo
@@ -2688,31 +2884,25 @@ def paciente_pedido(request, paciente_id):
                                 texto=inst.pendencia_motivo,
                             )
                             pendenciados_exames += 1
-                            # Registrar ação do usuário
-                            AcaoUsuario.objects.create(
-                                usuario=request.user,
-                                tipo_acao='pendenciar_exame',
-                                exame=inst,
-                                paciente_nome=inst.paciente.nome,
-                                motivo=inst.pendencia_motivo or ''
+                            # Registrar ação do usuário (gravada em lote após o commit)
+                            audit.registrar(
+                                request.user, 'pendenciar_exame', exame=inst,
+                                paciente_nome=paciente.nome, motivo=inst.pendencia_motivo or '',
                             )
                         else:
                             # Caso no futuro exista uma ação explícita de "retornar à fila",
                             # notificar a UBS quando um item que estava pendente voltar para a fila.
                             if prev_status == 'pendente' and inst.status == 'fila':
-                                try:
-                                    usuarios = getattr(inst.ubs_solicitante, 'usuarios', None)
-                                    if usuarios is not None:
-                                        for vinc in usuarios.select_related('user').all():
-                                            Notificacao.objects.create(
-                                                user=vinc.user,
-                                                texto=(
-                                                    f"Exame de {inst.paciente.nome} em pendência retornou à fila de espera."
-                                                ),
-                                                url=str(reverse_lazy('paciente-pedido', kwargs={'paciente_id': inst.paciente_id})) + "?only=ex",
-                                            )
-                                except Exception:
-                                    pass
+                                notifs_ubs.append((
+                                    inst.ubs_solicitante_id,
+                                    f"Exame de {paciente.nome} em pendência retornou à fila de espera.",
+                                    str(reverse_lazy('paciente-pedido', kwargs={'paciente_id': inst.paciente_id})) + "?only=ex",
+                                ))
+                if notifs_ubs:
+                    try:
+                        notificacoes.notificar_varias_ubs(notifs_ubs)
+                    except Exception:
+                        pass
                 if aprovados_exames:
                     messages.success(request, f"{aprovados_exames} exame(s) autorizados e agendados para {paciente.nome}.")
                     # Exibir avisos de conflitos encontrados
@@ -2759,7 +2949,9 @@ def paciente_pedido(request, paciente_id):
                         total = ex_count + co_count
                         if total > 0:
                             conflitos_por_data[d] = (ex_count, co_count, total)
-                with transaction.atomic():
+                # Notificações às UBS acumuladas e gravadas de uma vez ao final
+                notifs_ubs = []
+                with transaction.atomic(), auditoria.lote() as audit:
                     for form in consulta_fs.forms:
                         inst = form.instance
                         prev_status = inst.status
@@ -2778,34 +2970,23 @@ def paciente_pedido(request, paciente_id):
                             inst.save()
                             aprovados_consultas += 1
                             aprovados_ids.append(inst.id)
-                            # Registrar ação do usuário
-                            AcaoUsuario.objects.create(
-                                usuario=request.user,
-                                tipo_acao='autorizar_consulta',
-                                consulta=inst,
-                                paciente_nome=inst.paciente.nome,
-                                motivo=inst.motivo_decisao or ''
+                            # Registrar ação do usuário (gravada em lote após o commit)
+                            audit.registrar(
+                                request.user, 'autorizar_consulta', consulta=inst,
+                                paciente_nome=paciente.nome, motivo=inst.motivo_decisao or '',
                             )
                             # Notificar UBS quando um item que estava pendente foi autorizado/agendado
                             if prev_status == 'pendente':
-                                try:
-                                    usuarios = getattr(inst.ubs_solicitante, 'usuarios', None)
-                                    if usuarios is not None:
-                                        data_txt = inst.data_agendada.strftime('%d/%m/%Y') if inst.data_agendada else None
-                                        hora_txt = inst.hora_agendada.strftime('%H:%M') if inst.hora_agendada else None
-                                        when_txt = (
-                                            f" para {data_txt}{(' às ' + hora_txt) if hora_txt else ''}" if data_txt else ''
-                                        )
-                                        for vinc in usuarios.select_related('user').all():
-                                            Notificacao.objects.create(
-                                                user=vinc.user,
-                                                texto=(
-                                                    f"Consulta de {inst.paciente.nome} em pendência foi agendada{when_txt}."
-                                                ),
-                                                url=str(reverse_lazy('paciente-pedido', kwargs={'paciente_id': inst.paciente_id})) + "?only=co",
-                                            )
-                                except Exception:
-                                    pass
+                                data_txt = inst.data_agendada.strftime('%d/%m/%Y') if inst.data_agendada else None
+                                hora_txt = inst.hora_agendada.strftime('%H:%M') if inst.hora_agendada else None
+                                when_txt = (
+                                    f" para {data_txt}{(' às ' + hora_txt) if hora_txt else ''}" if data_txt else ''
+                                )
+                                notifs_ubs.append((
+                                    inst.ubs_solicitante_id,
+                                    f"Consulta de {paciente.nome} em pendência foi agendada{when_txt}.",
+                                    str(reverse_lazy('paciente-pedido', kwargs={'paciente_id': inst.paciente_id})) + "?only=co",
+                                ))
                         elif form.cleaned_data.get('negar'):
                             inst.status = 'negado'
                             inst.regulador = request.user
@@ -2818,13 +2999,10 @@ def paciente_pedido(request, paciente_id):
                             inst.motivo_decisao = form.cleaned_data.get('motivo_decisao') or ''
                             inst.save()
                             negadas_consultas += 1
-                            # Registrar ação do usuário
-                            AcaoUsuario.objects.create(
-                                usuario=request.user,
-                                tipo_acao='negar_consulta',
-                                consulta=inst,
-                                paciente_nome=inst.paciente.nome,
-                                motivo=inst.motivo_decisao or ''
+                            # Registrar ação do usuário (gravada em lote após o commit)
+                            audit.registrar(
+                                request.user, 'negar_consulta', consulta=inst,
+                                paciente_nome=paciente.nome, motivo=inst.motivo_decisao or '',
                             )
                         elif form.cleaned_data.get('pendenciar'):
                             inst.status = 'pendente'
@@ -2850,31 +3028,25 @@ def paciente_pedido(request, paciente_id):
                                 texto=inst.pendencia_motivo,
                             )
                             pendenciadas_consultas += 1
-                            # Registrar ação do usuário
-                            AcaoUsuario.objects.create(
-                                usuario=request.user,
-                                tipo_acao='pendenciar_consulta',
-                                consulta=inst,
-                                paciente_nome=inst.paciente.nome,
-                                motivo=inst.pendencia_motivo or ''
+                            # Registrar ação do usuário (gravada em lote após o commit)
+                            audit.registrar(
+                                request.user, 'pendenciar_consulta', consulta=inst,
+                                paciente_nome=paciente.nome, motivo=inst.pendencia_motivo or '',
                             )
                         else:
                             # Caso no futuro exista uma ação explícita de "retornar à fila",
                             # notificar a UBS quando um item que estava pendente voltar para a fila.
                             if prev_status == 'pendente' and inst.status == 'fila':
-                                try:
-                                    usuarios = getattr(inst.ubs_solicitante, 'usuarios', None)
-                                    if usuarios is not None:
-                                        for vinc in usuarios.select_related('user').all():
-                                            Notificacao.objects.create(
-                                                user=vinc.user,
-                                                texto=(
-                                                    f"Consulta de {inst.paciente.nome} em pendência retornou à fila de espera."
-                                                ),
-                                                url=str(reverse_lazy('paciente-pedido', kwargs={'paciente_id': inst.paciente_id})) + "?only=co",
-                                            )
-                                except Exception:
-                                    pass
+                                notifs_ubs.append((
+                                    inst.ubs_solicitante_id,
+                                    f"Consulta de {paciente.nome} em pendência retornou à fila de espera.",
+                                    str(reverse_lazy('paciente-pedido', kwargs={'paciente_id': inst.paciente_id})) + "?only=co",
+                                ))
+                if notifs_ubs:
+                    try:
+                        notificacoes.notificar_varias_ubs(notifs_ubs)
+                    except Exception:
+                        pass
                 if aprovados_consultas:
                     messages.success(request, f"{aprovados_consultas} consulta(s) autorizadas e agendadas para {paciente.nome}.")
                     # Exibir avisos de conflitos encontrados
@@ -3136,138 +3308,164 @@ def importar_sigtap(request):
             messages.error(request, f'Falha na importação: {e}')
             return redirect('importar-sigtap')
 
-@csrf_exempt
 @login_required
 @require_access('regulacao')
 @require_POST
-@require_POST
-@login_required
 def salvar_acao_ajax(request):
-    """View AJAX para salvar ações de pendência e negativa automaticamente."""
-    import logging
-    logger = logging.getLogger(__name__)
-    
+    """View AJAX para salvar ações de pendência e negativa automaticamente (um item).
+    Mesmo serviço de ``acoes_em_lote``; mantida para a tela do paciente.
+    """
+    if is_ubs_user(request.user):
+        return JsonResponse({'success': False, 'error': 'Usuários de UBS não podem autorizar ou negar solicitações.'})
+    item = {
+        'item_type': request.POST.get('item_type'),  # 'exame' ou 'consulta'
+        'id': request.POST.get('item_id'),
+        'action': request.POST.get('action'),  # 'negar' ou 'pendenciar'
+        'motivo': request.POST.get('motivo', ''),
+    }
     try:
-        logger.info(f"AJAX Request recebida - User: {request.user}, Method: {request.method}")
-        
-        # Verificar se é usuário da regulação
-        if is_ubs_user(request.user):
-            logger.warning(f"Usuário UBS tentou acessar: {request.user}")
-            return JsonResponse({'success': False, 'error': 'Usuários de UBS não podem autorizar ou negar solicitações.'})
-        
-        # Obter dados do POST
-        item_id = request.POST.get('item_id')
-        item_type = request.POST.get('item_type')  # 'exame' ou 'consulta'
-        action = request.POST.get('action')  # 'negar' ou 'pendenciar'
-        motivo = request.POST.get('motivo', '').strip()
-        
-        logger.info(f"Dados recebidos - ID: {item_id}, Type: {item_type}, Action: {action}, Motivo: {motivo[:50]}...")
-        
-        if not all([item_id, item_type, action, motivo]):
-            return JsonResponse({'success': False, 'error': 'Dados incompletos.'})
-        
-        if action not in ['negar', 'pendenciar']:
-            return JsonResponse({'success': False, 'error': 'Ação inválida.'})
-        
-        if item_type not in ['exame', 'consulta']:
-            return JsonResponse({'success': False, 'error': 'Tipo de item inválido.'})
-        
-        # Processar baseado no tipo
-        with transaction.atomic():
-            if item_type == 'exame':
-                regulacao = get_object_or_404(RegulacaoExame, pk=item_id)
-                
-                if action == 'negar':
-                    regulacao.status = 'negado'
-                    regulacao.motivo_decisao = motivo
-                    regulacao.data_regulacao = timezone.now()
-                    regulacao.regulador = request.user
-                    regulacao.save()
-                    
-                    # Registrar ação do usuário
-                    AcaoUsuario.objects.create(
-                        usuario=request.user,
-                        tipo_acao='negar_exame',
-                        exame=regulacao,
-                        paciente_nome=regulacao.paciente.nome,
-                        motivo=motivo
-                    )
-                    
-                elif action == 'pendenciar':
-                    regulacao.status = 'pendente'
-                    regulacao.pendencia_motivo = motivo
-                    regulacao.pendencia_aberta_em = timezone.now()
-                    regulacao.pendencia_aberta_por = request.user
-                    regulacao.pendencia_respondida_em = None
-                    regulacao.pendencia_resposta = ''
-                    regulacao.save()
-                    
-                    # Registrar ação do usuário
-                    AcaoUsuario.objects.create(
-                        usuario=request.user,
-                        tipo_acao='pendenciar_exame',
-                        exame=regulacao,
-                        paciente_nome=regulacao.paciente.nome,
-                        motivo=motivo
-                    )
-                    
-                    # Registrar mensagem de pendência
-                    PendenciaMensagemExame.objects.create(
-                        exame=regulacao,
-                        autor=request.user,
-                        lado='regulacao',
-                        tipo='abertura',
-                        texto=motivo,
-                    )
-                    
-            elif item_type == 'consulta':
-                regulacao = get_object_or_404(RegulacaoConsulta, pk=item_id)
-                
-                if action == 'negar':
-                    regulacao.status = 'negado'
-                    regulacao.motivo_decisao = motivo
-                    regulacao.data_regulacao = timezone.now()
-                    regulacao.regulador = request.user
-                    regulacao.save()
-                    
-                    # Registrar ação do usuário
-                    AcaoUsuario.objects.create(
-                        usuario=request.user,
-                        tipo_acao='negar_consulta',
-                        consulta=regulacao,
-                        paciente_nome=regulacao.paciente.nome,
-                        motivo=motivo
-                    )
-                    
-                elif action == 'pendenciar':
-                    regulacao.status = 'pendente'
-                    regulacao.pendencia_motivo = motivo
-                    regulacao.pendencia_aberta_em = timezone.now()
-                    regulacao.pendencia_aberta_por = request.user
-                    regulacao.pendencia_respondida_em = None
-                    regulacao.pendencia_resposta = ''
-                    regulacao.save()
-                    
-                    # Registrar ação do usuário
-                    AcaoUsuario.objects.create(
-                        usuario=request.user,
-                        tipo_acao='pendenciar_consulta',
-                        consulta=regulacao,
-                        paciente_nome=regulacao.paciente.nome,
-                        motivo=motivo
-                    )
-                    
-                    # Registrar mensagem de pendência
-                    PendenciaMensagemConsulta.objects.create(
-                        consulta=regulacao,
-                        autor=request.user,
-                        lado='regulacao',
-                        tipo='abertura',
-                        texto=motivo,
-                    )
-        
-        return JsonResponse({'success': True, 'message': f'Ação "{action}" salva com sucesso.'})
-        
+        resultado = acoes.aplicar_acoes(request.user, [item])[0]
     except Exception as e:
-        logger.error(f"Erro na view AJAX: {str(e)}", exc_info=True)
+        logger.error("Erro ao salvar ação AJAX: %s", e, exc_info=True)
         return JsonResponse({'success': False, 'error': f'Erro interno: {str(e)}'})
+    if not resultado['ok']:
+        return JsonResponse({'success': False, 'error': resultado['error']})
+    return JsonResponse({'success': True, 'message': f'Ação "{item["action"]}" salva com sucesso.'})
+
+
+@login_required
+@require_access('regulacao')
+@require_POST
+def acoes_em_lote(request):
+    """Aplica negar/pendenciar a vários itens em uma transação (JSON, com CSRF).
+    Corpo: {"itens": [{"item_type": "exame"|"consulta", "id": 1, "action": "negar"|"pendenciar", "motivo": "..."}]}
+    Resposta: {"success": bool, "resultados": [{"item_type", "id", "action", "ok", "error"?}, ...]}
+    """
+    if is_ubs_user(request.user):
+        return JsonResponse({'success': False, 'error': 'Usuários de UBS não podem autorizar ou negar solicitações.'},
+                            status=403)
+    try:
+        payload = json.loads(request.body or b'{}')
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'JSON inválido.'}, status=400)
+    itens = payload.get('itens') if isinstance(payload, dict) else payload
+    if not isinstance(itens, list) or not itens:
+        return JsonResponse({'success': False, 'error': 'Informe a lista "itens".'}, status=400)
+    if len(itens) > acoes.MAX_ITENS:
+        return JsonResponse({'success': False, 'error': f'Máximo de {acoes.MAX_ITENS} itens por lote.'}, status=400)
+    resultados = acoes.aplicar_acoes(request.user, itens)
+    return JsonResponse({'success': all(r['ok'] for r in resultados), 'resultados': resultados})
+
+
+@login_required
+@require_access('regulacao')
+def alocar_fila_view(request):
+    """Alocação automática da fila em vagas das agendas (JSON).
+    GET: proposta; POST com confirmar=1: grava. Parâmetros: especialidade_id ou tipo_exame_id,
+    inicio/fim (AAAA-MM-DD), limite, hora (HH:MM), local e ubs_id (padrão: malote selecionado).
+    """
+    if is_ubs_user(request.user):
+        return JsonResponse({'ok': False, 'error': 'Acesso restrito à regulação.'}, status=403)
+    from django.utils.dateparse import parse_date, parse_time
+    params = request.POST if request.method == 'POST' else request.GET
+    confirmar = request.method == 'POST' and params.get('confirmar') in ('1', 'true', 'on')
+    try:
+        esp_id = int(params.get('especialidade_id') or 0)
+        tipo_id = int(params.get('tipo_exame_id') or 0)
+        limite = int(params.get('limite') or 0) or None
+        ubs_id = int(params.get('ubs_id') or request.session.get('malote_ubs_id') or 0) or None
+        inicio = parse_date(params.get('inicio') or '') or None
+        fim = parse_date(params.get('fim') or '') or None
+        hora = parse_time(params.get('hora') or '') or None
+    except (TypeError, ValueError):
+        return JsonResponse({'ok': False, 'error': 'Parâmetros inválidos.'}, status=400)
+    try:
+        alvo = alocacao.Alvo(
+            especialidade=get_object_or_404(Especialidade, pk=esp_id) if esp_id else None,
+            tipo_exame=get_object_or_404(TipoExame, pk=tipo_id) if tipo_id else None,
+        )
+    except ValueError as exc:
+        return JsonResponse({'ok': False, 'error': str(exc)}, status=400)
+    resultado = alocacao.alocar_fila(
+        alvo,
+        usuario=request.user,
+        confirmar=confirmar,
+        inicio=inicio,
+        fim=fim,
+        ubs_id=ubs_id,
+        limite=limite,
+        hora=hora,
+        local=(params.get('local') or '').strip(),
+    )
+    return JsonResponse({'ok': True, **resultado})
+
+
+@login_required
+@require_access('regulacao')
+def fila_simulacao(request):
+    """Simulação da fila de uma especialidade (JSON): espera projetada no cenário atual e no alternativo.
+    GET ?especialidade_id=ID (ou tipo_exame_id), &dias= (horizonte), &execucoes=, &extra_semana= (vagas a
+    mais por semana), &fator_demanda= (ex.: 1.1 = +10% de solicitações), &reentrada= (0–1, faltosos que voltam).
+    """
+    if is_ubs_user(request.user):
+        return JsonResponse({'ok': False, 'error': 'Acesso restrito à regulação.'}, status=403)
+    try:
+        esp_id = int(request.GET.get('especialidade_id') or 0)
+        tipo_id = int(request.GET.get('tipo_exame_id') or 0)
+        opcoes = {
+            'dias': int(request.GET.get('dias') or 180),
+            'execucoes': int(request.GET.get('execucoes') or 1000),
+            'capacidade_extra_semanal': int(request.GET.get('extra_semana') or 0),
+            'fator_demanda': float(request.GET.get('fator_demanda') or 1),
+            'reentrada': float(request.GET.get('reentrada') or 1),
+        }
+    except ValueError:
+        return JsonResponse({'ok': False, 'error': 'Parâmetros inválidos.'}, status=400)
+    if not esp_id and tipo_id:
+        esp_id = TipoExame.objects.filter(pk=tipo_id).values_list('especialidade_id', flat=True).first() or 0
+    if not esp_id:
+        return JsonResponse({'ok': False, 'error': 'Informe a especialidade ou um tipo de exame com especialidade.'},
+                            status=400)
+    try:
+        # Horizonte e execuções menores que os do comando simular_fila: roda no thread da requisição
+        resultado = simulacao.simular(esp_id, max_dias=simulacao.MAX_DIAS_WEB,
+                                      max_execucoes=simulacao.MAX_EXECUCOES_WEB, **opcoes)
+    except ValueError as exc:
+        return JsonResponse({'ok': False, 'error': str(exc) or 'Parâmetros inválidos.'}, status=400)
+    return JsonResponse({'ok': True, **resultado})
+
+
+@login_required
+@require_access('regulacao')
+@require_POST
+def fila_proximos(request):
+    """Reserva e devolve os próximos itens da fila por prioridade e tempo de espera (JSON).
+    Parâmetros: tipo (exame|consulta), n, especialidade_id, tipo_exame_id e ubs_id
+    (padrão: malote selecionado). Ver regulacao/fila.py.
+    """
+    if is_ubs_user(request.user):
+        return JsonResponse({'ok': False, 'error': 'Acesso restrito à regulação.'}, status=403)
+    tipo = request.POST.get('tipo') or 'exame'
+    if tipo not in ('exame', 'consulta'):
+        return JsonResponse({'ok': False, 'error': 'Tipo inválido.'}, status=400)
+    try:
+        n = int(request.POST.get('n') or 10)
+        ubs_id = int(request.POST.get('ubs_id') or request.session.get('malote_ubs_id') or 0) or None
+        esp_id = int(request.POST.get('especialidade_id') or 0) or None
+        tipo_id = int(request.POST.get('tipo_exame_id') or 0) or None
+    except (TypeError, ValueError):
+        return JsonResponse({'ok': False, 'error': 'Parâmetros inválidos.'}, status=400)
+    itens = fila.puxar(request.user, tipo, n, ubs_id=ubs_id, especialidade_id=esp_id, tipo_exame_id=tipo_id)
+    return JsonResponse({'ok': True, 'itens': itens})
+
+
+@login_required
+@require_access('regulacao')
+@require_POST
+def fila_liberar(request):
+    """Devolve à fila itens reservados pelo usuário (tipo + ids em CSV)."""
+    tipo = request.POST.get('tipo') or 'exame'
+    if tipo not in ('exame', 'consulta'):
+        return JsonResponse({'ok': False, 'error': 'Tipo inválido.'}, status=400)
+    liberados = fila.liberar(request.user, tipo, _ids_csv(request.POST.get('ids')))
+    return JsonResponse({'ok': True, 'liberados': liberados})
@@ -0,0 +1,70 @@
+"""Filtros por data local em campos ``DateTimeField`` usando intervalos (sargáveis).
+
+``campo__date=dia`` vira, no SQL, uma conversão de fuso seguida de cast para data
+em cada linha, o que impede o uso de índices btree na coluna. Aqui as datas
+locais são convertidas em um intervalo semiaberto de instantes com fuso
+(``>= início do dia inicial`` e ``< início do dia seguinte ao final``), que o
+banco resolve direto no índice do campo.
+
+Uso::
+
+    qs = qs.filter(filtro_periodo('data_solicitacao', inicio, fim))
+    qs = qs.filter(filtro_dia('data_regulacao', timezone.localdate()))
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Tuple, Union
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+DataLocal = Union[date, str, None]
+
+
+def _como_data(valor: DataLocal) -> Optional[date]:
+    """Aceita ``date`` ou texto ISO (``AAAA-MM-DD``); valores inválidos viram ``None``."""
+    if not valor:
+        return None
+    if isinstance(valor, datetime):
+        return timezone.localtime(valor).date() if timezone.is_aware(valor) else valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return parse_date(str(valor).strip())
+    except ValueError:
+        return None
+
+
+def inicio_do_dia(dia: date) -> datetime:
+    """Primeiro instante do dia ``dia`` no fuso atual (com fuso se ``USE_TZ``)."""
+    dt = datetime.combine(dia, time.min)
+    if settings.USE_TZ:
+        return timezone.make_aware(dt, timezone.get_current_timezone())
+    return dt
+
+
+def intervalo_do_dia(dia: date) -> Tuple[datetime, datetime]:
+    """Intervalo ``[início do dia, início do dia seguinte)``."""
+    return inicio_do_dia(dia), inicio_do_dia(dia + timedelta(days=1))
+
+
+def filtro_periodo(campo: str, inicio: DataLocal = None, fim: DataLocal = None) -> Q:
+    """``Q`` equivalente a ``campo__date__gte=inicio`` e ``campo__date__lte=fim``.
+
+    Os limites são inclusivos em dias locais; qualquer um pode ser omitido
+    (ou inválido), caso em que o respectivo lado não é filtrado.
+    """
+    filtros = {}
+    inicio_d = _como_data(inicio)
+    fim_d = _como_data(fim)
+    if inicio_d:
+        filtros[f'{campo}__gte'] = inicio_do_dia(inicio_d)
+    if fim_d:
+        filtros[f'{campo}__lt'] = inicio_do_dia(fim_d + timedelta(days=1))
+    return Q(**filtros)
+
+
+def filtro_dia(campo: str, dia: DataLocal) -> Q:
+    """``Q`` equivalente a ``campo__date=dia`` (sem filtro se ``dia`` for vazio/inválido)."""
+    return filtro_periodo(campo, dia, dia)
@@ -0,0 +1,146 @@
+"""Exportação das listagens em CSV ou XLSX sem carregar a lista inteira em memória.
+
+Cada listagem define suas colunas como ``(titulo, origem)``, em que ``origem`` é
+um caminho de atributos (``'paciente.nome'``) ou uma função que recebe o objeto.
+Querysets são percorridos com ``.iterator()`` (lotes de ``CHUNK`` linhas):
+
+- CSV (padrão): ``StreamingHttpResponse``; o download começa na primeira linha.
+  Separador ``;`` e BOM UTF-8, como o Excel em português espera.
+- XLSX: ``openpyxl`` em modo *write-only* (linhas descarregadas em disco, memória
+  constante). O formato zip só fica pronto ao final, por isso o arquivo é montado
+  em um temporário e então enviado com ``FileResponse``.
+
+Texto que começa como fórmula (``=``, ``+``, ``-``, ``@``) sai com ``'`` no CSV e
+como célula de texto explícita no XLSX, para não ser avaliado ao abrir a planilha.
+
+Uso::
+
+    return exportacao.exportar(request, 'viagens', COLUNAS_VIAGEM, qs)
+"""
+import csv
+import tempfile
+from datetime import date, datetime, time
+from decimal import Decimal
+from itertools import chain
+from typing import Callable, Iterable, Sequence, Tuple, Union
+
+from django.db.models import QuerySet
+from django.http import FileResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
+
+Coluna = Tuple[str, Union[str, Callable]]
+
+CHUNK = 2000
+FORMATOS = ('csv', 'xlsx')
+
+
+def _valor(obj, origem):
+    if callable(origem):
+        return origem(obj)
+    for parte in origem.split('.'):
+        if obj is None:
+            return None
+        obj = getattr(obj, parte, None)
+    return obj
+
+
+def _linhas(colunas: Sequence[Coluna], objetos: Iterable):
+    if isinstance(objetos, QuerySet):
+        objetos = objetos.iterator(chunk_size=CHUNK)
+    for obj in objetos:
+        yield [_valor(obj, origem) for _, origem in colunas]
+
+
+def encadear(*fontes: Iterable):
+    """Une várias fontes (querysets percorridos com ``.iterator()``) em uma só exportação."""
+    return chain.from_iterable(
+        f.iterator(chunk_size=CHUNK) if isinstance(f, QuerySet) else f for f in fontes
+    )
+
+
+# Início de fórmula no Excel/LibreOffice: texto livre vindo do cadastro não pode ser avaliado
+_INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _texto(valor) -> str:
+    if valor is None:
+        return ''
+    if isinstance(valor, str):
+        return "'" + valor if valor.startswith(_INICIO_FORMULA) else valor
+    if isinstance(valor, datetime):
+        valor = timezone.localtime(valor) if timezone.is_aware(valor) else valor
+        return valor.strftime('%d/%m/%Y %H:%M')
+    if isinstance(valor, date):
+        return valor.strftime('%d/%m/%Y')
+    if isinstance(valor, time):
+        return valor.strftime('%H:%M')
+    if isinstance(valor, Decimal):
+        return str(valor).replace('.', ',')
+    if isinstance(valor, bool):
+        return 'Sim' if valor else 'Não'
+    if isinstance(valor, (int, float)):
+        return str(valor)
+    valor = str(valor)
+    return "'" + valor if valor.startswith(_INICIO_FORMULA) else valor
+
+
+def _celula(ws, valor):
+    if isinstance(valor, datetime):
+        # openpyxl não grava datas com fuso
+        return timezone.localtime(valor).replace(tzinfo=None) if timezone.is_aware(valor) else valor
+    if valor is None or isinstance(valor, (date, time, int, float, Decimal, bool)):
+        return valor
+    from openpyxl.cell import WriteOnlyCell
+
+    # Célula de texto explícita: o openpyxl gravaria "=..." como fórmula
+    celula = WriteOnlyCell(ws, value=str(valor))
+    celula.data_type = 's'
+    return celula
+
+
+class _Eco:
+    """Arquivo fictício para o ``csv.writer``: devolve a linha em vez de guardá-la."""
+
+    def write(self, valor):
+        return valor
+
+
+def resposta_csv(nome: str, colunas: Sequence[Coluna], objetos: Iterable) -> StreamingHttpResponse:
+    escritor = csv.writer(_Eco(), delimiter=';')
+
+    def _stream():
+        yield '\ufeff' + escritor.writerow([titulo for titulo, _ in colunas])
+        for linha in _linhas(colunas, objetos):
+            yield escritor.writerow([_texto(v) for v in linha])
+
+    response = StreamingHttpResponse(_stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nome}.csv"'
+    return response
+
+
+def resposta_xlsx(nome: str, colunas: Sequence[Coluna], objetos: Iterable) -> FileResponse:
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=nome[:31])
+    ws.append([titulo for titulo, _ in colunas])
+    for linha in _linhas(colunas, objetos):
+        ws.append([_celula(ws, v) for v in linha])
+    arquivo = tempfile.TemporaryFile()
+    wb.save(arquivo)
+    arquivo.seek(0)
+    return FileResponse(
+        arquivo, as_attachment=True, filename=f'{nome}.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def exportar(request, nome: str, colunas: Sequence[Coluna], objetos: Iterable):
+    """Resposta de download no formato de ``?formato=`` (``csv``, padrão, ou ``xlsx``)."""
+    formato = (request.GET.get('formato') or 'csv').strip().lower()
+    if formato not in FORMATOS:
+        return HttpResponseBadRequest('Formato inválido (use csv ou xlsx).')
+    nome = f"{nome}_{timezone.localdate():%Y%m%d}"
+    if formato == 'xlsx':
+        return resposta_xlsx(nome, colunas, objetos)
+    return resposta_csv(nome, colunas, objetos)
@@ -42,6 +42,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'secretaria_it',
     'funcionarios',
     'pacientes',
@@ -52,6 +53,8 @@ INSTALLED_APPS = [
     'rh',
     'motorista',
     'widget_tweaks',
+    'rest_framework',
+    'rest_framework.authtoken',
 ]
 
 MIDDLEWARE = [
@@ -77,6 +80,8 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'secretaria_it.context_processors.group_flags',
+                'regulacao.context_processors.notificacoes_badge',
+                'regulacao.context_processors.eventos_config',
             ],
         },
     },
@@ -105,6 +110,29 @@ DATABASES = {
 
 
 
+# Cache
+# Usado pelos contadores de notificações não lidas (regulacao.notificacoes), resumos de alertas e mapas de ocupação.
+# Em produção, defina REDIS_URL para compartilhar o cache entre processos/workers.
+_REDIS_URL = os.getenv('REDIS_URL')
+if _REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': _REDIS_URL,
+        },
+    }
+    REGULACAO_CACHE_TIMEOUT_MAX = None
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+    # LocMemCache é por processo: invalidações de um worker não chegam aos outros, então as chaves
+    # da regulação valem no máximo estes segundos (ver regulacao/caches.py)
+    REGULACAO_CACHE_TIMEOUT_MAX = int(os.getenv('REGULACAO_CACHE_TIMEOUT_LOCAL', '30'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -168,3 +196,37 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 # logout/login e demais POSTs com proteção adequada. Use o helper JS para fetch
 # (já incluído em base.html) que injeta o cabeçalho X-CSRFToken automaticamente.
 
+
+# Auditoria da regulação (AcaoUsuario): gravação em lote após o commit.
+# Quando verdadeiro, o lote é entregue a uma thread de fundo em vez de gravado na própria requisição.
+REGULACAO_AUDITORIA_ASSINCRONA = os.getenv('REGULACAO_AUDITORIA_ASSINCRONA', '0').lower() in ('1', 'true', 'yes')
+
+# Retenção do histórico da regulação (comando ``arquivar_historico``)
+REGULACAO_RETENCAO_ACOES_DIAS = int(os.getenv('REGULACAO_RETENCAO_ACOES_DIAS', '180'))
+REGULACAO_RETENCAO_MENSAGENS_DIAS = int(os.getenv('REGULACAO_RETENCAO_MENSAGENS_DIAS', '365'))
+REGULACAO_RETENCAO_NOTIFICACOES_LIDAS_DIAS = int(os.getenv('REGULACAO_RETENCAO_NOTIFICACOES_LIDAS_DIAS', '90'))
+# Exames/consultas encerrados há mais de N meses vão para as tabelas de arquivo
+REGULACAO_ARQUIVO_MESES = int(os.getenv('REGULACAO_ARQUIVO_MESES', '12'))
+
+# Overbooking por taxa de faltas (regulacao/vagas.py): capacidade efetiva = capacidade × fator,
+# fator = 1 / (1 - taxa de faltas × margem), limitado a FATOR_MAX; exige MIN_AMOSTRA resultados na janela.
+REGULACAO_OVERBOOKING = os.getenv('REGULACAO_OVERBOOKING', '0').lower() in ('1', 'true', 'yes')
+REGULACAO_OVERBOOKING_JANELA_DIAS = int(os.getenv('REGULACAO_OVERBOOKING_JANELA_DIAS', '180'))
+REGULACAO_OVERBOOKING_MIN_AMOSTRA = int(os.getenv('REGULACAO_OVERBOOKING_MIN_AMOSTRA', '30'))
+REGULACAO_OVERBOOKING_MARGEM = float(os.getenv('REGULACAO_OVERBOOKING_MARGEM', '0.8'))
+REGULACAO_OVERBOOKING_FATOR_MAX = max(1.0, min(float(os.getenv('REGULACAO_OVERBOOKING_FATOR_MAX', '1.2')), 1.5))
+
+# Eventos em tempo real (regulacao/eventos.py): o stream SSE mantém a conexão aberta e só deve ser
+# ligado quando o projeto é servido por ASGI (secretaria_it.asgi). Sob WSGI a página consulta os contadores.
+REGULACAO_SSE_ASGI = os.getenv('REGULACAO_SSE_ASGI', '0').lower() in ('1', 'true', 'yes')
+
+# API de integração das UBS (Django REST framework, autenticação por token)
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.TokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+    'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONRenderer'],
+}
+REGULACAO_API_MAX_ITENS = int(os.getenv('REGULACAO_API_MAX_ITENS', '500'))
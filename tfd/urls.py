@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('', views.TFDListView.as_view(), name='tfd-list'),
+    path('exportar/', views.TFDExportView.as_view(), name='tfd-exportar'),
     path('nova/', views.TFDCreateView.as_view(), name='tfd-create'),
     path('editar/<int:pk>/', views.TFDUpdateView.as_view(), name='tfd-update'),
     path('deletar/<int:pk>/', views.TFDDeleteView.as_view(), name='tfd-delete'),
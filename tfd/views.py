@@ -1,4 +1,5 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
+from secretaria_it import exportacao
 from secretaria_it.access import AccessRequiredMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
@@ -74,6 +75,29 @@ class TFDListView(AccessRequiredMixin, LoginRequiredMixin, ListView):
             
         return ctx
 
+
+COLUNAS_TFD = [
+    ('Paciente', 'paciente_nome'),
+    ('CPF', 'paciente_cpf'),
+    ('CNS', 'paciente_cns'),
+    ('Telefone', 'paciente_telefone'),
+    ('Cidade de destino', 'cidade_destino'),
+    ('Data início', 'data_inicio'),
+    ('Data fim', 'data_fim'),
+    ('Diárias', 'numero_diarias'),
+    ('Valor da diária', 'valor_diaria'),
+    ('Valor do benefício', 'valor_beneficio'),
+    ('Valor total', 'valor_total'),
+    ('Observações', 'observacoes'),
+]
+
+
+class TFDExportView(TFDListView):
+    """Exportação (CSV/XLSX) dos TFDs com os filtros de período da listagem."""
+
+    def get(self, request, *args, **kwargs):
+        return exportacao.exportar(request, 'tfd', COLUNAS_TFD, self.get_queryset())
+
 # Detalhe de um TFD
 class TFDDetailView(AccessRequiredMixin, LoginRequiredMixin, DetailView):
     login_url = '/accounts/login/'
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('motorista', '0003_alter_motorista_cpf'),
+        ('veiculos', '0008_abastecimento_registrado_por'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='abastecimento',
+            index=models.Index(fields=['data_hora'], name='abastecimento_data_hora_idx'),
+        ),
+    ]
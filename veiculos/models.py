@@ -80,6 +80,9 @@ class Abastecimento(models.Model):
 
     class Meta:
         ordering = ["-data_hora", "-id"]
+        indexes = [
+            models.Index(fields=["data_hora"], name="abastecimento_data_hora_idx"),
+        ]
 
     @property
     def esta_excluido(self) -> bool:
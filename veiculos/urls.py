@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('abastecimentos/', views.abastecimento_list, name='abastecimento-list'),
+    path('abastecimentos/exportar/', views.abastecimento_exportar, name='abastecimento-exportar'),
     path('abastecimentos/novo/', views.abastecimento_create, name='abastecimento-create'),
     path('abastecimentos/<int:pk>/imprimir/', views.abastecimento_print, name='abastecimento-print'),
     path('abastecimentos/<int:pk>/editar/', views.abastecimento_update, name='abastecimento-update'),
@@ -16,10 +16,12 @@ from .forms import (
 )
 from .models import Abastecimento, Veiculo, LocalManutencao, ManutencaoVeiculo
 from motorista.models import Motorista
+from secretaria_it import exportacao
+from secretaria_it.datas import filtro_dia, filtro_periodo
 
 
-@login_required
-def abastecimento_list(request):
+def _abastecimentos_filtrados(request):
+	"""Abastecimentos com os filtros da listagem (motorista, veículo, período); retorna ``(qs, filtros)``."""
 	qs = Abastecimento.objects.select_related("veiculo", "motorista").all().order_by('-data_hora')
 	# Filtros: motorista, veiculo, período (início/fim)
 	from django.utils.dateparse import parse_date
@@ -34,14 +36,30 @@ def abastecimento_list(request):
 	if veiculo_id:
 		qs = qs.filter(veiculo_id=veiculo_id)
 	if start and end:
-		qs = qs.filter(data_hora__date__gte=start, data_hora__date__lte=end)
-	elif start:
-		qs = qs.filter(data_hora__date=start)
-	elif end:
-		qs = qs.filter(data_hora__date=end)
-	show_deleted = request.user.is_superuser
-	if not show_deleted:
+		qs = qs.filter(filtro_periodo('data_hora', start, end))
+	elif start or end:
+		qs = qs.filter(filtro_dia('data_hora', start or end))
+	if not request.user.is_superuser:
 		qs = qs.filter(excluido_em__isnull=True)
+	return qs, {"motorista": motorista_id, "veiculo": veiculo_id, "inicio": inicio, "fim": fim}
+
+
+COLUNAS_ABASTECIMENTO = [
+	("Data/hora", "data_hora"),
+	("Veículo", "veiculo"),
+	("Tipo de veículo", lambda a: a.get_tipo_veiculo_display()),
+	("Combustível", lambda a: a.get_tipo_combustivel_display()),
+	("Motorista", "motorista.nome_completo"),
+	("Local", "local_abastecimento"),
+	("Observação", "observacao"),
+	("Excluído em", "excluido_em"),
+]
+
+
+@login_required
+def abastecimento_list(request):
+	qs, filtros = _abastecimentos_filtrados(request)
+	show_deleted = request.user.is_superuser
 
 	motoristas = Motorista.objects.all().order_by('nome_completo')
 	veiculos = Veiculo.objects.all().order_by('modelo')
@@ -67,11 +85,18 @@ def abastecimento_list(request):
 		"show_deleted": show_deleted,
 		"motoristas": motoristas,
 		"veiculos": veiculos,
-		"filtros": {"motorista": motorista_id, "veiculo": veiculo_id, "inicio": inicio, "fim": fim},
+		"filtros": filtros,
 	}
 	return render(request, "veiculos/abastecimento_list.html", ctx)
 
 
+@login_required
+def abastecimento_exportar(request):
+	"""Exportação (CSV/XLSX) dos abastecimentos com os filtros da listagem."""
+	qs, _ = _abastecimentos_filtrados(request)
+	return exportacao.exportar(request, "abastecimentos", COLUNAS_ABASTECIMENTO, qs)
+
+
 @login_required
 def abastecimento_create(request):
 	if request.method == "POST":
@@ -1,8 +1,9 @@
 from django.urls import path
-from .views import ViagemListView, ViagemCreateView, ViagemUpdateView, ViagemDeleteView
+from .views import ViagemListView, ViagemExportView, ViagemCreateView, ViagemUpdateView, ViagemDeleteView
 
 urlpatterns = [
     path('', ViagemListView.as_view(), name='viagem-list'),
+    path('exportar/', ViagemExportView.as_view(), name='viagem-exportar'),
     path('nova/', ViagemCreateView.as_view(), name='viagem-create'),
     path('editar/<int:pk>/', ViagemUpdateView.as_view(), name='viagem-edit'),
     path('deletar/<int:pk>/', ViagemDeleteView.as_view(), name='viagem-delete'),
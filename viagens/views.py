@@ -1,4 +1,5 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
+from secretaria_it import exportacao
 from secretaria_it.access import AccessRequiredMixin
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
@@ -105,6 +106,31 @@ class ViagemListView(AccessRequiredMixin, LoginRequiredMixin, ListView):
         messages.error(request, 'Ação inválida para cadastro de viagens.')
         return redirect('viagem-list')
 
+COLUNAS_VIAGEM = [
+    ('Data', 'data_viagem'),
+    ('Saída', 'hora_saida'),
+    ('Paciente', 'paciente.nome'),
+    ('CPF', 'paciente.cpf'),
+    ('Endereço', 'endereco_paciente'),
+    ('Destino', 'destino'),
+    ('Hospital', 'hospital'),
+    ('Tipo de atendimento', 'tipo_atendimento'),
+    ('Acompanhante', 'acompanhante'),
+    ('Veículo', 'veiculo'),
+    ('Motorista', 'motorista_nome'),
+    ('Status', lambda v: v.get_status_display()),
+    ('Observações', 'observacoes'),
+]
+
+
+class ViagemExportView(ViagemListView):
+    """Exportação (CSV/XLSX) das viagens com os filtros da listagem."""
+
+    def get(self, request, *args, **kwargs):
+        qs = self.get_queryset().select_related('paciente', 'veiculo', 'motorista').order_by('data_viagem', 'hora_saida', 'pk')
+        return exportacao.exportar(request, 'viagens', COLUNAS_VIAGEM, qs)
+
+
 class ViagemCreateView(AccessRequiredMixin, LoginRequiredMixin, CreateView):
     login_url = '/accounts/login/'
     access_key = 'viagens'